@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+مقارنة استهلاك الذاكرة بين تحليل النتائج القديم (readlines) وقراءة الملف المضغوط المتدفقة
+
+الاستخدام:
+    python benchmarks/bench_parse_results.py --size-mb 2048 --dir /tmp/xss-bench
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.results_parser import RESULT_FILES
+from src.results_format import summarize
+
+
+def legacy_parse(results_dir: str, domain: str) -> dict:
+    """نسخة من parse_results القديمة التي تحمّل كل الأسطر في الذاكرة"""
+    results = {'domain': domain, 'files': {}}
+    for filename, key in RESULT_FILES.items():
+        filepath = os.path.join(results_dir, filename)
+        if os.path.exists(filepath):
+            with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+                lines = [line.strip() for line in f.readlines() if line.strip()]
+                results['files'][filename] = lines
+                results[key] = len(lines)
+    return results
+
+
+def generate(results_dir: str, size_mb: int):
+    """إنشاء مجلد نتائج وهمي بالحجم المطلوب (يُعاد استخدامه إن وُجد)"""
+    os.makedirs(results_dir, exist_ok=True)
+    wayback = os.path.join(results_dir, 'wayback.txt')
+    target = size_mb * 1024 * 1024
+    if os.path.exists(wayback) and os.path.getsize(wayback) >= target:
+        return
+
+    with open(wayback, 'w') as f:
+        written = 0
+        n = 0
+        while written < target:
+            block = ''.join(
+                f'https://sub{i % 500}.example.com/path/{i}/page.php?id={i}&q=search{i}\n'
+                for i in range(n, n + 10000)
+            )
+            f.write(block)
+            written += len(block)
+            n += 10000
+
+    for filename, step in (('xss_ready.txt', 10), ('live_uro1.txt', 5), ('Vulnerable_XSS.txt', 10000)):
+        with open(wayback) as src, open(os.path.join(results_dir, filename), 'w') as dst:
+            for i, line in enumerate(src):
+                if i % step == 0:
+                    dst.write(line)
+
+    with open(os.path.join(results_dir, 'subdomains.txt'), 'w') as f:
+        f.writelines(f'sub{i}.example.com\n' for i in range(500))
+
+
+def run_child(mode: str, results_dir: str):
+    """تشغيل طريقة تحليل واحدة وطباعة القياسات بصيغة JSON"""
+    start = time.perf_counter()
+    if mode == 'legacy':
+        results = legacy_parse(results_dir, 'example.com')
+    else:
+        # أول تشغيل يحوّل المجلد إلى results.xrf بالتدفق، وما بعده يقرأ الفهرس فقط
+        results = summarize(results_dir, 'example.com')
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'mode': mode,
+        'seconds': round(elapsed, 3),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'wayback_urls': results.get('wayback_urls', 0),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='قياس ذاكرة تحليل النتائج')
+    parser.add_argument('--size-mb', type=int, default=2048, help='حجم wayback.txt بالميغابايت')
+    parser.add_argument('--dir', default='/tmp/xss-bench/example.com', help='مجلد النتائج الوهمي')
+    parser.add_argument('--modes', default='streaming,legacy')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.dir)
+        return 0
+
+    print(f"📁 تجهيز مجلد النتائج ({args.size_mb} MB)...")
+    generate(args.dir, args.size_mb)
+
+    print(f"{'mode':<10} {'seconds':>10} {'peak RSS MB':>12} {'wayback':>12}")
+    for mode in args.modes.split(','):
+        # كل طريقة في عملية مستقلة حتى لا تتأثر قياسات الذاكرة ببعضها
+        proc = subprocess.run(
+            [sys.executable, __file__, '--child', mode, '--dir', args.dir],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"{mode:<10} فشل: {proc.stderr.strip()[-200:]}")
+            continue
+        r = json.loads(proc.stdout)
+        print(f"{r['mode']:<10} {r['seconds']:>10} {r['peak_rss_mb']:>12} {r['wayback_urls']:>12}")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
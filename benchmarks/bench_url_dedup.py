@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+مقارنة إزالة تكرار الروابط: مجموعة set للروابط كما هي (السلوك السابق) مقابل التوحيد مع مرشح Bloom
+
+الاستخدام:
+    python benchmarks/bench_url_dedup.py --urls 5000000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.url_dedup import UrlDeduplicator
+
+
+def generate(count: int):
+    """روابط متداخلة كما تعيدها waybackurls وgau: نفس النمط بقيم ومنافذ وترتيب مختلف"""
+    for i in range(count):
+        page = i % (count // 20 or 1)
+        if i % 3 == 0:
+            yield f'https://sub{page % 300}.example.com/item/{page}.php?id={i}&ref=a{i % 7}'
+        elif i % 3 == 1:
+            yield f'HTTPS://sub{page % 300}.Example.com:443/item/{page}.php?ref=b&id={i}'
+        else:
+            yield f'http://sub{page % 300}.example.com/item/{page}.php?id={page}#frag'
+
+
+def run_child(mode: str, count: int):
+    start = time.perf_counter()
+    if mode == 'set':
+        seen = set()
+        kept = 0
+        for url in generate(count):
+            if url not in seen:
+                seen.add(url)
+                kept += 1
+    else:
+        dedup = UrlDeduplicator(capacity=count)
+        kept = sum(1 for url in generate(count) if dedup.add(url))
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'mode': mode,
+        'seconds': round(elapsed, 2),
+        'urls_per_second': int(count / elapsed),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'kept': kept,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='قياس سرعة وذاكرة إزالة تكرار الروابط')
+    parser.add_argument('--urls', type=int, default=2000000)
+    parser.add_argument('--modes', default='bloom,set')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.urls)
+        return 0
+
+    print(f"{'mode':<8} {'seconds':>9} {'urls/s':>10} {'peak RSS MB':>12} {'kept':>10}")
+    for mode in args.modes.split(','):
+        # كل طريقة في عملية مستقلة حتى لا تتأثر قياسات الذاكرة ببعضها
+        proc = subprocess.run(
+            [sys.executable, __file__, '--child', mode, '--urls', str(args.urls)],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"{mode:<8} فشل: {proc.stderr.strip()[-200:]}")
+            continue
+        r = json.loads(proc.stdout)
+        print(f"{r['mode']:<8} {r['seconds']:>9} {r['urls_per_second']:>10} {r['peak_rss_mb']:>12} {r['kept']:>10}")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+محاكاة تيليجرام محلياً: إرسال تحديثات وهمية إلى Webhook البوت،
+وخادم Bot API وهمي (FakeBotApi) يستقبله البوت عبر TELEGRAM_API_URL ويسلمه التحديثات بـ getUpdates
+
+الاستخدام:
+    python benchmarks/fake_telegram.py --url http://localhost:5000/telegram/webhook \
+        --secret change_me --text "/scan example.com" --users 5
+"""
+
+import re
+import json
+import time
+import argparse
+import itertools
+import threading
+import urllib.request
+import urllib.error
+from urllib.parse import parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+_update_ids = itertools.count(int(time.time()))
+_message_ids = itertools.count(1)
+
+
+def make_message_update(user_id: int, text: str) -> dict:
+    """تحديث رسالة نصية بصيغة Bot API (مع كيان bot_command للأوامر)"""
+    message = {
+        'message_id': next(_message_ids),
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private', 'first_name': f'user{user_id}'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+        'text': text,
+    }
+    if text.startswith('/'):
+        command = text.split()[0]
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+    return {'update_id': next(_update_ids), 'message': message}
+
+
+def make_callback_update(user_id: int, data: str, message_id: int = 1) -> dict:
+    """تحديث ضغط زر تفاعلي"""
+    return {
+        'update_id': next(_update_ids),
+        'callback_query': {
+            'id': str(next(_update_ids)),
+            'chat_instance': str(user_id),
+            'data': data,
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'text': '...',
+            },
+        },
+    }
+
+
+def post_update(url: str, update: dict, secret: str = None, timeout: float = 10) -> int:
+    """إرسال تحديث إلى Webhook وإرجاع رمز الحالة"""
+    headers = {'Content-Type': 'application/json'}
+    if secret:
+        headers['X-Telegram-Bot-Api-Secret-Token'] = secret
+    request = urllib.request.Request(url, data=json.dumps(update).encode(), headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'XSS Bench', 'username': 'xss_bench_bot'}
+
+# حقول النماذج متعددة الأجزاء (sendDocument): تكفي القيم النصية البسيطة
+MULTIPART_FIELD = re.compile(rb'name="([^"]+)"\r\n\r\n([^\r]*)\r\n')
+
+
+def _decode_value(value: str):
+    """البوت يرسل القيم غير النصية مرمزة بـ JSON (الأرقام والقوائم والأزرار)"""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+class FakeBotApi:
+    """خادم Bot API محلي: يعد الاستدعاءات لكل طريقة ويسجل الرسائل المرسلة ويسلم التحديثات بـ getUpdates"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, on_message=None):
+        self.on_message = on_message
+        self.calls = {}
+        self.messages = []
+        self._updates = []
+        self._offset = 0
+        self._lock = threading.Condition()
+        self._message_ids = itertools.count(1)
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        with self._lock:
+            self._lock.notify_all()
+
+    def push_update(self, update: dict):
+        """إضافة تحديث يستلمه البوت في استدعاء getUpdates التالي"""
+        with self._lock:
+            self._updates.append(update)
+            self._lock.notify_all()
+
+    def call_count(self, method: str) -> int:
+        return self.calls.get(method, 0)
+
+    def handle(self, method: str, params: dict):
+        """نتيجة استدعاء طريقة Bot API"""
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+        if method == 'getUpdates':
+            return self._get_updates(int(params.get('offset') or 0), float(params.get('timeout') or 0))
+        if method == 'getMe':
+            return BOT_USER
+        if method in ('sendMessage', 'editMessageText', 'sendDocument'):
+            chat_id = int(params.get('chat_id') or 0)
+            message_id = int(params.get('message_id') or next(self._message_ids))
+            text = params.get('text') or params.get('caption') or ''
+            record = {'time': time.monotonic(), 'method': method, 'chat_id': chat_id,
+                      'message_id': message_id, 'text': text}
+            with self._lock:
+                self.messages.append(record)
+            if self.on_message is not None:
+                self.on_message(record)
+            return {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': text,
+            }
+        # deleteWebhook وsetMyCommands وanswerCallbackQuery وغيرها
+        return True
+
+    def _get_updates(self, offset: int, timeout: float) -> list:
+        deadline = time.monotonic() + min(timeout, 2)
+        with self._lock:
+            if offset:
+                self._updates = [u for u in self._updates if u['update_id'] >= offset]
+            while not self._updates and time.monotonic() < deadline:
+                self._lock.wait(deadline - time.monotonic())
+            return list(self._updates)
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                method = self.path.rstrip('/').rsplit('/', 1)[-1]
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                content_type = self.headers.get('Content-Type', '')
+                if content_type.startswith('multipart/'):
+                    params = {k.decode(): _decode_value(v.decode()) for k, v in MULTIPART_FIELD.findall(body)}
+                elif content_type.startswith('application/json'):
+                    params = json.loads(body or b'{}')
+                else:
+                    params = {k: _decode_value(v[0]) for k, v in parse_qs(body.decode()).items()}
+                data = json.dumps({'ok': True, 'result': api.handle(method, params)}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='إرسال تحديثات وهمية إلى Webhook البوت')
+    parser.add_argument('--url', default='http://localhost:5000/telegram/webhook')
+    parser.add_argument('--secret', default=None)
+    parser.add_argument('--text', default='/scan example.com')
+    parser.add_argument('--callback', default=None, help='إرسال ضغط زر بهذه البيانات بدلاً من رسالة')
+    parser.add_argument('--users', type=int, default=1)
+    parser.add_argument('--first-user', type=int, default=100000)
+    args = parser.parse_args()
+
+    statuses = {}
+    start = time.perf_counter()
+    for user_id in range(args.first_user, args.first_user + args.users):
+        if args.callback:
+            update = make_callback_update(user_id, args.callback)
+        else:
+            update = make_message_update(user_id, args.text)
+        status = post_update(args.url, update, args.secret)
+        statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - start
+
+    print(f"📨 تم إرسال {args.users} تحديث خلال {elapsed:.3f} ثانية: {statuses}")
+    return 0 if set(statuses) == {200} else 1
+
+
+if __name__ == '__main__':
+    exit(main())
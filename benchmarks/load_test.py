@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+اختبار حمل البوت كاملاً: عملية البوت الحقيقية مع سكربت فحص وهمي وخادم Bot API وهمي
+يرسل N مستخدماً /scan بالتوازي ويقيس زمن كل فحص حتى وصول رسالة النتائج، وعدد الفحوصات في الساعة،
+وأعلى ذاكرة لعملية البوت، وعدد استدعاءات Bot API لكل طريقة
+
+الاستخدام:
+    python benchmarks/load_test.py --users 20 --duration 5 --lines 2000 --urls 5000
+    python benchmarks/load_test.py --users 10 --json --max-p95 30 --max-rss-mb 300   # في CI
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_telegram import FakeBotApi, make_message_update
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_SCRIPT = os.path.join(ROOT, 'benchmarks', 'stub_xss_automation.sh')
+BOT_MAIN = os.path.join(ROOT, 'src', 'bot_main.py')
+
+# رسائل نهاية الفحص (نتائج أو فشل)
+DONE_MARKERS = ('🎯 نتائج فحص النطاق', '❌ فشل في فحص النطاق', '❌ حدث خطأ أثناء فحص النطاق',
+                '❌ تعذر إضافة فحص النطاق')
+
+
+def percentile(values: list, p: float) -> float:
+    """النسبة المئوية بطريقة أقرب رتبة"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def peak_rss_mb(pid: int) -> float:
+    """أعلى ذاكرة مقيمة للعملية من /proc (VmHWM)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+class LoadTest:
+    """تشغيل البوت ضد الخادم الوهمي وتتبع زمن كل مستخدم من إرسال الأمر حتى رسالة النهاية"""
+
+    def __init__(self, args):
+        self.args = args
+        self.started = {}
+        self.finished = {}
+        self.failed = set()
+        self.done = threading.Event()
+        self.api = FakeBotApi(on_message=self.on_message)
+
+    def on_message(self, record: dict):
+        chat_id = record['chat_id']
+        text = record['text'].strip()
+        if chat_id in self.started and chat_id not in self.finished and text.startswith(DONE_MARKERS):
+            self.finished[chat_id] = record['time']
+            if not text.startswith(DONE_MARKERS[0]):
+                self.failed.add(chat_id)
+            if len(self.finished) >= self.args.users:
+                self.done.set()
+
+    def bot_env(self, tmp: str) -> dict:
+        env = os.environ.copy()
+        env.update({
+            'BOT_TOKEN': '123456:LOADTEST',
+            'TELEGRAM_API_URL': self.api.url,
+            'BOT_MODE': 'polling',
+            'HTTP_ENABLED': '0',
+            'SCAN_EXECUTOR': 'local',
+            'SCAN_ENGINE': 'script',
+            'XSS_SCRIPT_PATH': STUB_SCRIPT,
+            'RESULTS_DIR': os.path.join(tmp, 'results'),
+            'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'load.db')}",
+            'SCAN_WORKERS': str(self.args.workers),
+            'SCAN_QUEUE_MAX': str(max(100, self.args.users * 2)),
+            'STUB_LINES': str(self.args.lines),
+            'STUB_SECONDS': str(self.args.duration),
+            'STUB_URLS': str(self.args.urls),
+            'STUB_VULNS': str(self.args.vulns),
+        })
+        return env
+
+    def run(self) -> dict:
+        self.api.start()
+        with tempfile.TemporaryDirectory() as tmp:
+            log = open(os.path.join(tmp, 'bot.out'), 'w')
+            bot = subprocess.Popen([sys.executable, BOT_MAIN], cwd=tmp, env=self.bot_env(tmp),
+                                   stdout=log, stderr=subprocess.STDOUT)
+            try:
+                # البوت جاهز عند أول getUpdates
+                deadline = time.monotonic() + 30
+                while self.api.call_count('getUpdates') == 0:
+                    if bot.poll() is not None or time.monotonic() > deadline:
+                        raise RuntimeError('لم يبدأ البوت، راجع bot.out')
+                    time.sleep(0.1)
+
+                for i in range(self.args.users):
+                    chat_id = self.args.first_user + i
+                    domain = 'example.com' if self.args.same_domain else f'user{i}.example.com'
+                    self.started[chat_id] = time.monotonic()
+                    self.api.push_update(make_message_update(chat_id, f'/scan {domain}'))
+                    if self.args.ramp:
+                        time.sleep(self.args.ramp / self.args.users)
+
+                self.done.wait(self.args.timeout)
+                rss = peak_rss_mb(bot.pid)
+            finally:
+                bot.send_signal(signal.SIGINT)
+                try:
+                    bot.wait(15)
+                except subprocess.TimeoutExpired:
+                    bot.kill()
+                log.close()
+                self.api.stop()
+            if bot.returncode not in (0, -signal.SIGINT) and not self.finished:
+                with open(os.path.join(tmp, 'bot.out')) as f:
+                    sys.stderr.write(f.read()[-2000:])
+        return self.report(rss)
+
+    def report(self, rss: float) -> dict:
+        latencies = [self.finished[c] - self.started[c] for c in self.finished if c not in self.failed]
+        completed = len(latencies)
+        elapsed = (max(self.finished.values()) - min(self.started.values())) if self.finished else 0
+        return {
+            'users': self.args.users,
+            'completed': completed,
+            'failed': len(self.failed),
+            'timed_out': self.args.users - len(self.finished),
+            'p50_seconds': round(percentile(latencies, 50), 2),
+            'p95_seconds': round(percentile(latencies, 95), 2),
+            'p99_seconds': round(percentile(latencies, 99), 2),
+            'scans_per_hour': round(completed / elapsed * 3600, 1) if elapsed else 0,
+            'peak_rss_mb': round(rss, 1),
+            'telegram_calls': dict(sorted(self.api.calls.items())),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='اختبار حمل البوت بسكربت فحص وخادم Bot API وهميين')
+    parser.add_argument('--users', type=int, default=10, help='عدد المستخدمين المتزامنين')
+    parser.add_argument('--workers', type=int, default=2, help='SCAN_WORKERS للبوت')
+    parser.add_argument('--duration', type=float, default=2, help='مدة كل فحص وهمي بالثواني')
+    parser.add_argument('--lines', type=int, default=500, help='أسطر مخرجات كل فحص')
+    parser.add_argument('--urls', type=int, default=2000, help='روابط ملفات النتائج لكل فحص')
+    parser.add_argument('--vulns', type=int, default=2, help='ثغرات كل فحص')
+    parser.add_argument('--ramp', type=float, default=0, help='توزيع إرسال الأوامر على هذه المدة')
+    parser.add_argument('--same-domain', action='store_true', help='كل المستخدمين يفحصون نفس النطاق')
+    parser.add_argument('--first-user', type=int, default=700000)
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--json', action='store_true', help='طباعة النتيجة كـ JSON')
+    parser.add_argument('--max-p95', type=float, default=None, help='فشل إذا تجاوز p95 هذه المدة')
+    parser.add_argument('--max-rss-mb', type=float, default=None, help='فشل إذا تجاوزت ذاكرة البوت هذا الحد')
+    args = parser.parse_args()
+
+    result = LoadTest(args).run()
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        print(f"👥 المستخدمون: {result['users']} • اكتمل: {result['completed']} • فشل: {result['failed']} "
+              f"• لم ينتهِ: {result['timed_out']}")
+        print(f"⏱️ زمن الفحص: p50 {result['p50_seconds']}s • p95 {result['p95_seconds']}s "
+              f"• p99 {result['p99_seconds']}s")
+        print(f"📈 فحوصات في الساعة: {result['scans_per_hour']}")
+        print(f"💾 أعلى ذاكرة للبوت: {result['peak_rss_mb']} MB")
+        print("📨 استدعاءات Bot API: " + ', '.join(f"{k}={v}" for k, v in result['telegram_calls'].items()))
+
+    failures = []
+    if result['completed'] < result['users']:
+        failures.append('لم تكتمل كل الفحوصات')
+    if args.max_p95 is not None and result['p95_seconds'] > args.max_p95:
+        failures.append(f"p95 أكبر من {args.max_p95}s")
+    if args.max_rss_mb is not None and result['peak_rss_mb'] > args.max_rss_mb:
+        failures.append(f"الذاكرة أكبر من {args.max_rss_mb} MB")
+    for failure in failures:
+        print(f"❌ {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    exit(main())
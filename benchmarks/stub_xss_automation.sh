@@ -0,0 +1,34 @@
+#!/bin/bash
+# سكربت وهمي بديل لـ xss_automation.sh لاختبار الحمل (benchmarks/load_test.py)
+# يقرأ النطاق من المدخلات مثل السكربت الحقيقي، ويطبع STUB_LINES سطراً على مدى STUB_SECONDS ثانية
+# موزعة على مراحل الأدوات، ثم يكتب ملفات النتائج بـ STUB_URLS رابطاً وSTUB_VULNS ثغرة
+
+read -r DOMAIN
+read -r _
+
+LINES=${STUB_LINES:-1000}
+SECONDS_TOTAL=${STUB_SECONDS:-5}
+URLS=${STUB_URLS:-1000}
+VULNS=${STUB_VULNS:-2}
+OUT="${RESULTS_DIR:-results}/$DOMAIN"
+TICKS=10
+
+mkdir -p "$OUT"
+STAGES=(subfinder subfinder waybackurls waybackurls gau httpx httpx dalfox dalfox dalfox)
+PER_TICK=$(( LINES / TICKS ))
+DELAY=$(awk "BEGIN { print $SECONDS_TOTAL / $TICKS }")
+
+for (( tick = 0; tick < TICKS; tick++ )); do
+    STAGE=${STAGES[$tick]}
+    seq 1 "$PER_TICK" | sed "s|^|[$STAGE] $DOMAIN progress line |"
+    sleep "$DELAY"
+done
+
+seq 1 "$URLS" | sed "s|.*|http://$DOMAIN/page/&?id=&|" > "$OUT/wayback.txt"
+seq 1 $(( URLS / 100 + 1 )) | sed "s|.*|sub&.$DOMAIN|" > "$OUT/subdomains.txt"
+awk 'NR % 2 == 0' "$OUT/wayback.txt" > "$OUT/live_uro1.txt"
+awk 'NR % 4 == 0' "$OUT/wayback.txt" > "$OUT/xss_ready.txt"
+head -n "$VULNS" "$OUT/xss_ready.txt" | sed 's|$|%22%3E%3Csvg%2Fonload%3Dalert(1)%3E|' > "$OUT/Vulnerable_XSS.txt"
+
+echo "[dalfox] done: $VULNS vulnerable"
+exit 0
@@ -7,20 +7,15 @@ XSS Automation Telegram Bot
 import os
 import sys
 import logging
-from telegram_bot import XSSAutomationBot
+from telegram_bot import XSSAutomationBot, SCAN_ENGINE, SCAN_EXECUTOR
+from src.toolchain import preflight, health, format_health
+from src.log_setup import setup_logging, LOG_FILE
 
 def main():
     """الدالة الرئيسية لتشغيل البوت"""
     
-    # إعداد التسجيل
-    logging.basicConfig(
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        level=logging.INFO,
-        handlers=[
-            logging.FileHandler('bot.log'),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+    # إعداد التسجيل: الكتابة في خيط خلفي مع تدوير bot.log
+    setup_logging(log_file=LOG_FILE or 'bot.log')
     
     logger = logging.getLogger(__name__)
     
@@ -32,12 +27,32 @@ def main():
         logger.error("export BOT_TOKEN='your_bot_token_here'")
         sys.exit(1)
     
-    # التحقق من وجود سكربت XSS Automation
-    script_path = "/home/ubuntu/XSS-Automation/xss_automation.sh"
-    if not os.path.exists(script_path):
-        logger.error(f"❌ سكربت XSS Automation غير موجود في: {script_path}")
-        logger.error("يرجى التأكد من وجود السكربت في المسار الصحيح")
-        sys.exit(1)
+    if SCAN_EXECUTOR == 'broker':
+        # الأدوات مثبتة على عمال الفحص وليس على جهاز البوت
+        from src.broker import get_broker
+        workers = get_broker().workers()
+        if not workers:
+            logger.warning("⚠️ لا يوجد عامل فحص متصل، ستبقى الفحوصات في الطابور حتى تشغيل src/scan_worker.py")
+        else:
+            logger.info(f"🧰 عمال الفحص المتصلون: {len(workers)}")
+    else:
+        # فحص الأدوات مرة واحدة عند البدء (المسارات والإصدارات محفوظة للفحوصات)
+        summary = health(preflight())
+        for line in format_health(summary).split('\n'):
+            logger.info(line)
+        if SCAN_ENGINE == 'script':
+            # التحقق من وجود سكربت XSS Automation
+            script_path = os.getenv('XSS_SCRIPT_PATH', "/home/ubuntu/XSS-Automation/xss_automation.sh")
+            if not os.path.exists(script_path):
+                logger.error(f"❌ سكربت XSS Automation غير موجود في: {script_path}")
+                logger.error("يرجى التأكد من وجود السكربت في المسار الصحيح")
+                sys.exit(1)
+        elif not summary['ok']:
+            logger.error(f"❌ أدوات غير مثبتة: {', '.join(summary['missing'])}")
+            logger.error("يرجى تثبيت الأدوات أو استخدام SCAN_ENGINE=script")
+            sys.exit(1)
+        elif not summary['tools']['subfinder']['path']:
+            logger.warning("⚠️ subfinder غير مثبتة، سيتم فحص النطاق الرئيسي فقط")
     
     try:
         logger.info("🚀 بدء تشغيل بوت XSS Automation...")
@@ -0,0 +1,339 @@
+"""
+وسيط مهام الفحص بين واجهة تيليجرام وعمال الفحص
+البوت يضيف المهام وينتظر نتائجها، والعمال (src/scan_worker.py) يسجلون أنفسهم ويرسلون نبضات
+ويحجزون المهام بعقد إيجار محدد المدة ويعيدون النتائج؛ المهمة التي يتوقف عاملها تعود للطابور بعد انتهاء العقد
+التنفيذ الافتراضي يستخدم قاعدة البيانات الحالية (SQLite محلياً دون أي خدمة خارجية، أو أي DATABASE_URL مشتركة بين الأجهزة)
+"""
+
+import os
+import sys
+import json
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+
+# إضافة جذر المشروع للاستيراد بنفس أسلوب src/main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, update, delete, or_, and_
+from src.main import app
+from src.models.broker import db, BrokerJob, BrokerWorker
+from src.loop_health import run_blocking
+
+logger = logging.getLogger(__name__)
+
+# نوع الوسيط (انظر BROKERS)
+BROKER_BACKEND = os.getenv('BROKER_BACKEND', 'sql')
+
+# مدة عقد المهمة: إذا لم يجدده العامل بنبضة تعود المهمة للطابور
+BROKER_LEASE_SECONDS = int(os.getenv('BROKER_LEASE_SECONDS', '60'))
+
+# الفترة بين نبضات العامل وبين استعلامات البوت عن حالة المهمة (بالثواني)
+BROKER_HEARTBEAT = float(os.getenv('BROKER_HEARTBEAT', '15'))
+BROKER_POLL_INTERVAL = float(os.getenv('BROKER_POLL_INTERVAL', '2'))
+
+# عدد مرات حجز المهمة قبل اعتبارها فاشلة (عامل يتعطل عند كل محاولة)
+BROKER_MAX_ATTEMPTS = int(os.getenv('BROKER_MAX_ATTEMPTS', '3'))
+
+ACTIVE_STATUSES = ('queued', 'leased')
+FINISHED_STATUSES = ('done', 'failed', 'cancelled')
+
+
+class Broker(ABC):
+    """واجهة الوسيط: أي تنفيذ آخر (Redis مثلاً) يوفر نفس الدوال ويُضاف إلى BROKERS
+    (التنفيذ الذي ينقصه أي منها يفشل عند إنشائه وليس أثناء حجز مهمة)"""
+
+    # جهة البوت
+    @abstractmethod
+    def submit(self, scan_id: int, domain: str, resume: bool = True, targets: list = None,
+               diff: bool = False) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, job_id: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    def request_cancel(self, job_id: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove(self, job_id: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    def workers(self) -> list:
+        raise NotImplementedError
+
+    # جهة العمال
+    @abstractmethod
+    def register(self, worker_id: str, hostname: str, pid: int, capacity: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    def unregister(self, worker_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def heartbeat(self, worker_id: str, job_ids) -> list:
+        raise NotImplementedError
+
+    @abstractmethod
+    def lease(self, worker_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def release(self, job_id: int, worker_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_progress(self, job_id: int, worker_id: str, text: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete(self, job_id: int, worker_id: str, result: dict) -> bool:
+        raise NotImplementedError
+
+
+class SqlBroker(Broker):
+    """وسيط على جداول broker_job وbroker_worker في قاعدة البيانات الحالية
+    الحجز يتم بتحديث شرطي على عمود version حتى لا يحجز عاملان نفس المهمة"""
+
+    def __init__(self, flask_app=None, lease_seconds: int = None, max_attempts: int = None):
+        self.app = flask_app or app
+        self.lease_seconds = lease_seconds or BROKER_LEASE_SECONDS
+        self.max_attempts = max_attempts or BROKER_MAX_ATTEMPTS
+
+    def submit(self, scan_id: int, domain: str, resume: bool = True, targets: list = None,
+               diff: bool = False) -> int:
+        """إضافة مهمة، أو إرجاع مهمة الفحص نفسه إذا كانت ما زالت نشطة (بعد إعادة تشغيل البوت)"""
+        with self.app.app_context():
+            job = db.session.execute(
+                select(BrokerJob)
+                .where(BrokerJob.scan_id == scan_id, BrokerJob.status.in_(ACTIVE_STATUSES))
+                .order_by(BrokerJob.id.desc())
+                .limit(1)
+            ).scalar_one_or_none()
+            if job is None:
+                job = BrokerJob(scan_id=scan_id, domain=domain, resume=resume, diff=diff, status='queued',
+                                targets='\n'.join(targets) if targets else None)
+                db.session.add(job)
+                db.session.commit()
+            return job.id
+
+    def get(self, job_id: int):
+        with self.app.app_context():
+            job = db.session.get(BrokerJob, job_id)
+            return job.to_dict() if job else None
+
+    def request_cancel(self, job_id: int):
+        """المهمة المنتظرة تُلغى مباشرة، والمحجوزة يُبلغ عاملها في نبضته التالية"""
+        with self.app.app_context():
+            job = db.session.get(BrokerJob, job_id)
+            if job is None or job.status in FINISHED_STATUSES:
+                return
+            job.cancel_requested = True
+            if job.status == 'queued':
+                job.status = 'cancelled'
+                job.result = json.dumps({'success': False, 'error': 'تم إلغاء الفحص'}, ensure_ascii=False)
+                job.version += 1
+                job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+    def remove(self, job_id: int):
+        """حذف المهمة بعد أن يقرأ البوت نتيجتها"""
+        with self.app.app_context():
+            db.session.execute(delete(BrokerJob).where(BrokerJob.id == job_id))
+            db.session.commit()
+
+    def workers(self) -> list:
+        """العمال الذين أرسلوا نبضة خلال مدة العقد"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        with self.app.app_context():
+            rows = db.session.execute(
+                select(BrokerWorker).where(BrokerWorker.heartbeat_at >= cutoff).order_by(BrokerWorker.id)
+            ).scalars()
+            return [worker.to_dict() for worker in rows]
+
+    def register(self, worker_id: str, hostname: str, pid: int, capacity: int):
+        with self.app.app_context():
+            now = datetime.utcnow()
+            worker = db.session.get(BrokerWorker, worker_id)
+            if worker is None:
+                worker = BrokerWorker(id=worker_id, started_at=now)
+                db.session.add(worker)
+            worker.hostname = hostname
+            worker.pid = pid
+            worker.capacity = capacity
+            worker.running = 0
+            worker.heartbeat_at = now
+            db.session.commit()
+
+    def unregister(self, worker_id: str):
+        with self.app.app_context():
+            db.session.execute(delete(BrokerWorker).where(BrokerWorker.id == worker_id))
+            db.session.commit()
+
+    def heartbeat(self, worker_id: str, job_ids) -> list:
+        """تجديد نبضة العامل وعقود مهامه، وإرجاع المهام التي يجب أن يوقفها
+        (طُلب إلغاؤها أو انتهى عقدها وحجزها عامل آخر)"""
+        job_ids = list(job_ids)
+        now = datetime.utcnow()
+        with self.app.app_context():
+            db.session.execute(
+                update(BrokerWorker)
+                .where(BrokerWorker.id == worker_id)
+                .values(heartbeat_at=now, running=len(job_ids))
+            )
+            stop = []
+            if job_ids:
+                db.session.execute(
+                    update(BrokerJob)
+                    .where(BrokerJob.id.in_(job_ids), BrokerJob.worker_id == worker_id,
+                           BrokerJob.status == 'leased')
+                    .values(lease_expires_at=now + timedelta(seconds=self.lease_seconds))
+                )
+                owned = {
+                    row.id: row.cancel_requested
+                    for row in db.session.execute(
+                        select(BrokerJob.id, BrokerJob.cancel_requested)
+                        .where(BrokerJob.id.in_(job_ids), BrokerJob.worker_id == worker_id,
+                               BrokerJob.status == 'leased')
+                    )
+                }
+                stop = [job_id for job_id in job_ids if owned.get(job_id, True)]
+            db.session.commit()
+            return stop
+
+    def lease(self, worker_id: str):
+        """حجز أقدم مهمة منتظرة أو مهمة انتهى عقد عاملها، وإرجاعها كقاموس أو None"""
+        with self.app.app_context():
+            while True:
+                now = datetime.utcnow()
+                job = db.session.execute(
+                    select(BrokerJob)
+                    .where(or_(
+                        BrokerJob.status == 'queued',
+                        and_(BrokerJob.status == 'leased', BrokerJob.lease_expires_at < now)
+                    ))
+                    .order_by(BrokerJob.id)
+                    .limit(1)
+                ).scalar_one_or_none()
+                if job is None:
+                    return None
+
+                expired = job.status == 'leased'
+                if expired:
+                    logger.warning(f"انتهى عقد المهمة {job.id} لدى العامل {job.worker_id}")
+                if expired and (job.cancel_requested or job.attempts >= self.max_attempts):
+                    values = {
+                        'status': 'cancelled' if job.cancel_requested else 'failed',
+                        'result': json.dumps({
+                            'success': False,
+                            'error': 'تم إلغاء الفحص' if job.cancel_requested
+                            else f'توقف عامل الفحص {job.attempts} مرات'
+                        }, ensure_ascii=False),
+                        'finished_at': now,
+                    }
+                else:
+                    values = {
+                        'status': 'leased',
+                        'worker_id': worker_id,
+                        'lease_expires_at': now + timedelta(seconds=self.lease_seconds),
+                        'attempts': job.attempts + 1,
+                        # المحاولة التالية تكمل من نقاط الحفظ التي تركها العامل السابق
+                        'resume': job.resume or expired,
+                    }
+                values['version'] = job.version + 1
+
+                claimed = db.session.execute(
+                    update(BrokerJob)
+                    .where(BrokerJob.id == job.id, BrokerJob.version == job.version)
+                    .values(**values)
+                ).rowcount
+                db.session.commit()
+                db.session.expire_all()
+                if claimed and values['status'] == 'leased':
+                    return db.session.get(BrokerJob, job.id).to_dict()
+
+    def release(self, job_id: int, worker_id: str):
+        """إعادة مهمة للطابور عند إيقاف العامل بشكل طبيعي (لا تُحسب كمحاولة فاشلة)"""
+        with self.app.app_context():
+            db.session.execute(
+                update(BrokerJob)
+                .where(BrokerJob.id == job_id, BrokerJob.worker_id == worker_id, BrokerJob.status == 'leased')
+                .values(status='queued', worker_id=None, lease_expires_at=None, resume=True,
+                        attempts=BrokerJob.attempts - 1, version=BrokerJob.version + 1)
+            )
+            db.session.commit()
+
+    def set_progress(self, job_id: int, worker_id: str, text: str):
+        with self.app.app_context():
+            db.session.execute(
+                update(BrokerJob)
+                .where(BrokerJob.id == job_id, BrokerJob.worker_id == worker_id)
+                .values(progress=text)
+            )
+            db.session.commit()
+
+    def complete(self, job_id: int, worker_id: str, result: dict) -> bool:
+        """حفظ نتيجة المهمة إذا كان العامل ما زال يملك عقدها"""
+        with self.app.app_context():
+            job = db.session.get(BrokerJob, job_id)
+            if job is None or job.worker_id != worker_id or job.status != 'leased':
+                return False
+            if job.cancel_requested:
+                job.status = 'cancelled'
+            else:
+                job.status = 'done' if result['success'] else 'failed'
+            job.result = json.dumps(result, ensure_ascii=False)
+            job.version += 1
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            return True
+
+
+BROKERS = {
+    'sql': SqlBroker,
+}
+
+
+def get_broker(backend: str = None) -> Broker:
+    """إنشاء الوسيط المحدد في BROKER_BACKEND"""
+    backend = backend or BROKER_BACKEND
+    if backend not in BROKERS:
+        raise ValueError(f'وسيط غير معروف: {backend}')
+    return BROKERS[backend]()
+
+
+class BrokerClient:
+    """جهة البوت: إرسال الفحص للوسيط ونقل تقدمه إلى رسالة الحالة حتى تصل النتيجة"""
+
+    def __init__(self, broker: Broker = None, poll_interval: float = None):
+        self.broker = broker or get_broker()
+        self.poll_interval = poll_interval or BROKER_POLL_INTERVAL
+
+    async def run(self, scan_id: int, domain: str, status_message, resume: bool = True,
+                  targets: list = None, diff: bool = False) -> dict:
+        job_id = await run_blocking(self.broker.submit, scan_id, domain, resume, targets, diff)
+        last_progress = None
+        try:
+            while True:
+                job = await run_blocking(self.broker.get, job_id)
+                if job is None:
+                    return {'success': False, 'error': 'اختفت مهمة الفحص من الوسيط'}
+                if job['status'] in FINISHED_STATUSES:
+                    await run_blocking(self.broker.remove, job_id)
+                    return json.loads(job['result'])
+                if job['progress'] and job['progress'] != last_progress:
+                    last_progress = job['progress']
+                    try:
+                        await status_message.edit_text(last_progress)
+                    except Exception as e:
+                        logger.warning(f"تعذر تحديث رسالة التقدم للنطاق {domain}: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+        except asyncio.CancelledError:
+            # إلغاء أو تجاوز المهلة: يُبلغ العامل حتى يوقف عملياته
+            await asyncio.shield(run_blocking(self.broker.request_cancel, job_id))
+            raise
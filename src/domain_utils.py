@@ -0,0 +1,144 @@
+"""
+توحيد النطاقات والتحقق منها ونطاق الفحص المصرح به لكل مستخدم
+كل الأنماط مجمعة مرة واحدة عند الاستيراد، ويُعاد المضيف بصيغة موحدة (أحرف صغيرة، punycode،
+بدون منفذ أو نقطة أخيرة) قبل تشغيل أي عملية فحص
+"""
+
+import re
+import hashlib
+
+# المخطط في بداية النص (https://، http://، ...)
+SCHEME_PATTERN = re.compile(r'^[A-Za-z][A-Za-z0-9+.-]*://')
+
+# نهاية المضيف: أول / أو ? أو #
+HOST_END_PATTERN = re.compile(r'[/?#\\]')
+
+LABEL_PATTERN = re.compile(r'^(?!-)[a-z0-9-]{1,63}(?<!-)$')
+TLD_PATTERN = re.compile(r'^(?:[a-z]{2,63}|xn--[a-z0-9-]{1,59})$')
+
+# المضيف كاملاً في تعبير واحد (المسار السريع)، والأجزاء تُفحص منفردة فقط لمعرفة سبب الرفض
+HOST_PATTERN = re.compile(r'^(?:(?!-)[a-z0-9-]{1,63}(?<!-)\.)+(?:[a-z]{2,63}|xn--[a-z0-9-]{1,59})$')
+
+# فواصل قوائم الأهداف (أسطر ومسافات وفواصل)
+TARGET_SEPARATORS = re.compile(r'[\s,;]+')
+
+MAX_DOMAIN_LENGTH = 253
+
+
+class DomainError(ValueError):
+    """نطاق غير صالح، والرسالة مناسبة لعرضها للمستخدم"""
+
+
+def normalize_domain(value: str) -> str:
+    """إرجاع المضيف الموحد للنطاق أو الرابط، أو رفع DomainError"""
+    host = SCHEME_PATTERN.sub('', value.strip(), count=1)
+    host = HOST_END_PATTERN.split(host, 1)[0]
+    host = host.rpartition('@')[2]
+    if host.startswith('['):
+        raise DomainError('عناوين IPv6 غير مدعومة، يرجى إدخال اسم نطاق')
+
+    host, _, port = host.partition(':')
+    if port and (not port.isdigit() or not 0 < int(port) <= 65535):
+        raise DomainError(f'منفذ غير صالح: {port}')
+
+    # نقطة أخيرة واحدة مسموحة (الصيغة الكاملة FQDN)
+    if host.endswith('.'):
+        host = host[:-1]
+    if not host:
+        raise DomainError('النطاق فارغ')
+
+    if not host.isascii():
+        try:
+            host = host.encode('idna').decode('ascii')
+        except UnicodeError:
+            raise DomainError(f'اسم نطاق دولي غير صالح: {host}')
+    host = host.lower()
+
+    if len(host) > MAX_DOMAIN_LENGTH:
+        raise DomainError('النطاق أطول من 253 حرفاً')
+    if HOST_PATTERN.match(host):
+        return host
+
+    labels = host.split('.')
+    if len(labels) < 2:
+        raise DomainError('يجب أن يحتوي النطاق على نقطة واحدة على الأقل (مثال: example.com)')
+    for label in labels:
+        if not LABEL_PATTERN.match(label):
+            raise DomainError(f'جزء غير صالح في النطاق: "{label}"')
+    if not TLD_PATTERN.match(labels[-1]):
+        # يرفض أيضاً عناوين IPv4 لأن أدوات الفحص تعمل على أسماء النطاقات
+        raise DomainError(f'امتداد نطاق غير صالح: {labels[-1]}')
+    raise DomainError(f'نطاق غير صالح: {host}')
+
+
+def is_valid_domain(value: str) -> bool:
+    try:
+        normalize_domain(value)
+        return True
+    except DomainError:
+        return False
+
+
+def normalize_many(values):
+    """توحيد قائمة أهداف: (المضيفات الصالحة بدون تكرار بترتيبها، [(القيمة، سبب الرفض)])"""
+    valid = {}
+    invalid = []
+    for value in values:
+        if not value or not value.strip():
+            continue
+        try:
+            valid.setdefault(normalize_domain(value), None)
+        except DomainError as e:
+            invalid.append((value.strip(), str(e)))
+    return list(valid), invalid
+
+
+def split_targets(text: str) -> list:
+    """تقسيم نص قائمة أهداف على الأسطر والمسافات والفواصل مع تجاهل التعليقات (#)"""
+    targets = []
+    for line in text.splitlines():
+        if line.lstrip().startswith('#'):
+            continue
+        targets.extend(item for item in TARGET_SEPARATORS.split(line) if item)
+    return targets
+
+
+def batch_name(targets) -> str:
+    """اسم ثابت للفحص الجماعي (نفس القائمة بأي ترتيب = نفس الاسم ومجلد النتائج)"""
+    digest = hashlib.sha1('\n'.join(sorted(set(targets))).encode('utf-8')).hexdigest()[:12]
+    return f'batch-{digest}'
+
+
+def normalize_scope_pattern(pattern: str) -> str:
+    """نمط نطاق الفحص: example.com (النطاق وفروعه) أو *.example.com (الفروع فقط)"""
+    pattern = pattern.strip()
+    wildcard = pattern.startswith('*.')
+    host = normalize_domain(pattern[2:] if wildcard else pattern)
+    return f'*.{host}' if wildcard else host
+
+
+class Scope:
+    """قائمة النطاقات المصرح بفحصها مجمعة في مجموعتين، والتحقق يمر على أجزاء المضيف فقط"""
+
+    def __init__(self, patterns=()):
+        self.patterns = sorted(set(patterns))
+        self._domains = {p for p in self.patterns if not p.startswith('*.')}
+        self._subdomains = {p[2:] for p in self.patterns if p.startswith('*.')}
+
+    def __bool__(self):
+        return bool(self.patterns)
+
+    def allows(self, host: str) -> bool:
+        """المضيف (الموحد) داخل النطاق المصرح به"""
+        return self.owner(host) is not None
+
+    def owner(self, host: str):
+        """أدق نطاق في القائمة يحتوي المضيف (لتوزيع النتائج على الأهداف) أو None"""
+        if host in self._domains:
+            return host
+        labels = host.split('.')
+        for i in range(1, len(labels) - 1):
+            parent = '.'.join(labels[i:])
+            if parent in self._domains or parent in self._subdomains:
+                return parent
+        return None
@@ -0,0 +1,125 @@
+"""
+جدولة عادلة حسب الاستهلاك الفعلي لكل مستخدم
+يُحتسب وقت المعالج لشجرة عمليات كل فحص على صاحبه، وتتناقص القيمة بنصف عمر USAGE_HALF_LIFE_HOURS،
+فيتقدم في الطابور (داخل نفس الأولوية) من استهلك أقل مقسوماً على وزنه، مع ميزانية يومية اختيارية لكل مستخدم.
+الفحوصات المرتبطة (نتائج محفوظة أو انضمام لفحص جارٍ) لا تُحتسب لأنها لا تشغل أي عملية
+"""
+
+import os
+import time
+
+# نصف عمر الاستهلاك: بعد هذه المدة يُحتسب نصف وقت المعالج القديم فقط
+USAGE_HALF_LIFE_HOURS = float(os.getenv('USAGE_HALF_LIFE_HOURS', '24'))
+
+# ميزانية وقت المعالج اليومية لكل مستخدم بالثواني (0 = بدون حد، والمشرفون مستثنون)
+USER_DAILY_CPU_SECONDS = float(os.getenv('USER_DAILY_CPU_SECONDS', '0'))
+
+# أوزان المستخدمين: "123456:2,789:0.5" (الوزن الأكبر = حصة أكبر، والافتراضي 1)
+USAGE_WEIGHTS = {
+    int(user_id): float(weight)
+    for user_id, weight in (
+        item.split(':', 1) for item in os.getenv('USAGE_WEIGHTS', '').replace(' ', '').split(',') if ':' in item
+    )
+}
+
+
+def utc_day(now: float) -> str:
+    return time.strftime('%Y-%m-%d', time.gmtime(now))
+
+
+def decay(value: float, since: float, now: float, half_life: float) -> float:
+    """قيمة الاستهلاك بعد تناقصها من وقت since حتى now"""
+    if value <= 0 or now <= since:
+        return value
+    return value * 0.5 ** ((now - since) / half_life)
+
+
+def _empty(user_id: int) -> dict:
+    return {
+        'user_id': user_id,
+        'decayed_cpu': 0.0,
+        'decayed_at': 0.0,
+        'day': None,
+        'day_cpu_seconds': 0.0,
+        'day_wall_seconds': 0.0,
+        'day_scans': 0,
+        'total_cpu_seconds': 0.0,
+        'total_wall_seconds': 0.0,
+        'total_scans': 0,
+    }
+
+
+class FairShare:
+    """استهلاك المستخدمين في الذاكرة (يُحمّل من قاعدة البيانات عند البدء ويُحفظ بعد كل فحص)"""
+
+    def __init__(self, half_life_hours: float = None, daily_budget: float = None, weights: dict = None):
+        self.half_life = (USAGE_HALF_LIFE_HOURS if half_life_hours is None else half_life_hours) * 3600
+        self.daily_budget = USER_DAILY_CPU_SECONDS if daily_budget is None else daily_budget
+        self.weights = USAGE_WEIGHTS if weights is None else weights
+        self._users = {}
+
+    def load(self, entries):
+        for entry in entries:
+            self._users[entry['user_id']] = dict(entry)
+
+    def weight(self, user_id: int) -> float:
+        return self.weights.get(user_id, 1.0) or 1.0
+
+    def decayed(self, user_id: int, now: float = None) -> float:
+        """وقت المعالج المتناقص للمستخدم الآن"""
+        entry = self._users.get(user_id)
+        if entry is None:
+            return 0.0
+        return decay(entry['decayed_cpu'], entry['decayed_at'], now or time.time(), self.half_life)
+
+    def share(self, user_id: int, running_cpu: float = 0.0, now: float = None) -> float:
+        """مفتاح الترتيب: الاستهلاك (مع وقت المعالج الجاري لفحوصاته الحالية) مقسوماً على الوزن"""
+        return (self.decayed(user_id, now) + running_cpu) / self.weight(user_id)
+
+    def charge(self, user_id: int, cpu_seconds: float, wall_seconds: float, now: float = None) -> dict:
+        """احتساب فحص منتهٍ على صاحبه وإرجاع السجل المحدث لحفظه"""
+        now = now or time.time()
+        entry = self._users.setdefault(user_id, _empty(user_id))
+        entry['decayed_cpu'] = decay(entry['decayed_cpu'], entry['decayed_at'], now, self.half_life) + cpu_seconds
+        entry['decayed_at'] = now
+        self._roll_day(entry, now)
+        entry['day_cpu_seconds'] += cpu_seconds
+        entry['day_wall_seconds'] += wall_seconds
+        entry['day_scans'] += 1
+        entry['total_cpu_seconds'] += cpu_seconds
+        entry['total_wall_seconds'] += wall_seconds
+        entry['total_scans'] += 1
+        return dict(entry)
+
+    def _roll_day(self, entry: dict, now: float):
+        today = utc_day(now)
+        if entry['day'] != today:
+            entry['day'] = today
+            entry['day_cpu_seconds'] = 0.0
+            entry['day_wall_seconds'] = 0.0
+            entry['day_scans'] = 0
+
+    def today(self, user_id: int, now: float = None) -> dict:
+        """عدادات اليوم الحالي (صفر إذا لم يفحص المستخدم اليوم)"""
+        now = now or time.time()
+        entry = self._users.get(user_id)
+        if entry is None or entry['day'] != utc_day(now):
+            return {'cpu_seconds': 0.0, 'wall_seconds': 0.0, 'scans': 0}
+        return {'cpu_seconds': entry['day_cpu_seconds'], 'wall_seconds': entry['day_wall_seconds'],
+                'scans': entry['day_scans']}
+
+    def remaining(self, user_id: int, now: float = None):
+        """ثواني المعالج المتبقية من ميزانية اليوم، أو None بدون ميزانية"""
+        if not self.daily_budget:
+            return None
+        return max(0.0, self.daily_budget - self.today(user_id, now)['cpu_seconds'])
+
+    def over_budget(self, user_id: int, now: float = None) -> bool:
+        remaining = self.remaining(user_id, now)
+        return remaining is not None and remaining <= 0
+
+    def top(self, limit: int = 10, now: float = None) -> list:
+        """المستخدمون الأعلى استهلاكاً حالياً: [(user_id, الحصة)]"""
+        now = now or time.time()
+        shares = [(user_id, self.share(user_id, now=now)) for user_id in self._users]
+        return sorted((item for item in shares if item[1] > 0), key=lambda item: item[1], reverse=True)[:limit]
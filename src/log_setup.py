@@ -0,0 +1,154 @@
+"""
+إعداد التسجيل لعمليات البوت والعمال دون كتابة على القرص داخل حلقة الأحداث
+كل السجلات تمر عبر QueueHandler إلى خيط خلفي (QueueListener) يكتب إلى الطرفية والملف مع تدوير الملف
+حسب الحجم أو الوقت، بصيغة نصية أو JSON سطراً لكل سجل. كل سطر يحمل معرف الفحص الجاري (scan-<id>)
+من contextvars فتُربط سطور البوت والعامل والأدوات لنفس الفحص، ومخرجات الأدوات تُسجل بعينة قابلة للضبط
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# text أو json (سطر JSON لكل سجل)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+
+# ملف السجل (فارغ = الطرفية فقط) وتدويره: حسب الحجم، أو حسب الوقت إذا حُدد LOG_ROTATE_WHEN (مثل midnight)
+LOG_FILE = os.getenv('LOG_FILE', '')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', '')
+
+# تسجيل سطر واحد من كل N سطر من مخرجات الأدوات لكل فحص (0 = بدون تسجيل، 1 = كل الأسطر)
+LOG_TOOL_OUTPUT_EVERY = int(os.getenv('LOG_TOOL_OUTPUT_EVERY', '0'))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(job_tag)s%(message)s'
+
+# مخرجات الأدوات (stderr في المحرك الأصلي، وكل مخرجات السكربت)
+tool_logger = logging.getLogger('xss.tools')
+
+# معرف الفحص الجاري في المهمة الحالية (تنسخه asyncio للمهام الفرعية وrun_blocking لخيوط العمل الحاجب)
+_job_id = contextvars.ContextVar('job_id', default=None)
+
+_listener = None
+
+
+@contextmanager
+def job_context(job_id):
+    """ربط السجلات داخل الكتلة (والمهام التي تُنشأ فيها) بمعرف الفحص"""
+    token = _job_id.set(str(job_id))
+    try:
+        yield
+    finally:
+        _job_id.reset(token)
+
+
+class JobFilter(logging.Filter):
+    """إضافة معرف الفحص للسجل عند إنشائه (في خيط المستدعي قبل دخوله الطابور)"""
+
+    def filter(self, record):
+        job = _job_id.get()
+        record.job = job
+        record.job_tag = f'[{job}] ' if job else ''
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """تمرير سجل واحد من كل every سجل لكل فحص (التحذيرات والأخطاء تمر دائماً)"""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._counts = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        job = _job_id.get()
+        count = self._counts.get(job, 0)
+        self._counts[job] = count + 1
+        if len(self._counts) > 1024:
+            # عدادات الفحوصات المنتهية
+            self._counts = {job: count + 1}
+        return count % self.every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """سطر JSON لكل سجل"""
+
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        job = getattr(record, 'job', None)
+        if job:
+            entry['job'] = job
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _file_handler(path: str):
+    if LOG_ROTATE_WHEN:
+        return TimedRotatingFileHandler(path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT,
+                                        encoding='utf-8', delay=True)
+    return RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                               encoding='utf-8', delay=True)
+
+
+def setup_logging(log_file: str = None, level: str = None, fmt: str = None, tool_every: int = None):
+    """تثبيت طابور السجلات على الجذر وتشغيل خيط الكتابة (مرة واحدة لكل عملية)، وإرجاع QueueListener"""
+    global _listener
+    if _listener is not None:
+        return _listener
+    log_file = LOG_FILE if log_file is None else log_file
+    fmt = fmt or LOG_FORMAT
+    tool_every = LOG_TOOL_OUTPUT_EVERY if tool_every is None else tool_every
+
+    formatter = JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.append(_file_handler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(JobFilter())
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level or LOG_LEVEL)
+
+    if tool_every > 0:
+        tool_logger.setLevel(logging.INFO)
+        tool_logger.addFilter(SamplingFilter(tool_every))
+    else:
+        # مستوى أعلى من INFO يوقف أسطر الأدوات قبل إنشاء السجل
+        tool_logger.setLevel(logging.WARNING)
+
+    _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """كتابة السجلات المتبقية في الطابور وإيقاف خيط الكتابة"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,157 @@
+"""
+صحة حلقة الأحداث في البوت
+مهمة دورية تقيس تأخر الحلقة (الفرق بين موعد الاستيقاظ المتوقع والفعلي) وتحفظ آخر القياسات لحساب النسب المئوية،
+وخيط مراقبة يلاحظ توقف الحلقة أثناء تنفيذ استدعاء بطيء فيلتقط مكدس خيط الحلقة في تلك اللحظة ويسجله.
+العمل الحاجب (الملفات وقاعدة البيانات) يُنفذ عبر run_blocking في مجمع خيوط محدود الحجم
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import functools
+import threading
+import traceback
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from src.metrics import LOOP_LAG_SECONDS, LOOP_LAG_QUANTILE, LOOP_STALLS, BLOCKING_INFLIGHT, BLOCKING_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# الفاصل بين قياسات تأخر الحلقة بالثواني
+LOOP_LAG_INTERVAL = float(os.getenv('LOOP_LAG_INTERVAL', '0.25'))
+
+# توقف الحلقة أطول من هذا (بالمللي ثانية) يُسجل مع مكدس الاستدعاء الحاجب (0 = بدون خيط مراقبة)
+LOOP_STALL_MS = float(os.getenv('LOOP_STALL_MS', '250'))
+
+# عدد خيوط العمل الحاجب في البوت
+BLOCKING_WORKERS = int(os.getenv('BLOCKING_WORKERS', '8'))
+
+# عدد القياسات المحفوظة لحساب النسب المئوية
+LAG_SAMPLES = 2048
+QUANTILES = (0.5, 0.95, 0.99)
+
+_executor = None
+
+
+def executor() -> ThreadPoolExecutor:
+    """مجمع خيوط العمل الحاجب (يُنشأ عند أول استخدام)"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix='blocking')
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_blocking(func, /, *args, **kwargs):
+    """بديل asyncio.to_thread بمجمع محدود: ينسخ السياق (معرف الفحص في السجلات) ويقيس الانتظار في المجمع"""
+    context = contextvars.copy_context()
+    submitted = time.perf_counter()
+
+    def call():
+        BLOCKING_WAIT_SECONDS.observe(time.perf_counter() - submitted)
+        return context.run(func, *args, **kwargs)
+
+    BLOCKING_INFLIGHT.inc()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor(), call)
+    finally:
+        BLOCKING_INFLIGHT.dec()
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class LoopMonitor:
+    """قياس تأخر حلقة الأحداث والتقاط مكدس الاستدعاءات التي توقفها"""
+
+    def __init__(self, interval: float = None, stall_ms: float = None):
+        self.interval = interval or LOOP_LAG_INTERVAL
+        self.stall_seconds = (LOOP_STALL_MS if stall_ms is None else stall_ms) / 1000
+        self.samples = deque(maxlen=LAG_SAMPLES)
+        # آخر التوقفات: {'at', 'seconds', 'stack'}
+        self.stalls = deque(maxlen=20)
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._loop_thread = None
+        self._beat = None
+
+    def start(self):
+        """بدء القياس من داخل حلقة الأحداث"""
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._measure())
+        for q in QUANTILES:
+            LOOP_LAG_QUANTILE.labels(q).set_function(functools.partial(self.quantile, q))
+        if self.stall_seconds > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watchdog, name='loop-watchdog', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    async def _measure(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.samples.append(lag)
+            LOOP_LAG_SECONDS.observe(lag)
+            self._beat = time.monotonic()
+
+    def _watchdog(self):
+        """خيط مستقل: إذا تأخر القياس التالي أكثر من الحد فالحلقة متوقفة، فيُلتقط مكدسها مرة لكل توقف"""
+        check = min(self.interval, self.stall_seconds) / 2
+        reported = None
+        while not self._stop.wait(check):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.stall_seconds or reported == beat:
+                continue
+            reported = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = ''.join(traceback.format_stack(frame)) if frame is not None else ''
+            self.stalls.append({'at': time.time(), 'seconds': stalled, 'stack': stack})
+            LOOP_STALLS.inc()
+            logger.warning(f"⚠️ حلقة الأحداث متوقفة منذ {stalled * 1000:.0f} ms، الاستدعاء الحاجب:\n{stack}")
+
+    def quantile(self, q: float) -> float:
+        return percentile(sorted(self.samples), q)
+
+    def report(self) -> dict:
+        """النسب المئوية لتأخر الحلقة بالمللي ثانية وعدد التوقفات"""
+        values = sorted(self.samples)
+        report = {f'p{int(q * 100)}_ms': round(percentile(values, q) * 1000, 2) for q in QUANTILES}
+        report['max_ms'] = round(values[-1] * 1000, 2) if values else 0.0
+        report['samples'] = len(values)
+        report['stalls'] = len(self.stalls)
+        return report
+
+
+def format_report(report: dict) -> str:
+    """نص حالة الحلقة لأمر /health"""
+    return (
+        f"⏱️ تأخر حلقة الأحداث: p50 {report['p50_ms']} ms، p95 {report['p95_ms']} ms، "
+        f"p99 {report['p99_ms']} ms، الأقصى {report['max_ms']} ms (توقفات مسجلة: {report['stalls']})"
+    )
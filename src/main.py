@@ -1,23 +1,99 @@
 import os
 import sys
+import threading
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask, Response, jsonify, send_from_directory
+from werkzeug.serving import make_server
+from sqlalchemy import event, inspect, literal
+from sqlalchemy.engine import Engine
 from src.models.user import db
+from src.models.scan import Scan, Finding
+from src.models.broker import BrokerJob, BrokerWorker
+from src.models.scope import ScopeEntry
+from src.models.usage import UserUsage
 from src.routes.user import user_bp
+from src.routes.webhook import webhook_bp
+from src.metrics import REGISTRY
+from src import toolchain
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
 app.register_blueprint(user_bp, url_prefix='/api')
+app.register_blueprint(webhook_bp)
 
 # uncomment if you need to use database
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
+    'DATABASE_URL',
+    f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+# Connection pool for file databases (in-memory SQLite keeps its single connection)
+if ':memory:' not in app.config['SQLALCHEMY_DATABASE_URI'] and app.config['SQLALCHEMY_DATABASE_URI'] != 'sqlite://':
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
+        'pool_timeout': 10,
+        'pool_recycle': 3600,
+        'pool_pre_ping': True,
+    }
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL mode lets the bot write scan results while the API reads
+    if type(dbapi_connection).__module__.startswith('sqlite3'):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.execute("PRAGMA cache_size=-20000")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+def add_missing_columns(engine):
+    # create_all never alters an existing table: add the columns introduced since the database was created
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    added = []
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = (f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN "
+                       f"{preparer.format_column(column)} {column.type.compile(dialect=engine.dialect)}")
+                if column.default is not None and column.default.is_scalar:
+                    default = literal(column.default.arg, column.type).compile(
+                        dialect=engine.dialect, compile_kwargs={'literal_binds': True})
+                    ddl += f" NOT NULL DEFAULT {default}" if not column.nullable else f" DEFAULT {default}"
+                connection.exec_driver_sql(ddl)
+                added.append(f'{table.name}.{column.name}')
+    return added
+
 db.init_app(app)
 with app.app_context():
     db.create_all()
+    add_missing_columns(db.engine)
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/health')
+def health():
+    # Toolchain summary from the startup preflight; never runs the tools from a request
+    manifest = toolchain.cached()
+    if manifest is None:
+        return jsonify({'ok': False, 'error': 'toolchain preflight has not run'}), 503
+    summary = toolchain.health(manifest)
+    return jsonify(summary), 200 if summary['ok'] else 503
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -36,5 +112,13 @@ def serve(path):
             return "index.html not found", 404
 
 
+def start_http_server(host='0.0.0.0', port=None):
+    """Serve the Flask app from a background thread (used by the bot process)"""
+    server = make_server(host, port or int(os.getenv('PORT', '5000')), app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='http-server', daemon=True)
+    thread.start()
+    return server
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,292 @@
+"""
+مقاييس الأداء بصيغة Prometheus النصية دون الاعتماد على مكتبات خارجية
+تُعرض عبر /metrics في تطبيق Flask (src/main.py)
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 900, 1800, 3600)
+
+
+def _format_labels(labelnames, values, extra=None) -> str:
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            # المقاييس بدون تسميات تظهر بقيمة صفر قبل أول استخدام
+            self.labels()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new_child()
+            return child
+
+    def _default(self):
+        return self.labels(*([''] * len(self.labelnames))) if self.labelnames else self.labels()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def render(self, name, labelnames, values):
+        return [f'{name}{_format_labels(labelnames, values)} {self.value}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set_function(self, function):
+        """حساب القيمة عند كل قراءة لـ /metrics"""
+        self.function = function
+
+    def render(self, name, labelnames, values):
+        value = self.function() if self.function else self.value
+        return [f'{name}{_format_labels(labelnames, values)} {value}']
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._default().dec(amount)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def render(self, name, labelnames, values):
+        lines = [
+            f'{name}_bucket{_format_labels(labelnames, values, ("le", bound))} {count}'
+            for bound, count in zip(self.buckets, self.counts)
+        ]
+        lines.append(f'{name}_bucket{_format_labels(labelnames, values, ("le", "+Inf"))} {self.count}')
+        lines.append(f'{name}_sum{_format_labels(labelnames, values)} {self.sum}')
+        lines.append(f'{name}_count{_format_labels(labelnames, values)} {self.count}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class ProcessTracker:
+    """تتبع عمليات الفحص الجارية لحساب عددها واستهلاكها للذاكرة (RSS) مع العمليات الفرعية"""
+
+    def __init__(self):
+        self._pids = set()
+        self._lock = threading.Lock()
+
+    def track(self, pid: int):
+        with self._lock:
+            self._pids.add(pid)
+
+    def untrack(self, pid: int):
+        with self._lock:
+            self._pids.discard(pid)
+
+    def count(self) -> int:
+        return len(self._pids)
+
+    def rss_bytes(self) -> int:
+        with self._lock:
+            roots = set(self._pids)
+        if not roots or not os.path.isdir('/proc'):
+            return 0
+
+        # بناء شجرة العمليات من /proc مرة واحدة
+        children = {}
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+
+        total = 0
+        stack = list(roots)
+        seen = set()
+        while stack:
+            pid = stack.pop()
+            if pid in seen:
+                continue
+            seen.add(pid)
+            stack.extend(children.get(pid, ()))
+            total += process_rss_bytes(pid)
+        return total
+
+
+def process_rss_bytes(pid: int) -> int:
+    """ذاكرة RSS لعملية واحدة بالبايت (0 إذا انتهت العملية)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+REGISTRY = Registry()
+PROCESSES = ProcessTracker()
+
+SCANS_STARTED = REGISTRY.register(Counter('xss_scans_started_total', 'Scans that started running'))
+SCANS_FAILED = REGISTRY.register(Counter('xss_scans_failed_total', 'Scans that finished with an error'))
+SCANS_CACHED = REGISTRY.register(Counter('xss_scans_cached_total', 'Scan requests answered from the result cache'))
+SCANS_COALESCED = REGISTRY.register(Counter('xss_scans_coalesced_total', 'Scan requests joined to an in-flight scan'))
+URLS_COLLAPSED = REGISTRY.register(Counter('xss_urls_collapsed_total', 'Collected URLs dropped as duplicates of an earlier URL pattern'))
+
+QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram('xss_scan_queue_wait_seconds', 'Time a scan waited in the queue'))
+SUBPROCESS_SECONDS = REGISTRY.register(Histogram('xss_scan_subprocess_seconds', 'Wall time of the scan subprocess'))
+STAGE_SECONDS = REGISTRY.register(Histogram('xss_scan_stage_seconds', 'Wall time per scan stage', ['stage']))
+SCAN_STARTUP_SECONDS = REGISTRY.register(Histogram(
+    'xss_scan_startup_seconds', 'Time from scan start until the first tool process is launched',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+))
+PARSE_SECONDS = REGISTRY.register(Histogram('xss_scan_parse_seconds', 'Time spent parsing scan results'))
+TELEGRAM_SECONDS = REGISTRY.register(Histogram(
+    'xss_telegram_request_seconds', 'Telegram Bot API call latency', ['method'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+))
+LOOP_LAG_SECONDS = REGISTRY.register(Histogram(
+    'xss_event_loop_lag_seconds', 'Delay between the expected and actual wake-up of the event loop lag probe',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+))
+BLOCKING_WAIT_SECONDS = REGISTRY.register(Histogram(
+    'xss_blocking_wait_seconds', 'Time blocking calls waited for a free thread in the bounded executor',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+))
+
+QUEUE_PENDING = REGISTRY.register(Gauge('xss_scan_queue_pending', 'Scans waiting in the queue'))
+QUEUE_RUNNING = REGISTRY.register(Gauge('xss_scan_queue_running', 'Scans currently running'))
+ACTIVE_SUBPROCESSES = REGISTRY.register(Gauge('xss_active_subprocesses', 'Running scan subprocesses'))
+SUBPROCESS_RSS = REGISTRY.register(Gauge('xss_subprocess_rss_bytes', 'Resident memory of scan subprocess trees'))
+RESULTS_BYTES = REGISTRY.register(Gauge('xss_results_bytes', 'Size of the results directory after the last maintenance pass'))
+RESULTS_DIRS = REGISTRY.register(Gauge('xss_results_dirs', 'Scan directories under the results directory'))
+RESULTS_COMPACTED = REGISTRY.register(Counter('xss_results_compacted_total', 'Cold scan directories compacted by maintenance'))
+RESULTS_EVICTED = REGISTRY.register(Counter('xss_results_evicted_total', 'Scan directories deleted by age or quota'))
+RESULTS_FREED_BYTES = REGISTRY.register(Counter('xss_results_freed_bytes_total', 'Bytes freed by results maintenance'))
+LOOP_LAG_QUANTILE = REGISTRY.register(Gauge(
+    'xss_event_loop_lag_quantile_seconds', 'Event loop lag percentiles over the recent probe samples', ['quantile']
+))
+LOOP_STALLS = REGISTRY.register(Counter('xss_event_loop_stalls_total', 'Event loop stalls captured with a stack trace'))
+BLOCKING_INFLIGHT = REGISTRY.register(Gauge('xss_blocking_inflight', 'Blocking calls queued or running in the bounded executor'))
+
+ACTIVE_SUBPROCESSES.set_function(PROCESSES.count)
+SUBPROCESS_RSS.set_function(PROCESSES.rss_bytes)
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+from src.models.user import db
+
+class BrokerJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    scan_id = db.Column(db.Integer, nullable=False)
+    domain = db.Column(db.String(253), nullable=False)
+    resume = db.Column(db.Boolean, nullable=False, default=True)
+    targets = db.Column(db.Text)
+    diff = db.Column(db.Boolean, nullable=False, default=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    worker_id = db.Column(db.String(128))
+    lease_expires_at = db.Column(db.DateTime)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    progress = db.Column(db.Text)
+    result = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_broker_job_status', 'status', 'id'),
+        db.Index('ix_broker_job_scan', 'scan_id'),
+    )
+
+    def __repr__(self):
+        return f'<BrokerJob {self.id} {self.domain} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'scan_id': self.scan_id,
+            'domain': self.domain,
+            'resume': self.resume,
+            'targets': self.targets.split('\n') if self.targets else None,
+            'diff': self.diff,
+            'status': self.status,
+            'worker_id': self.worker_id,
+            'lease_expires_at': self.lease_expires_at.isoformat() if self.lease_expires_at else None,
+            'attempts': self.attempts,
+            'cancel_requested': self.cancel_requested,
+            'progress': self.progress,
+            'result': self.result,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class BrokerWorker(db.Model):
+    id = db.Column(db.String(128), primary_key=True)
+    hostname = db.Column(db.String(255), nullable=False)
+    pid = db.Column(db.Integer, nullable=False)
+    capacity = db.Column(db.Integer, nullable=False, default=1)
+    running = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<BrokerWorker {self.id}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'hostname': self.hostname,
+            'pid': self.pid,
+            'capacity': self.capacity,
+            'running': self.running,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None
+        }
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+from src.models.user import db
+
+class Scan(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.BigInteger, nullable=False)
+    chat_id = db.Column(db.BigInteger, nullable=False)
+    domain = db.Column(db.String(253), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    results_dir = db.Column(db.String(512))
+    error = db.Column(db.Text)
+    source_scan_id = db.Column(db.Integer, db.ForeignKey('scan.id'))
+    wayback_urls = db.Column(db.Integer, nullable=False, default=0)
+    subdomains = db.Column(db.Integer, nullable=False, default=0)
+    live_urls = db.Column(db.Integer, nullable=False, default=0)
+    xss_ready_urls = db.Column(db.Integer, nullable=False, default=0)
+    vulnerable_urls = db.Column(db.Integer, nullable=False, default=0)
+    cpu_seconds = db.Column(db.Float)
+    wall_seconds = db.Column(db.Float)
+    peak_rss_bytes = db.Column(db.BigInteger)
+    targets = db.Column(db.Text)
+    diff = db.Column(db.Boolean, nullable=False, default=False)
+    fresh = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        db.Index('ix_scan_user_domain_created', 'user_id', 'domain', 'created_at'),
+        db.Index('ix_scan_status', 'status'),
+    )
+
+    def __repr__(self):
+        return f'<Scan {self.id} {self.domain}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'chat_id': self.chat_id,
+            'domain': self.domain,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'results_dir': self.results_dir,
+            'error': self.error,
+            'source_scan_id': self.source_scan_id,
+            'wayback_urls': self.wayback_urls,
+            'subdomains': self.subdomains,
+            'live_urls': self.live_urls,
+            'xss_ready_urls': self.xss_ready_urls,
+            'vulnerable_urls': self.vulnerable_urls,
+            'cpu_seconds': self.cpu_seconds,
+            'wall_seconds': self.wall_seconds,
+            'peak_rss_bytes': self.peak_rss_bytes,
+            'targets': self.targets.split('\n') if self.targets else None,
+            'diff': bool(self.diff),
+            'fresh': bool(self.fresh)
+        }
+
+
+class Finding(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    scan_id = db.Column(db.Integer, db.ForeignKey('scan.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    url = db.Column(db.Text, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_finding_scan_kind_position', 'scan_id', 'kind', 'position'),
+    )
+
+    def __repr__(self):
+        return f'<Finding {self.kind} {self.url}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'scan_id': self.scan_id,
+            'kind': self.kind,
+            'position': self.position,
+            'url': self.url
+        }
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from src.models.user import db
+
+class ScopeEntry(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.BigInteger, nullable=False)
+    pattern = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'pattern', name='uq_scope_user_pattern'),
+    )
+
+    def __repr__(self):
+        return f'<ScopeEntry {self.user_id} {self.pattern}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'pattern': self.pattern,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,32 @@
+from src.models.user import db
+
+class UserUsage(db.Model):
+    user_id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    # وقت المعالج المتناقص مع الزمن (لترتيب الطابور) ووقت آخر تحديث له (ثوانٍ منذ epoch)
+    decayed_cpu = db.Column(db.Float, nullable=False, default=0.0)
+    decayed_at = db.Column(db.Float, nullable=False, default=0.0)
+    # عدادات اليوم الحالي (UTC) للميزانية اليومية
+    day = db.Column(db.String(10))
+    day_cpu_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    day_wall_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    day_scans = db.Column(db.Integer, nullable=False, default=0)
+    total_cpu_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    total_wall_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    total_scans = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<UserUsage {self.user_id}>'
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'decayed_cpu': self.decayed_cpu,
+            'decayed_at': self.decayed_at,
+            'day': self.day,
+            'day_cpu_seconds': self.day_cpu_seconds,
+            'day_wall_seconds': self.day_wall_seconds,
+            'day_scans': self.day_scans,
+            'total_cpu_seconds': self.total_cpu_seconds,
+            'total_wall_seconds': self.total_wall_seconds,
+            'total_scans': self.total_scans
+        }
@@ -0,0 +1,495 @@
+"""
+محرك الفحص الأصلي: خط أنابيب غير متزامن بمرحلة مستقلة لكل أداة
+كل أداة تعمل كعملية فرعية خاصة بها، وتنتقل الأسطر بين المراحل عبر قنوات asyncio محدودة،
+فتبدأ المراحل اللاحقة بالعمل بينما ما زال جمع الروابط مستمراً.
+يكتب نفس ملفات النتائج التي يكتبها سكربت xss_automation.sh حتى يبقى التحليل والعرض كما هما
+"""
+
+import os
+import re
+import time
+import shutil
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from urllib.parse import urlsplit
+
+from src.scan_progress import iter_lines
+from src.scan_checkpoint import Checkpoint
+from src.results_parser import CHUNK_SIZE, SAMPLE_SIZE
+from src.results_format import RESULTS_FILE, has_result_file, iter_result_lines
+from src.url_dedup import UrlDeduplicator, BloomFilter, pattern_key, url_key
+from src.process_limits import JobControl, KILL_GRACE
+from src.domain_utils import Scope
+from src.toolchain import COLLECTORS, REQUIRED_TOOLS, tool_env, tool_paths
+from src.log_setup import tool_logger
+from src.loop_health import run_blocking
+from src.metrics import URLS_COLLAPSED, SCAN_STARTUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# سعة كل قناة بين مرحلتين (عند امتلائها ينتظر المنتج المستهلك)
+STREAM_BUFFER = int(os.getenv('PIPELINE_BUFFER', '1000'))
+
+# أقصى طول لسطر من مخرجات الأدوات
+LINE_LIMIT = 1024 * 1024
+
+# حجم دفعة الكتابة إلى ملف المرحلة (كل دفعة تُكتب في خيط خارج حلقة الأحداث)
+WRITE_BUFFER = 64 * 1024
+
+HTTPX_THREADS = int(os.getenv('PIPELINE_HTTPX_THREADS', '50'))
+DALFOX_WORKERS = int(os.getenv('PIPELINE_DALFOX_WORKERS', '50'))
+
+# المرحلة المعروضة للمستخدم عند ظهور أول مخرجات من كل أداة
+TOOL_STAGES = {
+    'subfinder': 'subdomains',
+    'waybackurls': 'wayback',
+    'gau': 'wayback',
+    'httpx': 'live',
+    'dalfox': 'testing',
+}
+
+# امتدادات الملفات الثابتة التي لا فائدة من فحصها
+STATIC_EXTENSIONS = (
+    '.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.webp', '.bmp',
+    '.woff', '.woff2', '.ttf', '.eot', '.otf', '.mp4', '.mp3', '.avi', '.mov', '.webm',
+    '.pdf', '.zip', '.gz', '.tar', '.rar', '.7z', '.exe', '.dmg', '.iso',
+)
+
+# مراحل الاستئناف بالترتيب: مفتاح الإحصائية وملف النتائج
+CHECKPOINT_STAGES = [
+    ('subdomains', 'subdomains.txt'),
+    ('wayback_urls', 'wayback.txt'),
+    ('live_urls', 'live_uro1.txt'),
+    ('xss_ready_urls', 'xss_ready.txt'),
+    ('vulnerable_urls', 'Vulnerable_XSS.txt'),
+]
+
+# الفحص التفاضلي: ملفات آخر فحص مكتمل تُنقل إلى previous/ ويُقارن بها الفحص الجديد
+PREVIOUS_DIR = 'previous'
+BASELINE_URLS = 'wayback.txt'
+BASELINE_FINDINGS = 'Vulnerable_XSS.txt'
+DELTA_NEW_FILE = 'delta_new.txt'
+DELTA_GONE_FILE = 'delta_gone.txt'
+
+# سطر ثغرة في مخرجات dalfox: [POC][G][GET][...] http://...
+POC_PATTERN = re.compile(r'^\[POC\].*?(https?://\S+)')
+
+
+def _write_chunk(f, digest, data: bytes, sync: bool = False):
+    """كتابة دفعة وتحديث بصمتها (وحفظها على القرص مع آخر دفعة)"""
+    f.write(data)
+    digest.update(data)
+    if sync:
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class PipelineError(Exception):
+    """فشل مرحلة إلزامية في خط الأنابيب"""
+
+
+def parse_dalfox_line(line: str):
+    """استخراج رابط إثبات الثغرة من سطر dalfox"""
+    match = POC_PATTERN.search(line)
+    return match.group(1) if match else None
+
+
+def parse_httpx_line(line: str):
+    """httpx -silent يطبع الرابط أولاً في كل سطر"""
+    parts = line.split()
+    return parts[0] if parts else None
+
+
+class Stream:
+    """قناة أسطر بين المراحل: لكل مشترك طابور محدود، وتُغلق بعد انتهاء جميع المنتجين"""
+
+    def __init__(self, producers: int = 1):
+        self.producers = producers
+        self.count = 0
+        self._queues = []
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=STREAM_BUFFER)
+        self._queues.append(queue)
+        return queue
+
+    async def put(self, line: str):
+        self.count += 1
+        for queue in self._queues:
+            await queue.put(line)
+
+    async def close(self):
+        self.producers -= 1
+        if self.producers <= 0:
+            for queue in self._queues:
+                await queue.put(None)
+
+
+async def drain(queue: asyncio.Queue):
+    """قراءة الأسطر من طابور حتى علامة الإغلاق"""
+    while True:
+        line = await queue.get()
+        if line is None:
+            return
+        yield line
+
+
+class ScanPipeline:
+    """
+    subfinder ─► النطاقات ─► waybackurls + gau ─► تصفية ─► httpx ─► روابط بمعاملات ─► dalfox
+    كل سهم قناة Stream، وكل مرحلة تكتب ملف النتائج الخاص بها أثناء مرور الأسطر
+    """
+
+    def __init__(self, domain: str, results_dir: str, on_progress=None, tools: dict = None,
+                 resume: bool = True, control: JobControl = None, targets: list = None,
+                 diff: bool = False):
+        self.domain = domain.lower()
+        # الفحص الجماعي: كل الأهداف تمر بنفس المراحل مرة واحدة، وdomain اسم الدفعة
+        self.targets = list(targets) if targets else [self.domain]
+        self.scope = Scope(self.targets)
+        self.results_dir = results_dir
+        self.on_progress = on_progress
+        self.resume = resume
+        # الروابط التي جُمعت في الفحص السابق لا تُعاد لـ httpx وdalfox إلا إذا كانت فيها ثغرة
+        self.diff = diff
+        self.resumed_from = None
+        self.checkpoint = Checkpoint(results_dir, self.domain)
+        self.env = tool_env()
+        # المسارات من فحص الأدوات عند بدء البوت أو العامل (src/toolchain.py)
+        self.tools = tools if tools is not None else tool_paths()
+        self.control = control or JobControl()
+        self._started = None
+
+    def _progress(self, stage: str):
+        if self.on_progress is not None:
+            self.on_progress(stage)
+
+    async def run(self) -> dict:
+        """تشغيل المراحل المتبقية بالتوازي وإرجاع {'success': ..., 'error': ...}"""
+        self._started = time.perf_counter()
+        await run_blocking(os.makedirs, self.results_dir, exist_ok=True)
+        finished_before = self.diff and await run_blocking(self.checkpoint.last_finished)
+        first = await self._resume_index() + 1
+        if first == 0 and self.diff:
+            await run_blocking(self._snapshot_previous, finished_before)
+            self.checkpoint.data['diff'] = {}
+        if first == len(CHECKPOINT_STAGES):
+            return await self._finished(None)
+
+        collectors = [name for name in COLLECTORS if self.tools.get(name)]
+        needed = [name for name, index in (('httpx', 2), ('dalfox', 4)) if first <= index]
+        missing = [name for name in needed if not self.tools.get(name)]
+        if first <= 1 and not collectors:
+            missing.append(' أو '.join(COLLECTORS))
+        if missing:
+            return {'success': False, 'error': f"أدوات غير مثبتة: {', '.join(missing)}"}
+
+        await run_blocking(self.checkpoint.discard, [stage for stage, _ in CHECKPOINT_STAGES[first:]])
+
+        # بناء القنوات والاشتراكات قبل تشغيل أي مرحلة
+        streams = {stage: Stream() for stage, _ in CHECKPOINT_STAGES}
+        if first <= 1:
+            streams['wayback_urls'] = Stream(producers=len(collectors))
+        hosts = Stream()
+        candidates = Stream()
+
+        writers = {
+            stage: asyncio.ensure_future(self._write_file(streams[stage].subscribe(), filename, stage))
+            for stage, filename in CHECKPOINT_STAGES[first:]
+        }
+        stages = list(writers.values())
+        if first > 0:
+            # إعادة بث آخر مرحلة مكتملة من ملفها إلى المراحل اللاحقة
+            stage, filename = CHECKPOINT_STAGES[first - 1]
+            logger.info(f"استئناف فحص {self.domain} بعد مرحلة {stage}")
+            self.resumed_from = stage
+            stages.append(self._replay(filename, streams[stage]))
+
+        if first <= 0:
+            if self.tools.get('subfinder'):
+                subfinder_args = await run_blocking(self._subfinder_args)
+                stages.append(self._run_tool('subfinder', subfinder_args, None,
+                                             streams['subdomains'], required=False))
+            else:
+                logger.warning("subfinder غير مثبتة، سيتم فحص النطاق الرئيسي فقط")
+                stages.append(streams['subdomains'].close())
+        if first <= 1:
+            stages.append(self._hosts(streams['subdomains'].subscribe(), hosts))
+            for name in collectors:
+                stages.append(self._run_tool(name, [], hosts.subscribe(), streams['wayback_urls'],
+                                             required=False))
+        if first <= 2:
+            stages.append(self._filter_urls(streams['wayback_urls'].subscribe(), candidates))
+            stages.append(self._run_tool('httpx', ['-silent', '-no-color', '-threads', str(HTTPX_THREADS)],
+                                         candidates.subscribe(), streams['live_urls'], parse=parse_httpx_line))
+        if first <= 3:
+            stages.append(self._with_params(streams['live_urls'].subscribe(), streams['xss_ready_urls']))
+        if first <= 4:
+            stages.append(self._run_tool('dalfox', ['pipe', '--silence', '--no-color', '--skip-bav',
+                                                    '-w', str(DALFOX_WORKERS)],
+                                         streams['xss_ready_urls'].subscribe(), streams['vulnerable_urls'],
+                                         parse=parse_dalfox_line))
+
+        tasks = [asyncio.ensure_future(stage) for stage in stages]
+        try:
+            await asyncio.gather(*tasks)
+        except PipelineError as e:
+            # المراحل التي أغلق منتجوها قنواتها قبل الفشل تكمل الكتابة لتُحفظ كنقاط استئناف
+            closed = [task for stage, task in writers.items() if streams[stage].producers <= 0 and not task.done()]
+            if closed:
+                await asyncio.wait(closed, timeout=KILL_GRACE)
+            return {'success': False, 'error': str(e)}
+        finally:
+            for task in tasks:
+                task.cancel()
+            # إنهاء مجموعات عمليات الأدوات كاملة (بما فيها أي عمليات أنشأتها)
+            await self.control.terminate()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        return await self._finished(self.resumed_from)
+
+    async def _finished(self, resumed_from) -> dict:
+        result = {'success': True, 'counts': self.checkpoint.counts(), 'resumed_from': resumed_from}
+        if self.diff:
+            result['delta'] = await run_blocking(self._delta)
+        await run_blocking(self.checkpoint.finish)
+        return result
+
+    async def _resume_index(self) -> int:
+        """رقم آخر مرحلة مكتملة يمكن الاستئناف بعدها (-1 للبدء من الصفر)"""
+        if not self.resume:
+            await run_blocking(self.checkpoint.reset)
+            return -1
+        if not await run_blocking(self.checkpoint.load):
+            return -1
+        if self.checkpoint.data.get('diff') is not None:
+            # فحص تفاضلي توقف (بعد إعادة تشغيل مثلاً) يُكمل بنفس الأساس
+            self.diff = True
+        elif self.diff:
+            await run_blocking(self.checkpoint.reset)
+            return -1
+        # يكفي أن تكون آخر مرحلة مكتملة سليمة، فالمراحل التالية تعتمد عليها فقط
+        for index in range(len(CHECKPOINT_STAGES) - 1, -1, -1):
+            stage, _ = CHECKPOINT_STAGES[index]
+            if await run_blocking(self.checkpoint.is_complete, stage):
+                return index
+        return -1
+
+    async def _run_tool(self, name: str, args: list, source, output: Stream, parse=None, required=True):
+        """تشغيل أداة كعملية فرعية: تُغذى من source وتُرسل مخرجاتها إلى output سطراً بسطر"""
+        try:
+            process = await self.control.spawn(
+                self.tools[name], *args,
+                stdin=asyncio.subprocess.PIPE if source is not None else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=self.env,
+                limit=LINE_LIMIT
+            )
+        except OSError as e:
+            if required:
+                raise PipelineError(f"تعذر تشغيل أداة {name}: {str(e)}")
+            logger.warning(f"تعذر تشغيل أداة {name}: {str(e)}")
+            if source is not None:
+                async for _ in drain(source):
+                    pass
+            await output.close()
+            return
+        if self._started is not None:
+            # زمن البدء: من استلام الفحص حتى تشغيل أول أداة
+            SCAN_STARTUP_SECONDS.observe(time.perf_counter() - self._started)
+            self._started = None
+        stderr_tail = deque(maxlen=5)
+        stage = TOOL_STAGES[name]
+
+        async def feed():
+            try:
+                async for line in drain(source):
+                    process.stdin.write(line.encode() + b'\n')
+                    await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                # انتهت الأداة مبكراً، يستمر التفريغ حتى لا تتوقف المرحلة السابقة
+                async for _ in drain(source):
+                    pass
+            finally:
+                process.stdin.close()
+
+        async def read_stdout():
+            async for line in iter_lines(process.stdout):
+                value = parse(line) if parse else line.strip()
+                if value:
+                    self._progress(stage)
+                    await output.put(value)
+
+        async def read_stderr():
+            async for line in iter_lines(process.stderr):
+                stderr_tail.append(line)
+                tool_logger.info('%s: %s', name, line)
+
+        readers = [read_stdout(), read_stderr()]
+        if source is not None:
+            readers.append(feed())
+        try:
+            await asyncio.gather(*readers)
+            await process.wait()
+        finally:
+            self.control.release(process)
+
+        if process.returncode != 0:
+            error_tail = ' '.join(stderr_tail)
+            message = f"فشلت أداة {name} (رمز {process.returncode}): {error_tail[-200:]}"
+            if required:
+                # لا تُغلق القناة حتى لا تُسجل مخرجات ناقصة كمرحلة مكتملة
+                raise PipelineError(message)
+            logger.warning(message)
+        await output.close()
+
+    def _subfinder_args(self) -> list:
+        if len(self.targets) == 1:
+            return ['-d', self.targets[0], '-silent']
+        path = os.path.join(self.results_dir, 'targets.txt')
+        with open(path, 'w') as f:
+            f.write('\n'.join(self.targets) + '\n')
+        return ['-dL', path, '-silent']
+
+    async def _hosts(self, source: asyncio.Queue, output: Stream):
+        """الأهداف الرئيسية أولاً ثم كل نطاق فرعي جديد ضمنها"""
+        seen = set()
+        for target in self.targets:
+            if target not in seen:
+                seen.add(target)
+                await output.put(target)
+        async for host in drain(source):
+            host = host.lower().rstrip('.')
+            if host not in seen and self.scope.allows(host):
+                seen.add(host)
+                await output.put(host)
+        await output.close()
+
+    async def _filter_urls(self, source: asyncio.Queue, output: Stream):
+        """توحيد الروابط وإزالة المتشابهة والملفات الثابتة والروابط خارج النطاق قبل httpx"""
+        dedup = UrlDeduplicator()
+        baseline, recheck = await run_blocking(self._load_baseline) if self.diff else (None, None)
+        new = unchanged = 0
+        async for url in drain(source):
+            normalized = dedup.add(url)
+            if normalized is None:
+                continue
+            parts = urlsplit(normalized)
+            if not self.scope.allows(parts.hostname or ''):
+                continue
+            if parts.path.lower().endswith(STATIC_EXTENSIONS):
+                continue
+            if baseline is not None:
+                key = pattern_key(normalized)
+                if key in baseline and key not in recheck:
+                    unchanged += 1
+                    continue
+            new += 1
+            await output.put(normalized)
+        URLS_COLLAPSED.inc(dedup.total - dedup.unique)
+        logger.info(f"توحيد روابط {self.domain}: {dedup.unique} نمط فريد من {dedup.total} رابط")
+        if self.diff:
+            # يُحفظ مع نقطة الاستئناف التالية
+            self.checkpoint.data['diff'] = {'new_urls': new, 'unchanged_urls': unchanged}
+            logger.info(f"فحص تفاضلي لـ {self.domain}: {new} رابط جديد، {unchanged} بدون تغيير")
+        await output.close()
+
+    def _snapshot_previous(self, finished: bool):
+        """نقل ملفات آخر فحص مكتمل إلى previous/ (إن لم يكتمل يبقى الأساس الأقدم كما هو)
+        results.xrf يُنقل معها لأنه يحمل نفس الملفات إذا ضغطت الصيانة المجلد"""
+        if not finished:
+            return
+        previous = os.path.join(self.results_dir, PREVIOUS_DIR)
+        shutil.rmtree(previous, ignore_errors=True)
+        os.makedirs(previous)
+        for filename in (BASELINE_URLS, BASELINE_FINDINGS, RESULTS_FILE):
+            path = os.path.join(self.results_dir, filename)
+            if os.path.exists(path):
+                os.replace(path, os.path.join(previous, filename))
+
+    def _load_baseline(self):
+        """أنماط روابط الفحص السابق في مرشح Bloom، وأنماط ثغراته التي يُعاد اختبارها دائماً"""
+        previous = os.path.join(self.results_dir, PREVIOUS_DIR)
+        if not has_result_file(previous, BASELINE_URLS):
+            return None, None
+        baseline = BloomFilter()
+        for url in iter_result_lines(previous, BASELINE_URLS):
+            key = url_key(url)
+            if key is not None:
+                baseline.add(key)
+        recheck = set(self._findings(previous))
+        return baseline, recheck
+
+    def _findings(self, results_dir: str) -> dict:
+        """روابط إثبات الثغرات حسب نمطها (قيم المعاملات تحمل الحمولة فتختلف بين الفحوصات)"""
+        findings = {}
+        for line in iter_result_lines(results_dir, BASELINE_FINDINGS):
+            findings.setdefault(url_key(line) or line, line)
+        return findings
+
+    def _delta(self) -> dict:
+        """مقارنة ثغرات هذا الفحص بالسابق وكتابة الجديدة والمختفية في delta_new.txt وdelta_gone.txt"""
+        previous = self._findings(os.path.join(self.results_dir, PREVIOUS_DIR))
+        current = self._findings(self.results_dir)
+        new = [line for key, line in current.items() if key not in previous]
+        gone = [line for key, line in previous.items() if key not in current]
+        for filename, lines in ((DELTA_NEW_FILE, new), (DELTA_GONE_FILE, gone)):
+            with open(os.path.join(self.results_dir, filename), 'w', encoding='utf-8') as f:
+                f.writelines(line + '\n' for line in lines)
+        counts = self.checkpoint.data.get('diff') or {}
+        return {
+            'baseline': has_result_file(os.path.join(self.results_dir, PREVIOUS_DIR), BASELINE_URLS),
+            'new_urls': counts.get('new_urls', 0),
+            'unchanged_urls': counts.get('unchanged_urls', 0),
+            'new_findings': len(new),
+            'gone_findings': len(gone),
+            'persisting_findings': len(current) - len(new),
+            'samples': {'new': new[:SAMPLE_SIZE], 'gone': gone[:SAMPLE_SIZE]},
+        }
+
+    async def _with_params(self, source: asyncio.Queue, output: Stream):
+        """الروابط النشطة التي تحتوي معاملات هي فقط ما يُختبر بـ dalfox"""
+        async for url in drain(source):
+            if '?' in url and '=' in url.split('?', 1)[1]:
+                await output.put(url)
+        await output.close()
+
+    async def _write_file(self, source: asyncio.Queue, filename: str, stage: str):
+        """كتابة مخرجات المرحلة إلى ملفها على دفعات خارج حلقة الأحداث ثم تسجيلها كنقطة استئناف"""
+        digest = hashlib.sha256()
+        count = 0
+        buffer = bytearray()
+        f = await run_blocking(open, os.path.join(self.results_dir, filename), 'wb')
+        try:
+            async for line in drain(source):
+                buffer += line.encode('utf-8', errors='ignore') + b'\n'
+                count += 1
+                if len(buffer) >= WRITE_BUFFER:
+                    await run_blocking(_write_chunk, f, digest, bytes(buffer))
+                    buffer.clear()
+            await run_blocking(_write_chunk, f, digest, bytes(buffer), True)
+        finally:
+            await run_blocking(f.close)
+        await run_blocking(self.checkpoint.complete, stage, filename, digest.hexdigest(), count)
+
+    async def _replay(self, filename: str, output: Stream):
+        """بث ملف مرحلة مكتملة سطراً بسطر بدلاً من إعادة تشغيل أدواتها (يُقرأ على دفعات خارج حلقة الأحداث)"""
+        f = await run_blocking(open, os.path.join(self.results_dir, filename), 'rb')
+        try:
+            carry = b''
+            while True:
+                chunk = await run_blocking(f.read, CHUNK_SIZE)
+                lines = (carry + chunk).split(b'\n')
+                carry = lines.pop() if chunk else b''
+                for line in lines:
+                    line = line.decode('utf-8', errors='ignore').strip()
+                    if line:
+                        await output.put(line)
+                if not chunk:
+                    break
+        finally:
+            await run_blocking(f.close)
+        await output.close()
@@ -0,0 +1,310 @@
+"""
+حدود موارد عمليات الفحص الفرعية
+كل عملية تعمل في مجموعة عمليات خاصة بها مع حدود ذاكرة ووقت معالج وأولوية منخفضة،
+وتُجمع موارد كل مهمة (وقت المعالج وأعلى ذاكرة) ويمكن إنهاء شجرة العمليات كاملة عند الإلغاء
+"""
+
+import os
+import time
+import signal
+import asyncio
+import logging
+import threading
+import weakref
+
+try:
+    import resource
+except ImportError:  # غير متوفر خارج أنظمة يونكس
+    resource = None
+
+from src.metrics import PROCESSES, process_rss_bytes
+from src.loop_health import run_blocking
+
+logger = logging.getLogger(__name__)
+
+# الحد الأقصى لمدة المهمة كاملة (بالثواني)
+SCAN_TIMEOUT = int(os.getenv('SCAN_TIMEOUT', '3600'))
+
+# حدود كل عملية فرعية (0 = بدون حد)
+SCAN_MEMORY_MB = int(os.getenv('SCAN_MEMORY_MB', '2048'))
+SCAN_CPU_SECONDS = int(os.getenv('SCAN_CPU_SECONDS', '1800'))
+SCAN_NICE = int(os.getenv('SCAN_NICE', '10'))
+
+# مهلة الإنهاء اللطيف قبل SIGKILL وفترة قياس الموارد
+KILL_GRACE = float(os.getenv('SCAN_KILL_GRACE', '5'))
+USAGE_INTERVAL = float(os.getenv('SCAN_USAGE_INTERVAL', '2'))
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def apply_limits(pid: int, memory_mb: int = None, cpu_seconds: int = None, nice: int = None):
+    """تطبيق الحدود على عملية بعد تشغيلها (تورثها العمليات التي تنشئها لاحقاً)"""
+    memory_mb = SCAN_MEMORY_MB if memory_mb is None else memory_mb
+    cpu_seconds = SCAN_CPU_SECONDS if cpu_seconds is None else cpu_seconds
+    nice = SCAN_NICE if nice is None else nice
+    try:
+        if nice:
+            os.setpriority(os.PRIO_PROCESS, pid, nice)
+        if resource is not None and hasattr(resource, 'prlimit'):
+            if memory_mb:
+                limit = memory_mb * 1024 * 1024
+                resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+            if cpu_seconds:
+                # الحد المرن يرسل SIGXCPU ثم يُقتل بعد 10 ثوانٍ عند الحد الصارم
+                resource.prlimit(pid, resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 10))
+    except (OSError, ValueError) as e:
+        # العملية انتهت قبل تطبيق الحدود أو لا توجد صلاحية
+        logger.debug(f"تعذر تطبيق حدود العملية {pid}: {str(e)}")
+
+
+def read_cpu_seconds(pid: int) -> float:
+    """وقت المعالج للعملية مع أبنائها الذين انتظرتهم (utime stime cutime cstime) من /proc/<pid>/stat
+    الابن الذي حصده أبوه يُحذف من القياس فيبقى وقته في cutime الأب فقط (JobControl.sample)"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        # الحقول 14-17: utime stime cutime cstime (بعد حذف الاسم تبدأ من الفهرس 11)
+        return sum(int(value) for value in fields[11:15]) / CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+def boot_seconds() -> float:
+    """الثواني منذ إقلاع النظام (نفس مرجع وقت بدء العمليات في /proc)"""
+    return time.clock_gettime(time.CLOCK_BOOTTIME)
+
+
+def process_groups() -> dict:
+    """العمليات الموجودة (مع الزومبي) مجمعة حسب مجموعة العمليات بقراءة واحدة لـ /proc
+    {pgid: {pid: (ppid, وقت البدء بالثواني منذ الإقلاع, الحالة)}}"""
+    groups = {}
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return groups
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            # الحقل 22 starttime (الفهرس 19 بعد حذف الاسم)
+            groups.setdefault(int(fields[2]), {})[int(entry)] = (int(fields[1]), int(fields[19]) / CLOCK_TICKS, fields[0])
+        except (OSError, IndexError, ValueError):
+            continue
+    return groups
+
+
+def reaped_cpu_seconds() -> float:
+    """وقت المعالج لكل العمليات الفرعية التي حصدتها هذه العملية (يشمل أحفادها الذين انتظرهم آباؤهم)"""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+# العمليات الرئيسية تحصدها asyncio، فيُقرأ وقتها النهائي من فرق RUSAGE_CHILDREN منذ آخر قراءة
+# ويوزع على العمليات التي انتهت بينهما (عادة عملية واحدة فيكون القياس دقيقاً).
+# عندما لا تبقى عملية جارية لأي مهمة يُعاد ضبط نقطة البداية فلا يُحتسب على المهام ما حصدته العملية لغيرها
+_controls = weakref.WeakSet()
+_reaped_lock = threading.Lock()
+_reaped_seen = None
+
+
+def claim_reaped():
+    """احتساب الوقت النهائي لكل عملية رئيسية حُصدت ولم يُحتسب وقتها بعد"""
+    global _reaped_seen
+    with _reaped_lock:
+        processes = [(control, process) for control in list(_controls) for process in control.processes]
+        exited = [
+            (control, process) for control, process in processes
+            if process.returncode is not None and process.pid not in control._final
+        ]
+        running = any(process.returncode is None for _, process in processes)
+        if not exited and running:
+            return
+        total = reaped_cpu_seconds()
+        now = boot_seconds()
+        for control, process in exited:
+            control._reaped_at.setdefault(process.pid, now)
+        if exited:
+            delta = max(0.0, total - (_reaped_seen if _reaped_seen is not None else total))
+            floors = [control._cpu.get(process.pid, 0.0) for control, process in exited]
+            extra = max(0.0, delta - sum(floors))
+            weight = sum(floors)
+            for (control, process), floor in zip(exited, floors):
+                share = extra * floor / weight if weight else extra / len(exited)
+                with control._lock:
+                    control._cpu.pop(process.pid, None)
+                    control._final[process.pid] = floor + share
+        _reaped_seen = total
+
+
+class JobControl:
+    """تشغيل عمليات مهمة فحص واحدة ضمن حدودها وتتبع مواردها وإنهاؤها معاً"""
+
+    def __init__(self, memory_mb: int = None, cpu_seconds: int = None, nice: int = None):
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self.nice = nice
+        self.cancelled = False
+        self.processes = []
+        # آخر قياس لكل عملية موجودة، والوقت النهائي للعمليات الرئيسية بعد حصدها
+        self._cpu = {}
+        self._final = {}
+        # كل العمليات التي ظهرت في المهمة وآباؤها (لمعرفة من حصد العملية التي اختفت)
+        self._parents = {}
+        # وقت ملاحظة حصد كل عملية رئيسية (رقم مجموعتها لا يُعاد استخدامه قبله)
+        self._reaped_at = {}
+        self._peak_rss = 0
+        # القياس يُنفذ في خيوط العمل الحاجب، وقد يتزامن قياس الإنهاء مع القياس الدوري
+        self._lock = threading.Lock()
+        self._monitor = None
+        self._started_at = None
+        self._ended_at = None
+
+    async def spawn(self, program: str, *args, **kwargs):
+        """تشغيل عملية في مجموعة عمليات جديدة مع تطبيق الحدود"""
+        if self.cancelled:
+            raise asyncio.CancelledError()
+        # قبل أول عملية: ما حُصد قبلها لا يخص المهمة
+        claim_reaped()
+        _controls.add(self)
+        process = await asyncio.create_subprocess_exec(program, *args, start_new_session=True, **kwargs)
+        apply_limits(process.pid, self.memory_mb, self.cpu_seconds, self.nice)
+        if self._started_at is None:
+            self._started_at = time.monotonic()
+        self.processes.append(process)
+        PROCESSES.track(process.pid)
+        if self._monitor is None:
+            self._monitor = asyncio.get_running_loop().create_task(self._sample_loop())
+        return process
+
+    def release(self, process):
+        PROCESSES.untrack(process.pid)
+
+    def _owns(self, process, group: dict) -> bool:
+        """المجموعة ما زالت للمهمة: عمليتها الرئيسية لم تُحصد، أو فيها عضو بدأ قبل حصدها
+        (رقم مجموعة فارغة قد يُعاد استخدامه لعملية أخرى بعد الحصد، ولا يُعاد طالما بقي فيها عضو)"""
+        if process.returncode is None:
+            return True
+        reaped_at = self._reaped_at.get(process.pid)
+        if reaped_at is None:
+            reaped_at = boot_seconds()
+        return any(started <= reaped_at for _, started, _ in group.values())
+
+    def own_groups(self, groups: dict) -> dict:
+        """أعضاء مجموعات عمليات المهمة: {pid: ppid}"""
+        members = {}
+        for process in self.processes:
+            group = groups.get(process.pid, {})
+            if self._owns(process, group):
+                members.update((pid, ppid) for pid, (ppid, _, _) in group.items())
+        return members
+
+    def _reaped_in_job(self, pid: int, members: dict, leaders: set) -> bool:
+        """عملية اختفت وحصدها أحد أسلافها في المهمة، فوقتها صار ضمن cutime ذلك السلف"""
+        seen = set()
+        parent = self._parents.get(pid)
+        while parent is not None and parent not in seen:
+            if parent in members or parent in leaders:
+                return True
+            seen.add(parent)
+            parent = self._parents.get(parent)
+        return False
+
+    def sample(self):
+        """قياس تقريبي لوقت المعالج والذاكرة لكل عمليات المهمة (كل USAGE_INTERVAL ثانية)
+        يقرأ /proc لكل عملية فيُستدعى من الحلقة عبر run_blocking"""
+        if not self.processes:
+            return
+        members = self.own_groups(process_groups())
+        leaders = {process.pid for process in self.processes}
+        readings = {pid: read_cpu_seconds(pid) for pid in members}
+        rss = sum(process_rss_bytes(pid) for pid in members)
+        with self._lock:
+            self._parents.update(members)
+            for pid in list(self._cpu):
+                # العملية اليتيمة التي حصدتها init يبقى آخر قياس لها
+                if pid not in members and pid not in leaders and self._reaped_in_job(pid, members, leaders):
+                    del self._cpu[pid]
+            for pid, cpu in readings.items():
+                if pid not in self._final and cpu > self._cpu.get(pid, 0.0):
+                    self._cpu[pid] = cpu
+            self._peak_rss = max(self._peak_rss, rss)
+
+    async def _sample_loop(self):
+        while True:
+            await asyncio.sleep(USAGE_INTERVAL)
+            claim_reaped()
+            await run_blocking(self.sample)
+
+    def usage(self) -> dict:
+        """وقت المعالج وأعلى ذاكرة لشجرة العمليات، والمدة من أول عملية حتى إنهاء المهمة"""
+        wall = 0.0
+        if self._started_at is not None:
+            wall = (self._ended_at or time.monotonic()) - self._started_at
+        claim_reaped()
+        with self._lock:
+            cpu_seconds = sum(self._cpu.values()) + sum(self._final.values())
+        return {
+            'cpu_seconds': round(cpu_seconds, 2),
+            'wall_seconds': round(wall, 2),
+            'peak_rss_bytes': self._peak_rss,
+            'processes': len(self.processes),
+        }
+
+    def live_groups(self) -> list:
+        """مجموعات العمليات التي ما زالت للمهمة (لا تُرسل إشارة لرقم مجموعة انتهت وقد يُعاد استخدامه)"""
+        groups = process_groups()
+        pgids = []
+        for process in self.processes:
+            # الزومبي المتبقي (بانتظار حصد init) لا يحتاج إشارة
+            group = {pid: entry for pid, entry in groups.get(process.pid, {}).items() if entry[2] != 'Z'}
+            if group and self._owns(process, group):
+                pgids.append(process.pid)
+        return pgids
+
+    def signal_all(self, sig, pgids: list):
+        """إرسال إشارة لمجموعات العمليات (تشمل العمليات التي أنشأتها الأدوات)"""
+        for pgid in pgids:
+            try:
+                os.killpg(pgid, sig)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+    async def terminate(self, grace: float = None):
+        """SIGTERM ثم SIGKILL بعد المهلة، وانتظار انتهاء كل العمليات"""
+        grace = KILL_GRACE if grace is None else grace
+        alive = [p for p in self.processes if p.returncode is None]
+        # قياس أخير يسجل أعضاء المجموعات قبل الإنهاء (الوقت النهائي للعمليات الرئيسية يُحتسب عند حصدها)
+        await run_blocking(self.sample)
+        pgids = await run_blocking(self.live_groups)
+        if alive:
+            self.signal_all(signal.SIGTERM, pgids)
+            try:
+                await asyncio.wait_for(asyncio.gather(*(p.wait() for p in alive)), grace)
+            except asyncio.TimeoutError:
+                pass
+        # SIGKILL للمجموعة كاملة حتى لو انتهت العملية الرئيسية وبقي أبناؤها
+        self.signal_all(signal.SIGKILL, await run_blocking(self.live_groups))
+        for process in alive:
+            await process.wait()
+        self.close()
+
+    def close(self):
+        if self._started_at is not None and self._ended_at is None:
+            self._ended_at = time.monotonic()
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        claim_reaped()
+        if all(process.returncode is not None for process in self.processes):
+            _controls.discard(self)
+        for process in self.processes:
+            PROCESSES.untrack(process.pid)
+
+    async def cancel(self):
+        """إلغاء المهمة من /cancel: لا تُشغل عمليات جديدة وتُنهى الحالية فوراً"""
+        self.cancelled = True
+        await self.terminate(grace=0)
@@ -0,0 +1,60 @@
+"""
+ذاكرة مؤقتة لنتائج الفحص حسب النطاق
+تمنع تكرار تشغيل الفحص لنفس النطاق خلال مدة قصيرة وتجمع الطلبات المتزامنة على مهمة واحدة
+"""
+
+import os
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """ذاكرة LRU محدودة الحجم مع مدة صلاحية لكل عنصر"""
+
+    def __init__(self, ttl: float = None, max_entries: int = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv('RESULT_CACHE_TTL', '900'))
+        self.max_entries = max_entries or int(os.getenv('RESULT_CACHE_SIZE', '256'))
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    def get(self, domain: str):
+        """النتائج المحفوظة للنطاق مع عمرها بالثواني، أو None"""
+        entry = self._entries.get(domain)
+        if entry is None:
+            return None
+
+        stored_at, results = entry
+        age = time.monotonic() - stored_at
+        if age > self.ttl:
+            del self._entries[domain]
+            return None
+
+        self._entries.move_to_end(domain)
+        return results, age
+
+    def put(self, domain: str, results: dict):
+        """حفظ النتائج وإخراج الأقدم استخداماً عند تجاوز الحجم"""
+        if self.ttl <= 0:
+            return
+        self._entries[domain] = (time.monotonic(), results)
+        self._entries.move_to_end(domain)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, domain: str):
+        self._entries.pop(domain, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def inflight(self, domain: str, diff: bool = False):
+        """المهمة الجارية أو المنتظرة لنفس النطاق ونفس نوع الفحص إن وجدت
+        (نتيجة الفحص التفاضلي جزئية فلا يُجمع مع الفحص الكامل في أي اتجاه)"""
+        return self._inflight.get((domain, diff))
+
+    def set_inflight(self, domain: str, job, diff: bool = False):
+        self._inflight[(domain, diff)] = job
+
+    def clear_inflight(self, domain: str, job, diff: bool = False):
+        if self._inflight.get((domain, diff)) is job:
+            del self._inflight[(domain, diff)]
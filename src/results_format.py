@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+ملف نتائج مضغوط لكل فحص (results.xrf) بدلاً من قراءة ملفات النص كاملة
+الروابط تُخزن في كتل مضغوطة بـ zlib من RESULTS_BLOCK_LINES سطراً، ويحفظ الفهرس في نهاية الملف
+عدد أسطر كل قسم وموضع كل كتلة، فالملخص لا يحتاج قراءة الروابط وأي صفحة تُقرأ بعملية seek واحدة
+
+البنية:
+    [XRF\\x01][u32 إصدار][u64 موضع الفهرس][u32 طول الفهرس]   ترويسة ثابتة 20 بايت
+    [كتلة][كتلة]...                                           الأسطر مضغوطة
+    [فهرس JSON مضغوط]                                          العدادات ومواضع الكتل وبصمات الملفات المصدر
+
+الاستخدام:
+    python src/results_format.py convert results/example.com [results/other.com ...]
+    python src/results_format.py info results/example.com/results.xrf
+    python src/results_format.py page results/example.com/results.xrf vulnerable_urls --offset 0 --limit 20
+"""
+
+import os
+import sys
+import json
+import zlib
+import struct
+import argparse
+from urllib.parse import urlsplit
+
+# إضافة جذر المشروع للاستيراد بنفس أسلوب src/main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.results_parser import RESULT_FILES, SAMPLE_FILES, SAMPLE_SIZE, iter_file_lines
+from src.domain_utils import Scope
+
+RESULTS_FILE = 'results.xrf'
+MAGIC = b'XRF\x01'
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct('<4sIQI')
+
+# عدد الأسطر في كل كتلة مضغوطة (كتل أصغر = صفحات أسرع وضغط أقل)
+BLOCK_LINES = int(os.getenv('RESULTS_BLOCK_LINES', '512'))
+COMPRESS_LEVEL = int(os.getenv('RESULTS_COMPRESS_LEVEL', '6'))
+
+
+class ResultsFormatError(Exception):
+    """ملف نتائج تالف أو بإصدار غير مدعوم"""
+
+
+class ResultsWriter:
+    """كتابة الأقسام بالتتابع (سطراً بسطر) ثم الفهرس، مع استبدال الملف القديم بشكل ذري"""
+
+    def __init__(self, path: str, domain: str, block_lines: int = None):
+        self.path = path
+        self.domain = domain
+        self.block_lines = block_lines or BLOCK_LINES
+        self.sections = {}
+        self.sources = {}
+        self._tmp = f'{path}.tmp'
+        self._file = open(self._tmp, 'wb')
+        self._file.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, 0))
+
+    def add_section(self, name: str, lines) -> int:
+        """ضغط أسطر القسم على كتل وإرجاع عددها"""
+        blocks = []
+        count = 0
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) >= self.block_lines:
+                blocks.append(self._write_block(batch))
+                count += len(batch)
+                batch = []
+        if batch:
+            blocks.append(self._write_block(batch))
+            count += len(batch)
+        self.sections[name] = {'count': count, 'blocks': blocks}
+        return count
+
+    def _write_block(self, lines: list) -> list:
+        data = zlib.compress('\n'.join(lines).encode('utf-8'), COMPRESS_LEVEL)
+        offset = self._file.tell()
+        self._file.write(data)
+        return [offset, len(data), zlib.crc32(data)]
+
+    def close(self):
+        index = zlib.compress(json.dumps({
+            'domain': self.domain,
+            'block_lines': self.block_lines,
+            'sections': self.sections,
+            'sources': self.sources,
+        }, separators=(',', ':')).encode('utf-8'), COMPRESS_LEVEL)
+        index_offset = self._file.tell()
+        self._file.write(index)
+        self._file.seek(0)
+        self._file.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, index_offset, len(index)))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+
+class ResultsFile:
+    """قراءة ملف النتائج: العدادات من الفهرس مباشرة وصفحات الروابط بقراءة الكتل المطلوبة فقط"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            preamble = f.read(PREAMBLE.size)
+            if len(preamble) < PREAMBLE.size:
+                raise ResultsFormatError('ملف النتائج قصير جداً')
+            magic, version, index_offset, index_length = PREAMBLE.unpack(preamble)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ResultsFormatError('ليس ملف نتائج أو إصدار غير مدعوم')
+            f.seek(index_offset)
+            try:
+                index = json.loads(zlib.decompress(f.read(index_length)))
+            except (zlib.error, ValueError) as e:
+                raise ResultsFormatError(f'فهرس النتائج تالف: {str(e)}')
+        self.domain = index['domain']
+        self.block_lines = index['block_lines']
+        self.sections = index['sections']
+        self.sources = index.get('sources', {})
+
+    def count(self, section: str) -> int:
+        entry = self.sections.get(section)
+        return entry['count'] if entry else 0
+
+    @property
+    def counts(self) -> dict:
+        return {name: entry['count'] for name, entry in self.sections.items()}
+
+    def page(self, section: str, offset: int = 0, limit: int = SAMPLE_SIZE) -> list:
+        """أسطر القسم من offset بحد limit (الكتل المتتالية تُقرأ بعملية واحدة)"""
+        entry = self.sections.get(section)
+        if not entry or limit <= 0 or offset >= entry['count']:
+            return []
+        first = offset // self.block_lines
+        last = min(offset + limit - 1, entry['count'] - 1) // self.block_lines
+        blocks = entry['blocks'][first:last + 1]
+        start = blocks[0][0]
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            data = f.read(blocks[-1][0] + blocks[-1][1] - start)
+        lines = []
+        for block_offset, length, crc in blocks:
+            lines.extend(self._decode(data[block_offset - start:block_offset - start + length], crc))
+        skip = offset - first * self.block_lines
+        return lines[skip:skip + limit]
+
+    def iter_lines(self, section: str):
+        """كل أسطر القسم كتلة بكتلة"""
+        entry = self.sections.get(section)
+        if not entry:
+            return
+        with open(self.path, 'rb') as f:
+            for block_offset, length, crc in entry['blocks']:
+                f.seek(block_offset)
+                yield from self._decode(f.read(length), crc)
+
+    def _decode(self, data: bytes, crc: int) -> list:
+        if zlib.crc32(data) != crc:
+            raise ResultsFormatError('كتلة نتائج تالفة')
+        return zlib.decompress(data).decode('utf-8').split('\n')
+
+
+def _source_stamps(results_dir: str) -> dict:
+    """حجم ووقت تعديل ملفات النص الموجودة لمعرفة إن كان الملف المضغوط قديماً"""
+    stamps = {}
+    for filename in RESULT_FILES:
+        path = os.path.join(results_dir, filename)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            stamps[filename] = [stat.st_size, stat.st_mtime_ns]
+    return stamps
+
+
+def convert_results_dir(results_dir: str, domain: str = None, block_lines: int = None) -> ResultsFile:
+    """تحويل ملفات النص في مجلد الفحص إلى results.xrf بقراءة واحدة لكل ملف"""
+    domain = domain or os.path.basename(os.path.normpath(results_dir))
+    writer = ResultsWriter(os.path.join(results_dir, RESULTS_FILE), domain, block_lines)
+    try:
+        writer.sources = _source_stamps(results_dir)
+        for filename, key in RESULT_FILES.items():
+            path = os.path.join(results_dir, filename)
+            writer.add_section(key, iter_file_lines(path) if os.path.exists(path) else ())
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return ResultsFile(writer.path)
+
+
+def open_results(results_dir: str, domain: str = None) -> ResultsFile:
+    """فتح results.xrf للمجلد، أو إنشاؤه إذا لم يوجد أو تغيرت ملفات النص بعده
+    (مجلد مضغوط بالصيانة لا يحتوي ملفات النص، فالملف المضغوط هو النتائج نفسها)"""
+    path = os.path.join(results_dir, RESULTS_FILE)
+    if os.path.exists(path):
+        try:
+            results = ResultsFile(path)
+            stamps = _source_stamps(results_dir)
+            if not stamps or results.sources == stamps:
+                return results
+        except ResultsFormatError:
+            pass
+    return convert_results_dir(results_dir, domain)
+
+
+def has_result_file(results_dir: str, filename: str) -> bool:
+    """ملف النتائج موجود كنص أو كقسم في results.xrf"""
+    return (os.path.exists(os.path.join(results_dir, filename))
+            or os.path.exists(os.path.join(results_dir, RESULTS_FILE)))
+
+
+def iter_result_lines(results_dir: str, filename: str):
+    """أسطر ملف نتائج من ملف النص، أو من قسمه في results.xrf إذا ضُغط المجلد"""
+    path = os.path.join(results_dir, filename)
+    if os.path.exists(path):
+        return iter_file_lines(path)
+    compacted = os.path.join(results_dir, RESULTS_FILE)
+    if os.path.exists(compacted):
+        return ResultsFile(compacted).iter_lines(RESULT_FILES[filename])
+    return iter(())
+
+
+def summarize(results_dir: str, domain: str, sample_size: int = SAMPLE_SIZE) -> dict:
+    """إحصائيات النتائج وعينات العرض من فهرس الملف المضغوط (يُحوَّل المجلد عند الحاجة)"""
+    results_file = open_results(results_dir, domain)
+    results = {
+        'domain': domain,
+        'results_dir': results_dir,
+        'samples': {},
+    }
+    for key in RESULT_FILES.values():
+        results[key] = results_file.count(key)
+    for kind, filename in SAMPLE_FILES.items():
+        results['samples'][kind] = results_file.page(RESULT_FILES[filename], 0, sample_size)
+    return results
+
+
+def target_breakdown(results_dir: str, targets: list, sections=('live_urls', 'vulnerable_urls')) -> dict:
+    """عدد روابط كل هدف في فحص جماعي: {هدف: {قسم: عدد}} (الرابط يُنسب لأدق هدف يحتويه)"""
+    scope = Scope(targets)
+    breakdown = {target: dict.fromkeys(sections, 0) for target in scope.patterns}
+    results_file = open_results(results_dir)
+    for section in sections:
+        for line in results_file.iter_lines(section):
+            owner = scope.owner(urlsplit(line).hostname or '')
+            if owner is not None:
+                breakdown[owner][section] += 1
+    return breakdown
+
+
+def main():
+    parser = argparse.ArgumentParser(description='تحويل وقراءة ملفات النتائج المضغوطة')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert = commands.add_parser('convert', help='تحويل مجلدات نتائج بصيغة النص')
+    convert.add_argument('dirs', nargs='+')
+    convert.add_argument('--block-lines', type=int, default=None)
+
+    info = commands.add_parser('info', help='عرض العدادات')
+    info.add_argument('file')
+
+    page = commands.add_parser('page', help='قراءة صفحة من قسم')
+    page.add_argument('file')
+    page.add_argument('section', choices=sorted(RESULT_FILES.values()))
+    page.add_argument('--offset', type=int, default=0)
+    page.add_argument('--limit', type=int, default=SAMPLE_SIZE)
+
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        for results_dir in args.dirs:
+            text_size = sum(size for size, _ in _source_stamps(results_dir).values())
+            results_file = convert_results_dir(results_dir, block_lines=args.block_lines)
+            size = os.path.getsize(results_file.path)
+            print(f"{results_dir}: {sum(results_file.counts.values())} سطر، "
+                  f"{text_size} ← {size} بايت")
+    elif args.command == 'info':
+        results_file = ResultsFile(args.file)
+        print(f"domain: {results_file.domain}")
+        for name, count in results_file.counts.items():
+            print(f"{name}: {count}")
+    else:
+        for line in ResultsFile(args.file).page(args.section, args.offset, args.limit):
+            print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+صيانة مجلد النتائج (RESULTS_DIR): حصص حجم لكل نطاق وللمجلد كاملاً، وحذف الأقدم استخداماً،
+وضغط مجلدات الفحوصات الباردة في الخلفية
+نتائج الفحص المكتمل محفوظة في قاعدة البيانات، فالمجلد يحتاج فقط للاستئناف وأساس الفحص التفاضلي:
+- الضغط: ملفات النتائج تبقى في results.xrf فقط (مضغوط أصلاً) وباقي ملفات النص تُضغط بـ gzip
+- الحذف: المجلد كاملاً (الفحص التفاضلي التالي يصبح فحصاً كاملاً)
+
+كل فحص يحجز قفلاً مشتركاً على ملف .scan.lock في مجلده طوال تشغيله (ووقت تعديل الملف هو آخر استخدام)،
+والصيانة تأخذ قفلاً حصرياً دون انتظار وتتجاوز المجلد إذا كان فحص يكتب فيه
+
+الاستخدام:
+    python src/results_maintenance.py status            # استخدام المساحة لكل نطاق
+    python src/results_maintenance.py run --dry-run     # ما الذي سيُضغط ويُحذف
+    python src/results_maintenance.py run
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # غير متوفر خارج أنظمة يونكس
+    fcntl = None
+
+# إضافة جذر المشروع للاستيراد بنفس أسلوب src/main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.results_parser import RESULT_FILES
+from src.results_format import RESULTS_FILE, open_results
+from src.scan_checkpoint import Checkpoint
+from src.loop_health import run_blocking
+from src.metrics import RESULTS_BYTES, RESULTS_DIRS, RESULTS_COMPACTED, RESULTS_EVICTED, RESULTS_FREED_BYTES
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+DAY = 86400
+
+# الحصص بالميجابايت (0 = بدون حد)
+RESULTS_QUOTA_MB = int(os.getenv('RESULTS_QUOTA_MB', '0'))
+RESULTS_DOMAIN_QUOTA_MB = int(os.getenv('RESULTS_DOMAIN_QUOTA_MB', '0'))
+
+# حذف المجلدات غير المستخدمة منذ هذا العدد من الأيام (0 = بدون حذف حسب العمر)
+RESULTS_MAX_AGE_DAYS = float(os.getenv('RESULTS_MAX_AGE_DAYS', '30'))
+
+# ضغط المجلدات غير المستخدمة منذ هذا العدد من الساعات
+RESULTS_COMPACT_AFTER_HOURS = float(os.getenv('RESULTS_COMPACT_AFTER_HOURS', '24'))
+
+# المجلدات المستخدمة خلال هذه المدة لا تُلمس (حفظ النتائج في قاعدة البيانات بعد انتهاء الفحص)
+RESULTS_GRACE_SECONDS = int(os.getenv('RESULTS_GRACE_SECONDS', '900'))
+
+# الفاصل بين دورات الصيانة في البوت (0 = تعطيل)
+RESULTS_MAINTENANCE_INTERVAL = int(os.getenv('RESULTS_MAINTENANCE_INTERVAL', '3600'))
+
+LOCK_FILE = '.scan.lock'
+
+# تقرير آخر دورة صيانة في هذه العملية
+_last_report = None
+
+
+class ScanDirLock:
+    """قفل مشترك على مجلد نتائج طوال فحص يكتب فيه (أي عدد من الفحوصات، والصيانة تنتظر انتهاءها كلها)"""
+
+    def __init__(self, results_dir: str):
+        self.results_dir = results_dir
+        self.path = os.path.join(results_dir, LOCK_FILE)
+        self._fd = None
+
+    def acquire(self):
+        """حجز القفل (يحجب إذا كانت الصيانة تعمل على المجلد، فيُستدعى خارج حلقة الأحداث)"""
+        while True:
+            os.makedirs(self.results_dir, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl is None:
+                break
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            # الصيانة ربما حذفت المجلد أثناء الانتظار: القفل على ملف لم يعد موجوداً
+            try:
+                if os.stat(self.path).st_ino == os.fstat(fd).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+        self._fd = fd
+        touch(self.results_dir)
+        return self
+
+    def release(self):
+        if self._fd is None:
+            return
+        touch(self.results_dir)
+        os.close(self._fd)
+        self._fd = None
+
+
+def touch(results_dir: str):
+    """تسجيل استخدام المجلد الآن (وقت تعديل ملف القفل)"""
+    try:
+        os.utime(os.path.join(results_dir, LOCK_FILE))
+    except OSError:
+        pass
+
+
+@contextmanager
+def exclusive(results_dir: str, last_access: float):
+    """قفل حصري دون انتظار: True إذا لم يكن أي فحص يستخدم المجلد"""
+    path = os.path.join(results_dir, LOCK_FILE)
+    created = not os.path.exists(path)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    if created:
+        # إنشاء ملف القفل لا يُحسب استخداماً للمجلد
+        os.utime(path, (last_access, last_access))
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)
+
+
+def dir_size(path: str) -> int:
+    """مجموع أحجام الملفات في المجلد ومجلداته الفرعية"""
+    total = 0
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                total += dir_size(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                total += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+    return total
+
+
+def last_access(path: str) -> float:
+    """آخر استخدام للمجلد: وقت ملف القفل، أو أحدث ملف فيه لمجلدات ما قبل القفل"""
+    try:
+        return os.stat(os.path.join(path, LOCK_FILE)).st_mtime
+    except OSError:
+        pass
+    latest = os.stat(path).st_mtime
+    for entry in os.scandir(path):
+        try:
+            latest = max(latest, entry.stat(follow_symlinks=False).st_mtime)
+        except OSError:
+            continue
+    return latest
+
+
+def is_compacted(path: str) -> bool:
+    """لا توجد ملفات نص غير مضغوطة في المجلد أو في previous/"""
+    for folder in (path, os.path.join(path, 'previous')):
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            continue
+        if any(entry.is_file() and entry.name.endswith('.txt') for entry in entries):
+            return False
+    return True
+
+
+def compact_dir(path: str) -> int:
+    """ضغط مجلد فحص بارد وإرجاع عدد البايتات الموفرة (المجلد يبقى قابلاً للعرض وأساساً للفحص التفاضلي)"""
+    before = dir_size(path)
+    for folder in (path, os.path.join(path, 'previous')):
+        if not os.path.isdir(folder):
+            continue
+        if any(os.path.exists(os.path.join(folder, filename)) for filename in RESULT_FILES):
+            # results.xrf محدث من ملفات النص قبل حذفها
+            open_results(folder, os.path.basename(path))
+            for filename in RESULT_FILES:
+                try:
+                    os.remove(os.path.join(folder, filename))
+                except FileNotFoundError:
+                    pass
+        for entry in list(os.scandir(folder)):
+            if entry.is_file() and entry.name.endswith('.txt'):
+                with open(entry.path, 'rb') as src, gzip.open(entry.path + '.gz', 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(entry.path)
+    return max(0, before - dir_size(path))
+
+
+def scan_dirs(root: str) -> list:
+    """مجلدات النطاقات مع حجمها وآخر استخدام (الأقدم استخداماً أولاً)"""
+    dirs = []
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return dirs
+    for entry in entries:
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        try:
+            dirs.append({'name': entry.name, 'path': entry.path, 'bytes': dir_size(entry.path),
+                         'last_access': last_access(entry.path)})
+        except OSError:
+            continue
+    dirs.sort(key=lambda d: d['last_access'])
+    return dirs
+
+
+def usage(root: str = None) -> dict:
+    """إحصائيات استخدام المساحة دون تعديل أي شيء"""
+    from src.scan_runner import RESULTS_DIR
+    root = root or RESULTS_DIR
+    dirs = scan_dirs(root)
+    return {
+        'root': root,
+        'dirs': len(dirs),
+        'bytes': sum(d['bytes'] for d in dirs),
+        'largest': sorted(({'name': d['name'], 'bytes': d['bytes']} for d in dirs),
+                          key=lambda d: d['bytes'], reverse=True)[:10],
+        'oldest_access': dirs[0]['last_access'] if dirs else None,
+    }
+
+
+def run_maintenance(root: str = None, now: float = None, dry_run: bool = False) -> dict:
+    """دورة صيانة واحدة: حذف حسب العمر، ضغط المجلدات الباردة، حصة كل نطاق، ثم الحصة الكلية بالأقدم استخداماً"""
+    global _last_report
+    from src.scan_runner import RESULTS_DIR
+    root = root or RESULTS_DIR
+    now = now or time.time()
+    dirs = scan_dirs(root)
+    report = {
+        'root': root,
+        'checked_at': now,
+        'dry_run': dry_run,
+        'dirs': len(dirs),
+        'bytes_before': sum(d['bytes'] for d in dirs),
+        'compacted': [],
+        'evicted': [],
+        'skipped_active': [],
+        'freed_bytes': 0,
+    }
+    if fcntl is None:
+        logger.warning("صيانة مجلد النتائج تتطلب fcntl لتجنب المجلدات قيد الفحص، تم التجاوز")
+        report['bytes'] = report['bytes_before']
+        _last_report = report
+        return report
+
+    domain_quota = RESULTS_DOMAIN_QUOTA_MB * MB
+    remaining = []
+
+    def evict(d, reason):
+        with exclusive(d['path'], d['last_access']) as free:
+            if not free:
+                report['skipped_active'].append(d['name'])
+                return False
+            if not dry_run:
+                shutil.rmtree(d['path'], ignore_errors=True)
+        report['evicted'].append({'name': d['name'], 'bytes': d['bytes'], 'reason': reason})
+        report['freed_bytes'] += d['bytes']
+        return True
+
+    for d in dirs:
+        idle = now - d['last_access']
+        if idle < RESULTS_GRACE_SECONDS:
+            remaining.append(d)
+            continue
+        if RESULTS_MAX_AGE_DAYS and idle > RESULTS_MAX_AGE_DAYS * DAY:
+            if not evict(d, 'age'):
+                remaining.append(d)
+            continue
+
+        over_quota = domain_quota and d['bytes'] > domain_quota
+        if (idle > RESULTS_COMPACT_AFTER_HOURS * 3600 or over_quota) and not is_compacted(d['path']):
+            with exclusive(d['path'], d['last_access']) as free:
+                if not free:
+                    report['skipped_active'].append(d['name'])
+                elif not Checkpoint(d['path'], d['name']).load():
+                    # فحص لم يكتمل وما زال قابلاً للاستئناف يحتاج ملفات النص كما هي
+                    freed = 0 if dry_run else compact_dir(d['path'])
+                    d['bytes'] -= freed
+                    report['compacted'].append({'name': d['name'], 'bytes': freed})
+                    report['freed_bytes'] += freed
+
+        if domain_quota and d['bytes'] > domain_quota:
+            if evict(d, 'domain_quota'):
+                continue
+        remaining.append(d)
+
+    total = sum(d['bytes'] for d in remaining)
+    if RESULTS_QUOTA_MB and total > RESULTS_QUOTA_MB * MB:
+        # remaining مرتبة بالأقدم استخداماً
+        for d in remaining:
+            if total <= RESULTS_QUOTA_MB * MB:
+                break
+            if now - d['last_access'] < RESULTS_GRACE_SECONDS:
+                continue
+            if evict(d, 'quota'):
+                total -= d['bytes']
+
+    report['bytes'] = report['bytes_before'] - report['freed_bytes']
+    if not dry_run:
+        RESULTS_BYTES.set(report['bytes'])
+        RESULTS_DIRS.set(len(dirs) - len(report['evicted']))
+        RESULTS_COMPACTED.inc(len(report['compacted']))
+        RESULTS_EVICTED.inc(len(report['evicted']))
+        RESULTS_FREED_BYTES.inc(report['freed_bytes'])
+    _last_report = report
+    return report
+
+
+def last_report():
+    """تقرير آخر دورة صيانة في هذه العملية أو None"""
+    return _last_report
+
+
+def format_report(report: dict) -> str:
+    """ملخص الدورة للسجل أو رسالة تيليجرام"""
+    text = (
+        f"🗄️ مجلد النتائج: {report['bytes'] / MB:.1f} MB في {report['dirs'] - len(report['evicted'])} مجلد"
+        f" • ضُغط {len(report['compacted'])} • حُذف {len(report['evicted'])}"
+        f" • تم توفير {report['freed_bytes'] / MB:.1f} MB"
+    )
+    if report['skipped_active']:
+        text += f" • تم تجاوز {len(report['skipped_active'])} قيد الفحص"
+    return text
+
+
+async def run_forever(interval: int = None):
+    """دورات الصيانة في الخلفية (خارج حلقة الأحداث) حتى الإلغاء"""
+    interval = RESULTS_MAINTENANCE_INTERVAL if interval is None else interval
+    if interval <= 0:
+        return
+    while True:
+        try:
+            report = await run_blocking(run_maintenance)
+            if report['compacted'] or report['evicted']:
+                logger.info(format_report(report))
+        except Exception as e:
+            logger.error(f"خطأ في صيانة مجلد النتائج: {str(e)}")
+        await asyncio.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='حصص مجلد النتائج وضغط الفحوصات الباردة')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    status = commands.add_parser('status', help='استخدام المساحة لكل نطاق')
+    status.add_argument('--json', action='store_true')
+
+    run = commands.add_parser('run', help='تشغيل دورة صيانة واحدة')
+    run.add_argument('--dry-run', action='store_true', help='عرض ما سيُضغط ويُحذف دون تنفيذه')
+    run.add_argument('--json', action='store_true')
+
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        summary = usage()
+        if args.json:
+            print(json.dumps(summary, ensure_ascii=False, indent=2))
+        else:
+            print(f"{summary['root']}: {summary['bytes'] / MB:.1f} MB في {summary['dirs']} مجلد")
+            for d in summary['largest']:
+                print(f"  {d['bytes'] / MB:10.1f} MB  {d['name']}")
+    else:
+        report = run_maintenance(dry_run=args.dry_run)
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            print(format_report(report))
+            for d in report['compacted']:
+                print(f"  ضغط {d['name']} ({d['bytes'] / MB:.1f} MB)")
+            for d in report['evicted']:
+                print(f"  حذف {d['name']} ({d['bytes'] / MB:.1f} MB، {d['reason']})")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
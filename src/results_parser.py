@@ -0,0 +1,51 @@
+"""
+تحليل ملفات نتائج الفحص بذاكرة محدودة
+يتم عد الأسطر على دفعات والاحتفاظ بعينات صغيرة فقط، وتُقرأ المحتويات الكاملة عند الطلب
+"""
+
+import os
+
+# ملفات النتائج ومفتاح الإحصائية المقابل لكل ملف
+RESULT_FILES = {
+    'wayback.txt': 'wayback_urls',
+    'subdomains.txt': 'subdomains',
+    'live_uro1.txt': 'live_urls',
+    'xss_ready.txt': 'xss_ready_urls',
+    'Vulnerable_XSS.txt': 'vulnerable_urls',
+}
+
+# الملفات التي تعرض الواجهة عينات منها
+SAMPLE_FILES = {
+    'vulnerable': 'Vulnerable_XSS.txt',
+    'tested': 'xss_ready.txt',
+}
+
+CHUNK_SIZE = 1024 * 1024
+SAMPLE_SIZE = int(os.getenv('RESULTS_SAMPLE_SIZE', '20'))
+
+
+def count_lines(path: str, chunk_size: int = CHUNK_SIZE) -> int:
+    """عد الأسطر غير الفارغة بقراءة الملف على دفعات ثابتة الحجم"""
+    count = 0
+    carry = b''
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            lines = (carry + chunk).split(b'\n')
+            carry = lines.pop()
+            count += sum(1 for line in lines if line.strip())
+    if carry.strip():
+        count += 1
+    return count
+
+
+def iter_file_lines(path: str):
+    """توليد الأسطر غير الفارغة من الملف دون تحميله كاملاً"""
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
@@ -1,22 +1,103 @@
+from urllib.parse import urlencode
+
 from flask import Blueprint, jsonify, request
+from sqlalchemy import insert, update, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 from src.models.user import User, db
 
 user_bp = Blueprint('user', __name__)
 
+USER_FIELDS = ('id', 'username', 'email')
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+BULK_BATCH_SIZE = 500
+MAX_BULK_ITEMS = 10000
+
 @user_bp.route('/users', methods=['GET'])
 def get_users():
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
+    # Keyset pagination: ?after_id=<last id of previous page>&limit=N
+    try:
+        after_id = int(request.args.get('after_id', 0))
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'after_id and limit must be integers'}), 400
+
+    # Field projection: ?fields=id,username
+    fields = [f for f in request.args.get('fields', ','.join(USER_FIELDS)).split(',') if f]
+    unknown = [f for f in fields if f not in USER_FIELDS]
+    if unknown:
+        return jsonify({'error': f"unknown fields: {', '.join(unknown)}"}), 400
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+
+    columns = [getattr(User, f) for f in fields]
+    rows = db.session.execute(
+        select(*columns).where(User.id > after_id).order_by(User.id).limit(limit + 1)
+    ).mappings().all()
+
+    has_more = len(rows) > limit
+    users = [dict(row) for row in rows[:limit]]
+
+    response = jsonify(users)
+    if has_more:
+        next_after_id = users[-1]['id']
+        response.headers['X-Next-After-Id'] = str(next_after_id)
+        # Keep every other query argument (fields, ...) so following rel="next" returns the same projection
+        args = request.args.to_dict(flat=False)
+        args.update(after_id=[str(next_after_id)], limit=[str(limit)])
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args, doseq=True)}>; rel="next"'
+
+    # ETag / If-None-Match: unchanged pages are answered with 304
+    response.add_etag()
+    return response.make_conditional(request)
 
 @user_bp.route('/users', methods=['POST'])
 def create_user():
-    
+
     data = request.json
     user = User(username=data['username'], email=data['email'])
     db.session.add(user)
     db.session.commit()
     return jsonify(user.to_dict()), 201
 
+@user_bp.route('/users/bulk', methods=['POST'])
+def bulk_upsert_users():
+    # Items with an "id" update that user, the others are created; one transaction for all
+    data = request.get_json(silent=True)
+    if not isinstance(data, list) or not data:
+        return jsonify({'error': 'expected a non-empty JSON list'}), 400
+    if len(data) > MAX_BULK_ITEMS:
+        return jsonify({'error': f'at most {MAX_BULK_ITEMS} items per request'}), 400
+
+    new_rows = []
+    update_rows = []
+    for index, item in enumerate(data):
+        if not isinstance(item, dict):
+            return jsonify({'error': f'item {index} is not an object'}), 400
+        row = {f: item[f] for f in USER_FIELDS if f in item}
+        if 'id' in row:
+            update_rows.append(row)
+        elif 'username' in row and 'email' in row:
+            new_rows.append(row)
+        else:
+            return jsonify({'error': f'item {index} needs username and email'}), 400
+
+    try:
+        for start in range(0, len(new_rows), BULK_BATCH_SIZE):
+            db.session.execute(insert(User), new_rows[start:start + BULK_BATCH_SIZE])
+        for start in range(0, len(update_rows), BULK_BATCH_SIZE):
+            db.session.execute(update(User), update_rows[start:start + BULK_BATCH_SIZE])
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify({'error': 'conflict', 'detail': str(e.orig)}), 409
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({'error': 'one or more users to update do not exist'}), 404
+
+    return jsonify({'created': len(new_rows), 'updated': len(update_rows)}), 200
+
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
     user = User.query.get_or_404(user_id)
@@ -0,0 +1,55 @@
+import os
+import hmac
+import asyncio
+import threading
+
+from flask import Blueprint, jsonify, request
+from telegram import Update
+
+webhook_bp = Blueprint('webhook', __name__)
+
+# Max number of webhook requests handled at once (also sent to Telegram in setWebhook)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+
+_state = {'application': None, 'loop': None, 'secret': None}
+_slots = threading.BoundedSemaphore(WEBHOOK_MAX_CONNECTIONS)
+
+
+def attach_application(application, loop, secret):
+    """Route incoming webhook updates into the running bot application (only requests carrying secret)"""
+    _state['application'] = application
+    _state['loop'] = loop
+    _state['secret'] = secret
+
+
+def detach_application():
+    _state['application'] = None
+    _state['loop'] = None
+
+
+@webhook_bp.route('/telegram/webhook', methods=['POST'])
+def telegram_webhook():
+    application = _state['application']
+    if application is None:
+        return jsonify({'error': 'bot is not running in webhook mode'}), 503
+
+    # Without a configured secret anyone could post forged updates, so nothing is accepted
+    secret = _state['secret']
+    token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not secret or not hmac.compare_digest(token.encode(), secret.encode()):
+        return jsonify({'error': 'invalid secret token'}), 403
+
+    if not _slots.acquire(blocking=False):
+        # Telegram retries the update later
+        return jsonify({'error': 'too many connections'}), 429
+
+    try:
+        data = request.get_json(silent=True)
+        if not data or 'update_id' not in data:
+            return jsonify({'error': 'invalid update'}), 400
+
+        update = Update.de_json(data, application.bot)
+        asyncio.run_coroutine_threadsafe(application.update_queue.put(update), _state['loop']).result(timeout=5)
+        return '', 200
+    finally:
+        _slots.release()
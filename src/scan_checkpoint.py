@@ -0,0 +1,141 @@
+"""
+نقاط الاستئناف لمراحل الفحص
+يُحفظ في results/<domain>/manifest.json سجل المراحل المكتملة مع بصمة SHA-256 لكل ملف،
+فيُستأنف الفحص من آخر مرحلة مكتملة بعد تعطل أداة أو إعادة تشغيل البوت
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+from src.results_parser import CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# نقاط الاستئناف الأقدم من هذه المدة (بالثواني) لا يُعاد استخدامها
+CHECKPOINT_MAX_AGE = int(os.getenv('CHECKPOINT_MAX_AGE', '86400'))
+
+
+def file_sha256(path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    """بصمة الملف بقراءته على دفعات"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    """قراءة وتحديث ملف manifest.json لمجلد نتائج نطاق واحد"""
+
+    def __init__(self, results_dir: str, domain: str, max_age: int = None):
+        self.results_dir = results_dir
+        self.domain = domain
+        self.max_age = CHECKPOINT_MAX_AGE if max_age is None else max_age
+        self.path = os.path.join(results_dir, MANIFEST_NAME)
+        self.data = self._empty()
+        # المراحل تحفظ من خيوط مختلفة (خارج حلقة الأحداث) في نفس الملف المؤقت
+        self._lock = threading.RLock()
+
+    def _empty(self) -> dict:
+        return {
+            'version': MANIFEST_VERSION,
+            'domain': self.domain,
+            'started_at': time.time(),
+            'finished': False,
+            'stages': {},
+        }
+
+    def load(self) -> bool:
+        """تحميل نقاط فحص سابق لم يكتمل، وإلا البدء بسجل فارغ"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self.data = self._empty()
+            return False
+
+        usable = (
+            data.get('version') == MANIFEST_VERSION
+            and data.get('domain') == self.domain
+            and not data.get('finished')
+            and time.time() - data.get('started_at', 0) <= self.max_age
+        )
+        self.data = data if usable else self._empty()
+        return usable
+
+    def last_finished(self) -> bool:
+        """آخر فحص في المجلد اكتمل، فملفاته نتائج كاملة يمكن المقارنة بها"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return data.get('domain') == self.domain and bool(data.get('finished'))
+
+    def reset(self):
+        """حذف نقاط الاستئناف والبدء من الصفر"""
+        self.data = self._empty()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def is_complete(self, stage: str) -> bool:
+        """المرحلة مكتملة وملفها لم يتغير منذ اكتمالها"""
+        entry = self.data['stages'].get(stage)
+        if entry is None:
+            return False
+        path = os.path.join(self.results_dir, entry['file'])
+        try:
+            return file_sha256(path) == entry['sha256']
+        except OSError:
+            return False
+
+    def discard(self, stages):
+        """إلغاء اكتمال مراحل ستُعاد (نتائجها القديمة لم تعد صالحة)"""
+        with self._lock:
+            for stage in stages:
+                self.data['stages'].pop(stage, None)
+            self.save()
+
+    def complete(self, stage: str, filename: str, sha256: str, count: int):
+        with self._lock:
+            self.data['stages'][stage] = {
+                'file': filename,
+                'sha256': sha256,
+                'count': count,
+                'completed_at': time.time(),
+            }
+            self.save()
+
+    def finish(self):
+        """تعليم الفحص كمكتمل حتى لا يُستأنف مرة أخرى"""
+        with self._lock:
+            self.data['finished'] = True
+            self.save()
+
+    def counts(self) -> dict:
+        return {stage: entry['count'] for stage, entry in self.data['stages'].items()}
+
+    def save(self):
+        """كتابة ذرية: ملف مؤقت ثم استبدال (تتضمن fsync، فتُستدعى من خيط وليس من حلقة الأحداث)"""
+        with self._lock:
+            os.makedirs(self.results_dir, exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            # تسلسل كامل قبل الكتابة حتى لا يتغير القاموس أثناء كتابته من حلقة الأحداث
+            payload = json.dumps(self.data)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
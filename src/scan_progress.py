@@ -0,0 +1,135 @@
+"""
+تتبع تقدم الفحص من مخرجات السكربت
+يكتشف المرحلة الحالية من كل سطر ويحدّث رسالة الحالة بمعدل محدود
+"""
+
+import os
+import re
+import time
+import asyncio
+import logging
+
+from src.metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# المراحل بالترتيب مع أنماط اكتشافها في مخرجات الأدوات
+STAGES = [
+    ('tools', '🔧 جاري تجهيز الأدوات المطلوبة...', re.compile(r'install|go get|downloading', re.I)),
+    ('wayback', '📡 جاري جمع الروابط من Wayback Machine...', re.compile(r'wayback|\bgau\b', re.I)),
+    ('subdomains', '🌐 جاري البحث عن النطاقات الفرعية...', re.compile(r'subfinder|subdomain', re.I)),
+    ('live', '🟢 جاري فحص الروابط النشطة...', re.compile(r'httpx|\buro\b|live', re.I)),
+    ('testing', '🧪 جاري اختبار ثغرات XSS...', re.compile(r'dalfox|kxss|payload|testing', re.I)),
+]
+
+STAGE_NAMES = [name for name, _, _ in STAGES]
+STAGE_LABELS = {name: label for name, label, _ in STAGES}
+
+# أقل مدة بين تعديلين لرسالة الحالة (بالثواني)
+PROGRESS_INTERVAL = float(os.getenv('PROGRESS_INTERVAL', '5'))
+
+
+def detect_stage(line: str):
+    """إرجاع اسم المرحلة التي يشير إليها السطر أو None"""
+    for name, _, pattern in STAGES:
+        if pattern.search(line):
+            return name
+    return None
+
+
+async def iter_lines(stream):
+    """قراءة سطر بسطر من تدفق غير متزامن مع تجاهل الأسطر الأطول من حد القارئ"""
+    while True:
+        try:
+            line = await stream.readline()
+        except ValueError:
+            # السطر أطول من الحد المسموح، يتم تجاهله لإبقاء الذاكرة ثابتة
+            continue
+        if not line:
+            break
+        yield line.decode('utf-8', errors='ignore').rstrip()
+
+
+class ProgressReporter:
+    """تحديث رسالة الحالة بالمرحلة الحالية مع تحديد معدل التعديل"""
+
+    def __init__(self, status_message, domain: str, interval: float = None):
+        self.status_message = status_message
+        self.domain = domain
+        self.interval = PROGRESS_INTERVAL if interval is None else interval
+        self.stage = None
+        self.lines = 0
+        self.started_at = time.monotonic()
+        self.stage_started_at = self.started_at
+        self._last_edit = 0.0
+        self._last_text = None
+        self._pending = None
+
+    def feed_line(self, line: str):
+        """معالجة سطر من مخرجات السكربت"""
+        self.lines += 1
+        stage = detect_stage(line)
+        if stage is not None:
+            self.set_stage(stage)
+        else:
+            self.touch()
+
+    def touch(self):
+        """تحديث دوري للوقت المنقضي حتى لا يبدو الفحص متوقفاً"""
+        if time.monotonic() - self._last_edit >= self.interval * 6:
+            self._schedule()
+
+    def set_stage(self, stage: str):
+        """الانتقال إلى مرحلة جديدة (لا يتم الرجوع لمرحلة سابقة)"""
+        if self.stage is not None and STAGE_NAMES.index(stage) <= STAGE_NAMES.index(self.stage):
+            return
+        self._finish_stage()
+        self.stage = stage
+        self._schedule()
+
+    def _finish_stage(self):
+        """تسجيل مدة المرحلة الحالية في المقاييس"""
+        now = time.monotonic()
+        STAGE_SECONDS.labels(self.stage or 'startup').observe(now - self.stage_started_at)
+        self.stage_started_at = now
+
+    def render(self) -> str:
+        """نص رسالة الحالة الحالي"""
+        elapsed = int(time.monotonic() - self.started_at)
+        label = STAGE_LABELS.get(self.stage, '⏳ جاري التحضير...')
+        step = STAGE_NAMES.index(self.stage) + 1 if self.stage else 0
+        return (
+            f"🔍 فحص النطاق: {self.domain}\n"
+            f"{label}\n"
+            f"📍 المرحلة {step}/{len(STAGES)} • ⏱️ {elapsed // 60}:{elapsed % 60:02d}"
+        )
+
+    def _schedule(self):
+        """تعديل الرسالة فوراً أو تأجيله حتى انقضاء الفترة المحددة"""
+        if self._pending is not None and not self._pending.done():
+            return
+        delay = max(0.0, self._last_edit + self.interval - time.monotonic())
+        self._pending = asyncio.get_running_loop().create_task(self._edit_after(delay))
+
+    async def _edit_after(self, delay: float):
+        if delay:
+            await asyncio.sleep(delay)
+        await self.flush()
+
+    async def flush(self):
+        """إرسال آخر حالة إذا تغير النص"""
+        text = self.render()
+        if text == self._last_text:
+            return
+        self._last_edit = time.monotonic()
+        self._last_text = text
+        try:
+            await self.status_message.edit_text(text)
+        except Exception as e:
+            logger.warning(f"تعذر تحديث رسالة التقدم للنطاق {self.domain}: {str(e)}")
+
+    async def close(self):
+        """تسجيل مدة المرحلة الأخيرة وإلغاء أي تعديل مؤجل"""
+        self._finish_stage()
+        if self._pending is not None and not self._pending.done():
+            self._pending.cancel()
@@ -0,0 +1,219 @@
+"""
+طابور مهام الفحص ومجموعة العمال
+يحدد عدد عمليات الفحص المتزامنة بدلاً من تشغيل كل فحص مباشرة داخل معالج تيليجرام
+"""
+
+import os
+import time
+import asyncio
+import logging
+import itertools
+from collections import Counter
+
+from src.log_setup import job_context
+
+logger = logging.getLogger(__name__)
+
+# مستويات الأولوية (الرقم الأصغر يُنفذ أولاً)
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+_job_ids = itertools.count(1)
+
+
+class QueueFullError(Exception):
+    """يُرفع عند امتلاء الطابور أو تجاوز المستخدم لحد المهام المنتظرة"""
+
+
+class ScanJob:
+    """مهمة فحص واحدة في الطابور"""
+
+    def __init__(self, user_id: int, chat_id: int, domain: str, priority: int = PRIORITY_NORMAL):
+        self.id = next(_job_ids)
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.domain = domain
+        self.priority = priority
+        self.scan_id = None
+        self.waiters = []
+        self.status_message = None
+        self.fresh = False
+        self.targets = None
+        self.diff = False
+        self.control = None
+        self.task = None
+        self.cancelled = False
+        self.status = 'queued'
+        self.seq = 0
+        self.position = None
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+
+    def __repr__(self):
+        return f'<ScanJob {self.id} {self.domain} user={self.user_id} {self.status}>'
+
+
+class ScanQueue:
+    """طابور أولويات (FIFO داخل نفس الأولوية، أو حسب استهلاك المستخدم مع share) مع عدد ثابت من العمال وحد لكل مستخدم"""
+
+    def __init__(self, handler, workers: int = None, per_user_limit: int = None,
+                 max_pending: int = None, max_pending_per_user: int = None, on_position=None,
+                 share=None):
+        self.handler = handler
+        self.on_position = on_position
+        # share(user_id) -> استهلاك المستخدم، الأقل استهلاكاً يتقدم داخل نفس الأولوية (src/fair_share.py)
+        self.share = share
+        self.workers = workers or int(os.getenv('SCAN_WORKERS', '2'))
+        self.per_user_limit = per_user_limit or int(os.getenv('SCAN_PER_USER_LIMIT', '1'))
+        self.max_pending = max_pending or int(os.getenv('SCAN_QUEUE_MAX', '100'))
+        self.max_pending_per_user = max_pending_per_user or int(os.getenv('SCAN_USER_MAX_PENDING', '3'))
+
+        self._seq = itertools.count()
+        self._pending = []
+        self._running = {}
+        self._active_per_user = Counter()
+        self._cond = None
+        self._tasks = []
+
+    def sort_key(self, job: ScanJob):
+        """مفتاح ترتيب المهام المنتظرة"""
+        if self.share is not None:
+            return (job.priority, self.share(job.user_id), job.seq)
+        return (job.priority, job.seq)
+
+    async def start(self):
+        """تشغيل العمال داخل حلقة الأحداث الحالية"""
+        self._cond = asyncio.Condition()
+        self._tasks = [
+            asyncio.create_task(self._worker(n), name=f'scan-worker-{n}')
+            for n in range(self.workers)
+        ]
+        logger.info(f"تم تشغيل {self.workers} عمال للفحص (الحد لكل مستخدم: {self.per_user_limit})")
+
+    async def stop(self):
+        """إيقاف العمال وإلغاء المهام الجارية"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job: ScanJob) -> int:
+        """إضافة مهمة إلى الطابور وإرجاع ترتيبها (1 = التالية)"""
+        if len(self._pending) >= self.max_pending:
+            raise QueueFullError('الطابور ممتلئ حالياً')
+
+        user_pending = sum(1 for j in self._pending if j.user_id == job.user_id)
+        if user_pending >= self.max_pending_per_user:
+            raise QueueFullError('لديك عدد كبير من عمليات الفحص المنتظرة')
+
+        job.seq = next(self._seq)
+        job.status = 'queued'
+        job.enqueued_at = time.monotonic()
+        self._pending.append(job)
+        position = self.position(job)
+        job.position = position
+        self._wake()
+        return position
+
+    def position(self, job: ScanJob):
+        """ترتيب المهمة بين المهام المنتظرة أو None إذا لم تعد منتظرة"""
+        if job not in self._pending:
+            return None
+        ordered = sorted(self._pending, key=self.sort_key)
+        return ordered.index(job) + 1
+
+    def cancel(self, job: ScanJob) -> bool:
+        """إزالة مهمة منتظرة من الطابور (المهام الجارية يلغيها المنفذ)"""
+        if job not in self._pending:
+            return False
+        self._pending.remove(job)
+        job.status = 'cancelled'
+        job.position = None
+        self._report_positions()
+        return True
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def running_count(self) -> int:
+        return len(self._running)
+
+    def running_jobs(self, user_id: int = None):
+        """المهام الجارية (لمستخدم واحد إذا حُدد) دون ترتيب المنتظرة"""
+        return [j for j in self._running.values() if user_id is None or j.user_id == user_id]
+
+    def user_jobs(self, user_id: int):
+        """مهام المستخدم الجارية والمنتظرة"""
+        running = [j for j in self._running.values() if j.user_id == user_id]
+        pending = [j for j in self._pending if j.user_id == user_id]
+        return running + sorted(pending, key=self.sort_key)
+
+    def jobs(self):
+        """كل المهام الجارية والمنتظرة"""
+        return list(self._running.values()) + sorted(self._pending, key=self.sort_key)
+
+    def _wake(self):
+        if self._cond is None:
+            return
+        asyncio.get_running_loop().create_task(self._notify_all())
+
+    async def _notify_all(self):
+        async with self._cond:
+            self._cond.notify_all()
+
+    def _next_job(self):
+        """أول مهمة مؤهلة للتشغيل مع احترام حد المستخدم"""
+        eligible = [
+            job for job in self._pending
+            if self._active_per_user[job.user_id] < self.per_user_limit
+        ]
+        if not eligible:
+            return None
+        return min(eligible, key=self.sort_key)
+
+    async def _worker(self, n: int):
+        while True:
+            async with self._cond:
+                job = self._next_job()
+                while job is None:
+                    await self._cond.wait()
+                    job = self._next_job()
+
+                self._pending.remove(job)
+                self._running[job.id] = job
+                self._active_per_user[job.user_id] += 1
+
+            job.status = 'running'
+            job.position = None
+            job.started_at = time.monotonic()
+            self._report_positions()
+
+            try:
+                with job_context(f'scan-{job.scan_id}' if job.scan_id is not None else f'job-{job.id}'):
+                    await self.handler(job)
+                job.status = 'done'
+            except asyncio.CancelledError:
+                job.status = 'cancelled'
+                raise
+            except Exception as e:
+                job.status = 'failed'
+                logger.error(f"خطأ غير متوقع في مهمة الفحص {job.id}: {str(e)}")
+            finally:
+                job.finished_at = time.monotonic()
+                self._running.pop(job.id, None)
+                self._active_per_user[job.user_id] -= 1
+                if self._active_per_user[job.user_id] <= 0:
+                    del self._active_per_user[job.user_id]
+                self._wake()
+
+    def _report_positions(self):
+        """إبلاغ المهام المنتظرة التي تغير ترتيبها"""
+        if self.on_position is None:
+            return
+        ordered = sorted(self._pending, key=self.sort_key)
+        for index, job in enumerate(ordered, start=1):
+            if job.position != index:
+                job.position = index
+                asyncio.get_running_loop().create_task(self.on_position(job, index))
@@ -0,0 +1,196 @@
+"""
+تنفيذ الفحص على الجهاز الحالي
+يُستخدم من البوت مباشرة (SCAN_EXECUTOR=local) ومن عمال الفحص المستقلين (src/scan_worker.py)،
+ورسالة الحالة أي كائن يملك edit_text (رسالة تيليجرام أو سجل مهمة في الوسيط)
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+
+from src.scan_progress import ProgressReporter, iter_lines
+from src.pipeline import ScanPipeline
+from src.process_limits import JobControl
+from src.toolchain import tool_env, tool_paths
+from src.results_format import summarize, target_breakdown
+from src.results_maintenance import ScanDirLock
+from src.log_setup import tool_logger
+from src.loop_health import run_blocking
+from src.metrics import SUBPROCESS_SECONDS, PARSE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# مسار سكربت XSS Automation ومجلد النتائج
+SCRIPT_PATH = os.getenv('XSS_SCRIPT_PATH', '/home/ubuntu/XSS-Automation/xss_automation.sh')
+SCRIPT_DIR = os.path.dirname(os.path.abspath(SCRIPT_PATH))
+RESULTS_DIR = os.getenv('RESULTS_DIR', os.path.join(SCRIPT_DIR, 'results'))
+
+# محرك الفحص: native (خط أنابيب بايثون بمرحلة لكل أداة) أو script (السكربت الكامل)
+SCAN_ENGINE = os.getenv('SCAN_ENGINE', 'native')
+
+# أقصى طول لسطر واحد من مخرجات السكربت (الأسطر الأطول يتم تجاهلها)
+OUTPUT_LINE_LIMIT = 1024 * 1024
+
+
+class ScanRunner:
+    """تشغيل فحص نطاق واحد وإرجاع {'success', 'data'} أو {'success', 'error'}"""
+
+    async def run(self, domain: str, status_message, resume: bool = True,
+                  control: JobControl = None, targets: list = None, diff: bool = False) -> dict:
+        """تشغيل الفحص بالمحرك المحدد في SCAN_ENGINE ضمن حدود موارد المهمة
+        targets: أهداف الفحص الجماعي (domain عندها اسم الدفعة ومجلد نتائجها)
+        diff: فحص تفاضلي يختبر الروابط الجديدة فقط ويقارن الثغرات بالفحص السابق"""
+        control = control or JobControl()
+        if SCAN_ENGINE == 'script':
+            if targets:
+                return {'success': False, 'error': 'الفحص الجماعي يتطلب المحرك الأصلي (SCAN_ENGINE=native)'}
+            if diff:
+                return {'success': False, 'error': 'الفحص التفاضلي يتطلب المحرك الأصلي (SCAN_ENGINE=native)'}
+        # صيانة مجلد النتائج لا تضغط أو تحذف المجلد طالما الفحص يحجز قفله
+        lock = await run_blocking(ScanDirLock(os.path.join(RESULTS_DIR, domain)).acquire)
+        try:
+            if SCAN_ENGINE == 'script':
+                return await self.run_xss_script(domain, status_message, control)
+            return await self.run_native_pipeline(domain, status_message, resume=resume, control=control,
+                                                  targets=targets, diff=diff)
+        finally:
+            lock.release()
+    
+    async def run_native_pipeline(self, domain: str, status_message, resume: bool = True,
+                                  control: JobControl = None, targets: list = None, diff: bool = False):
+        """تشغيل الأدوات كمراحل متوازية مع الاستئناف من آخر مرحلة مكتملة لفحص لم ينتهِ"""
+        reporter = ProgressReporter(status_message, domain)
+        results_dir = os.path.join(RESULTS_DIR, domain)
+        
+        def on_progress(stage):
+            reporter.set_stage(stage)
+            reporter.touch()
+        
+        started = time.perf_counter()
+        try:
+            await reporter.flush()
+            # أول استدعاء قد يفحص الأدوات ويشغل أوامر الإصدار إن لم يُجرَ الفحص عند البدء
+            tools = await run_blocking(tool_paths)
+            pipeline = ScanPipeline(domain, results_dir, on_progress=on_progress, resume=resume,
+                                    control=control, targets=targets, diff=diff, tools=tools)
+            result = await pipeline.run()
+            if not result['success']:
+                return result
+            parsed = await self.parse_results(results_dir, domain, targets=targets)
+            if parsed['success'] and 'delta' in result:
+                parsed['data']['delta'] = result['delta']
+            return parsed
+        
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'خطأ في تشغيل خط الفحص: {str(e)}'
+            }
+        finally:
+            SUBPROCESS_SECONDS.observe(time.perf_counter() - started)
+            await reporter.close()
+    
+    async def run_xss_script(self, domain: str, status_message, control: JobControl):
+        """تشغيل سكربت XSS Automation مع قراءة مخرجاته سطراً بسطر"""
+        reporter = ProgressReporter(status_message, domain)
+        try:
+            # التأكد من وجود السكربت
+            if not await run_blocking(os.path.exists, SCRIPT_PATH):
+                return {
+                    'success': False,
+                    'error': 'سكربت XSS Automation غير موجود'
+                }
+            
+            # إعداد متغيرات البيئة: مسارات الأدوات المثبتة أولاً حتى يجدها السكربت ولا يعيد تثبيتها
+            env = tool_env()
+            env.setdefault('GOPATH', '/home/ubuntu/go')
+            
+            # تشغيل السكربت
+            started = time.perf_counter()
+            process = await control.spawn(
+                'bash', SCRIPT_PATH,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=env,
+                cwd=SCRIPT_DIR,
+                limit=OUTPUT_LINE_LIMIT
+            )
+            
+            # إرسال المدخلات للسكربت
+            input_data = f"{domain}\nn\n"  # النطاق + عدم استخدام حمولات مخصصة
+            process.stdin.write(input_data.encode())
+            await process.stdin.drain()
+            process.stdin.close()
+            
+            await reporter.flush()
+            
+            # قراءة المخرجات أثناء التشغيل مع الاحتفاظ بآخر أسطر الأخطاء فقط
+            stderr_tail = deque(maxlen=20)
+            
+            async def read_stdout():
+                async for line in iter_lines(process.stdout):
+                    reporter.feed_line(line)
+                    tool_logger.info('xss_automation.sh: %s', line)
+            
+            async def read_stderr():
+                async for line in iter_lines(process.stderr):
+                    stderr_tail.append(line)
+                    reporter.feed_line(line)
+                    tool_logger.info('xss_automation.sh: %s', line)
+            
+            try:
+                await asyncio.gather(read_stdout(), read_stderr())
+                await process.wait()
+            finally:
+                # إنهاء أي عمليات تركها السكربت في مجموعته
+                await control.terminate()
+                SUBPROCESS_SECONDS.observe(time.perf_counter() - started)
+            
+            if process.returncode == 0:
+                # قراءة النتائج
+                results_dir = os.path.join(RESULTS_DIR, domain)
+                return await self.parse_results(results_dir, domain)
+            else:
+                error_tail = '\n'.join(stderr_tail)
+                return {
+                    'success': False,
+                    'error': f'فشل السكربت: {error_tail[-200:]}'
+                }
+        
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'خطأ في تشغيل السكربت: {str(e)}'
+            }
+        finally:
+            await reporter.close()
+    
+    async def parse_results(self, results_dir: str, domain: str, targets: list = None):
+        """تحليل نتائج الفحص بذاكرة محدودة"""
+        try:
+            if not await run_blocking(os.path.exists, results_dir):
+                return {
+                    'success': False,
+                    'error': 'مجلد النتائج غير موجود'
+                }
+            
+            # تحويل الملفات مرة واحدة إلى results.xrf خارج حلقة الأحداث، والعدادات والعينات من فهرسه
+            with PARSE_SECONDS.time():
+                results = await run_blocking(summarize, results_dir, domain)
+                if targets:
+                    results['targets'] = await run_blocking(target_breakdown, results_dir, targets)
+            
+            return {
+                'success': True,
+                'data': results
+            }
+        
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'خطأ في تحليل النتائج: {str(e)}'
+            }
+    
@@ -0,0 +1,217 @@
+"""
+تخزين نتائج الفحص في قاعدة البيانات (app.db) عبر إعداد Flask-SQLAlchemy الحالي
+"""
+
+import os
+import sys
+import gzip
+from datetime import datetime, timedelta
+
+# إضافة جذر المشروع للاستيراد بنفس أسلوب src/main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select, delete, func
+from src.main import app
+from src.models.scan import db, Scan, Finding
+from src.models.scope import ScopeEntry
+from src.models.usage import UserUsage
+from src.results_parser import RESULT_FILES, SAMPLE_FILES
+from src.results_format import has_result_file, iter_result_lines
+
+# عدد الروابط في كل دفعة إدخال
+FINDING_BATCH_SIZE = 1000
+
+
+class ScanStore:
+    """واجهة متزامنة لحفظ وقراءة عمليات الفحص ونتائجها"""
+
+    def __init__(self, flask_app=None):
+        self.app = flask_app or app
+
+    def create_scan(self, user_id: int, chat_id: int, domain: str, targets: list = None,
+                    diff: bool = False, fresh: bool = False) -> int:
+        """إنشاء سجل فحص جديد بحالة الانتظار (targets لأهداف الفحص الجماعي، وdiff وfresh لنوعه عند الاستئناف)"""
+        with self.app.app_context():
+            scan = Scan(user_id=user_id, chat_id=chat_id, domain=domain, status='queued',
+                        targets='\n'.join(targets) if targets else None, diff=diff, fresh=fresh)
+            db.session.add(scan)
+            db.session.commit()
+            return scan.id
+
+    def set_status(self, scan_id: int, status: str):
+        with self.app.app_context():
+            scan = db.session.get(Scan, scan_id)
+            if scan is not None:
+                scan.status = status
+                db.session.commit()
+
+    def complete_scan(self, scan_id: int, results: dict):
+        """حفظ الإحصائيات وإدخال الروابط على دفعات في معاملة واحدة"""
+        with self.app.app_context():
+            scan = db.session.get(Scan, scan_id)
+            if scan is None:
+                return
+            for key in RESULT_FILES.values():
+                setattr(scan, key, results.get(key, 0))
+            scan.results_dir = results.get('results_dir')
+            scan.status = 'done'
+            scan.finished_at = datetime.utcnow()
+
+            results_dir = results.get('results_dir')
+            if results_dir:
+                for kind, filename in SAMPLE_FILES.items():
+                    if has_result_file(results_dir, filename):
+                        self._insert_findings(scan_id, kind, iter_result_lines(results_dir, filename))
+
+            db.session.commit()
+
+    def _insert_findings(self, scan_id: int, kind: str, urls):
+        batch = []
+        for position, url in enumerate(urls):
+            batch.append({'scan_id': scan_id, 'kind': kind, 'position': position, 'url': url})
+            if len(batch) >= FINDING_BATCH_SIZE:
+                db.session.execute(insert(Finding), batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(Finding), batch)
+
+    def link_scan(self, scan_id: int, source_scan_id: int):
+        """إكمال فحص بنتائج فحص آخر لنفس النطاق دون نسخ الروابط"""
+        with self.app.app_context():
+            scan = db.session.get(Scan, scan_id)
+            source = db.session.get(Scan, source_scan_id)
+            if scan is None or source is None:
+                return
+            for key in RESULT_FILES.values():
+                setattr(scan, key, getattr(source, key))
+            scan.results_dir = source.results_dir
+            scan.source_scan_id = source.source_scan_id or source.id
+            scan.status = 'done'
+            scan.finished_at = datetime.utcnow()
+            db.session.commit()
+
+    def fail_scan(self, scan_id: int, error: str):
+        with self.app.app_context():
+            scan = db.session.get(Scan, scan_id)
+            if scan is not None:
+                scan.status = 'failed'
+                scan.error = error
+                scan.finished_at = datetime.utcnow()
+                db.session.commit()
+
+    def interrupted_scans(self, max_age: int) -> list:
+        """الفحوصات التي كانت في الطابور أو قيد التشغيل عند توقف البوت (الأقدم أولاً)"""
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+        with self.app.app_context():
+            scans = db.session.execute(
+                select(Scan)
+                .where(Scan.status.in_(('queued', 'running')))
+                .order_by(Scan.created_at, Scan.id)
+            ).scalars().all()
+            resumable = []
+            for scan in scans:
+                if scan.created_at < cutoff:
+                    # أقدم من أن تُستأنف نقاطها
+                    scan.status = 'failed'
+                    scan.error = 'interrupted'
+                    scan.finished_at = datetime.utcnow()
+                else:
+                    resumable.append(scan.to_dict())
+            db.session.commit()
+            return resumable
+
+    def record_usage(self, scan_id: int, usage: dict, user_usage: dict = None):
+        """حفظ موارد المهمة (وقت المعالج والمدة وأعلى ذاكرة لعملياتها) واستهلاك صاحبها المحدث"""
+        with self.app.app_context():
+            scan = db.session.get(Scan, scan_id)
+            if scan is not None:
+                scan.cpu_seconds = usage['cpu_seconds']
+                scan.wall_seconds = usage.get('wall_seconds')
+                scan.peak_rss_bytes = usage['peak_rss_bytes']
+            if user_usage is not None:
+                db.session.merge(UserUsage(**user_usage))
+            db.session.commit()
+
+    def user_usage(self) -> list:
+        """استهلاك كل المستخدمين (يُحمّل في الجدولة العادلة عند بدء البوت)"""
+        with self.app.app_context():
+            return [entry.to_dict() for entry in db.session.execute(select(UserUsage)).scalars()]
+
+    def get_scan(self, scan_id: int):
+        """سجل الفحص كقاموس أو None"""
+        with self.app.app_context():
+            scan = db.session.get(Scan, scan_id)
+            return scan.to_dict() if scan else None
+
+    def latest_scan(self, user_id: int, domain: str):
+        """آخر فحص مكتمل للمستخدم على النطاق"""
+        with self.app.app_context():
+            scan = db.session.execute(
+                select(Scan)
+                .where(Scan.user_id == user_id, Scan.domain == domain, Scan.status == 'done')
+                .order_by(Scan.created_at.desc())
+                .limit(1)
+            ).scalar_one_or_none()
+            return scan.to_dict() if scan else None
+
+    def get_findings(self, scan_id: int, kind: str, offset: int = 0, limit: int = 20) -> list:
+        """صفحة من الروابط باستخدام الفهرس (scan_id, kind, position)"""
+        with self.app.app_context():
+            return list(db.session.execute(
+                select(Finding.url)
+                .where(Finding.scan_id == scan_id, Finding.kind == kind, Finding.position >= offset)
+                .order_by(Finding.position)
+                .limit(limit)
+            ).scalars())
+
+    def export_findings(self, scan_id: int, kind: str, fileobj, compress: bool = True):
+        """كتابة كل الروابط إلى ملف على دفعات (gzip اختيارياً) دون تحميلها كاملة"""
+        out = gzip.GzipFile(fileobj=fileobj, mode='wb') if compress else fileobj
+        try:
+            with self.app.app_context():
+                rows = db.session.execute(
+                    select(Finding.url)
+                    .where(Finding.scan_id == scan_id, Finding.kind == kind)
+                    .order_by(Finding.position)
+                    .execution_options(yield_per=FINDING_BATCH_SIZE)
+                ).scalars()
+                for url in rows:
+                    out.write(url.encode('utf-8') + b'\n')
+        finally:
+            if compress:
+                out.close()
+
+    def count_findings(self, scan_id: int, kind: str) -> int:
+        with self.app.app_context():
+            return db.session.execute(
+                select(func.count()).select_from(Finding)
+                .where(Finding.scan_id == scan_id, Finding.kind == kind)
+            ).scalar_one()
+
+    def scope_patterns(self, user_id: int) -> list:
+        """أنماط النطاق المصرح به للمستخدم"""
+        with self.app.app_context():
+            return list(db.session.execute(
+                select(ScopeEntry.pattern).where(ScopeEntry.user_id == user_id).order_by(ScopeEntry.pattern)
+            ).scalars())
+
+    def add_scope(self, user_id: int, patterns) -> int:
+        """إضافة أنماط (الموجودة مسبقاً تُتجاهل) وإرجاع عدد الجديدة"""
+        with self.app.app_context():
+            existing = set(db.session.execute(
+                select(ScopeEntry.pattern).where(ScopeEntry.user_id == user_id)
+            ).scalars())
+            new = [p for p in dict.fromkeys(patterns) if p not in existing]
+            db.session.add_all(ScopeEntry(user_id=user_id, pattern=p) for p in new)
+            db.session.commit()
+            return len(new)
+
+    def remove_scope(self, user_id: int, patterns=None) -> int:
+        """حذف أنماط محددة أو كل النطاق المصرح به (None)"""
+        with self.app.app_context():
+            query = delete(ScopeEntry).where(ScopeEntry.user_id == user_id)
+            if patterns is not None:
+                query = query.where(ScopeEntry.pattern.in_(list(patterns)))
+            removed = db.session.execute(query).rowcount
+            db.session.commit()
+            return removed
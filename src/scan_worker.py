@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+عامل فحص مستقل عن بوت تيليجرام
+يسجل نفسه في الوسيط ويرسل نبضات ويحجز مهام الفحص وينفذها بنفس محرك البوت ثم يعيد النتائج.
+يمكن تشغيل أي عدد من العمال (عمليات أو حاويات من نفس Dockerfile) بشرط مشاركة
+DATABASE_URL ومجلد RESULTS_DIR مع البوت:
+
+    SCAN_EXECUTOR=broker في البوت، ثم على كل جهاز:
+    python src/scan_worker.py
+"""
+
+import os
+import sys
+import uuid
+import signal
+import socket
+import asyncio
+import logging
+
+# إضافة جذر المشروع للاستيراد بنفس أسلوب src/main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.broker import get_broker, Broker, BROKER_HEARTBEAT, BROKER_POLL_INTERVAL
+from src.scan_runner import ScanRunner
+from src.process_limits import JobControl, SCAN_TIMEOUT
+from src.toolchain import preflight, health, format_health
+from src.log_setup import setup_logging, job_context
+from src.loop_health import run_blocking
+
+logger = logging.getLogger(__name__)
+
+# عدد المهام المتزامنة لكل عامل
+WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', '1'))
+
+
+class BrokerStatus:
+    """بديل رسالة الحالة: نص التقدم يُحفظ في مهمة الوسيط ويعرضه البوت للمستخدم"""
+
+    def __init__(self, broker: Broker, job_id: int, worker_id: str):
+        self.broker = broker
+        self.job_id = job_id
+        self.worker_id = worker_id
+
+    async def edit_text(self, text: str, **kwargs):
+        await run_blocking(self.broker.set_progress, self.job_id, self.worker_id, text)
+
+
+class ScanWorker:
+    """حلقة العامل: حجز المهام حتى حد التزامن، ونبضة دورية تجدد العقود وتنقل طلبات الإلغاء"""
+
+    def __init__(self, broker: Broker = None, runner: ScanRunner = None, concurrency: int = None,
+                 worker_id: str = None, poll_interval: float = None, heartbeat_interval: float = None):
+        self.broker = broker or get_broker()
+        self.runner = runner or ScanRunner()
+        self.concurrency = concurrency or WORKER_CONCURRENCY
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+        self.poll_interval = poll_interval or BROKER_POLL_INTERVAL
+        self.heartbeat_interval = heartbeat_interval or BROKER_HEARTBEAT
+        self.active = {}
+        self._stopping = None
+
+    def stop(self):
+        """إيقاف حجز مهام جديدة وإعادة المهام الجارية للطابور"""
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def run(self):
+        self._stopping = asyncio.Event()
+        await run_blocking(
+            self.broker.register, self.worker_id, socket.gethostname(), os.getpid(), self.concurrency
+        )
+        logger.info(f"🚀 بدء عامل الفحص {self.worker_id} (التزامن: {self.concurrency})")
+        heartbeat = asyncio.create_task(self._heartbeat_loop())
+        try:
+            while not self._stopping.is_set():
+                if len(self.active) < self.concurrency:
+                    try:
+                        job = await run_blocking(self.broker.lease, self.worker_id)
+                    except Exception as e:
+                        logger.error(f"تعذر حجز مهمة من الوسيط: {str(e)}")
+                        job = None
+                    if job is not None:
+                        self._start(job)
+                        continue
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            heartbeat.cancel()
+            await self._shutdown()
+
+    def _start(self, job: dict):
+        control = JobControl()
+        # المهمة تنسخ السياق عند إنشائها، فكل سجلاتها تحمل معرف الفحص نفسه كما في البوت
+        with job_context(f"scan-{job['scan_id']}"):
+            task = asyncio.create_task(self.execute(job, control))
+        self.active[job['id']] = (task, control)
+        task.add_done_callback(lambda _: self.active.pop(job['id'], None))
+
+    async def execute(self, job: dict, control: JobControl):
+        """تنفيذ مهمة محجوزة وإعادة نتيجتها مع موارد عملياتها"""
+        domain = job['domain']
+        logger.info(f"🔍 بدء فحص {domain} (المهمة {job['id']}، المحاولة {job['attempts']})")
+        status = BrokerStatus(self.broker, job['id'], self.worker_id)
+        try:
+            result = await asyncio.wait_for(
+                self.runner.run(domain, status, resume=job['resume'], control=control,
+                                targets=job['targets'], diff=job['diff']),
+                SCAN_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            result = {'success': False, 'error': f'تجاوز الفحص الحد الزمني ({SCAN_TIMEOUT} ثانية)'}
+        except asyncio.CancelledError:
+            await control.terminate(grace=0)
+            if self._stopping.is_set() and not control.cancelled:
+                # إيقاف العامل: يكمل عامل آخر من نقاط الحفظ
+                await run_blocking(self.broker.release, job['id'], self.worker_id)
+                raise
+            result = {'success': False, 'error': 'تم إلغاء الفحص'}
+        except Exception as e:
+            logger.error(f"خطأ في تنفيذ المهمة {job['id']}: {str(e)}")
+            result = {'success': False, 'error': f'خطأ في عامل الفحص: {str(e)}'}
+        result['usage'] = control.usage()
+        await run_blocking(self.broker.complete, job['id'], self.worker_id, result)
+        logger.info(f"{'✅' if result['success'] else '❌'} انتهى فحص {domain} (المهمة {job['id']})")
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                stop = await run_blocking(self.broker.heartbeat, self.worker_id, list(self.active))
+            except Exception as e:
+                logger.error(f"تعذر إرسال نبضة العامل: {str(e)}")
+                continue
+            for job_id in stop:
+                if job_id in self.active:
+                    logger.info(f"⏹️ إيقاف المهمة {job_id} بطلب من الوسيط")
+                    task, control = self.active[job_id]
+                    control.cancelled = True
+                    task.cancel()
+
+    async def _shutdown(self):
+        tasks = [task for task, _ in self.active.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            await run_blocking(self.broker.unregister, self.worker_id)
+        except Exception as e:
+            logger.error(f"تعذر إلغاء تسجيل العامل: {str(e)}")
+        logger.info(f"⏹️ تم إيقاف عامل الفحص {self.worker_id}")
+
+
+def main():
+    setup_logging()
+    # الأدوات تُفحص مرة واحدة لكل عامل، ولا يحجز العامل مهام إذا نقصت أداة إلزامية
+    summary = health(preflight())
+    for line in format_health(summary).split('\n'):
+        logger.info(line)
+    if not summary['ok']:
+        logger.error(f"❌ أدوات غير مثبتة: {', '.join(summary['missing'])}")
+        return 1
+    worker = ScanWorker()
+
+    async def serve():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+        await worker.run()
+
+    asyncio.run(serve())
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
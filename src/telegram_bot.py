@@ -1,25 +1,152 @@
 import os
+import sys
 import logging
 import subprocess
 import asyncio
+import signal
+import tempfile
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 
-# إعداد التسجيل
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+# إضافة جذر المشروع للاستيراد بنفس أسلوب src/main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.domain_utils import (
+    normalize_domain, normalize_many, split_targets, normalize_scope_pattern, batch_name,
+    is_valid_domain as valid_domain, DomainError, Scope
+)
+from src.scan_queue import ScanQueue, ScanJob, QueueFullError, PRIORITY_HIGH, PRIORITY_NORMAL
+from src.scan_runner import ScanRunner, SCAN_ENGINE
+from src.broker import BrokerClient
+from src.scan_checkpoint import CHECKPOINT_MAX_AGE
+from src.process_limits import JobControl, SCAN_TIMEOUT
+from src.scan_store import ScanStore
+from src.result_cache import ResultCache
+from src.telegram_outbox import TelegramOutbox
+from src import toolchain, results_maintenance
+from src.log_setup import setup_logging
+from src.fair_share import FairShare
+from src.loop_health import LoopMonitor, run_blocking, shutdown_executor, format_report as format_loop_report
+from src.main import start_http_server
+from src.metrics import (
+    SCANS_STARTED, SCANS_FAILED, SCANS_CACHED, SCANS_COALESCED, QUEUE_WAIT_SECONDS,
+    QUEUE_PENDING, QUEUE_RUNNING
 )
+from src.routes.webhook import attach_application, detach_application, WEBHOOK_MAX_CONNECTIONS
+
 logger = logging.getLogger(__name__)
 
 # رمز البوت - يجب الحصول عليه من BotFather
 BOT_TOKEN = os.getenv('BOT_TOKEN', 'YOUR_BOT_TOKEN_HERE')
 
+# عنوان Bot API بديل (خادم Bot API محلي، أو الخادم الوهمي في benchmarks/load_test.py)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '').rstrip('/')
+
+# وضع استقبال التحديثات: polling أو webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+HTTP_PORT = int(os.getenv('PORT', '5000'))
+HTTP_ENABLED = os.getenv('HTTP_ENABLED', '1') == '1'
+
+# منفذ الفحص: local (داخل عملية البوت) أو broker (عمال مستقلون عبر الوسيط)
+SCAN_EXECUTOR = os.getenv('SCAN_EXECUTOR', 'local')
+
+# عدد الروابط المعروضة في كل صفحة من رسالة التفاصيل
+DETAILS_PAGE_SIZE = 20
+
+# أقصى طول للرابط المعروض حتى تبقى الصفحة ضمن حد رسائل تيليجرام
+URL_DISPLAY_LIMIT = 180
+
+# القوائم الأكبر من هذا العدد تُصدّر كملف مضغوط
+EXPORT_PLAIN_LIMIT = 1000
+
+# نوع الروابط في قاعدة البيانات وعنوانها وحقل عددها لكل زر عرض
+FINDING_VIEWS = {
+    'vulns': ('vulnerable', '🚨 الثغرات المكتشفة', 'vulnerable_urls'),
+    'tested': ('tested', '🔍 الروابط المختبرة', 'xss_ready_urls'),
+}
+
+# معرفات المشرفين (تحصل مهامهم على أولوية أعلى في الطابور)
+ADMIN_IDS = {int(x) for x in os.getenv('ADMIN_IDS', '').replace(' ', '').split(',') if x}
+
+# رفض الفحص لمن لم يضف له المشرف نطاقاً مصرحاً به عبر /scope (المشرفون مستثنون)
+SCOPE_REQUIRED = os.getenv('SCOPE_REQUIRED', '0') == '1'
+
+# حدود ملف قائمة الأهداف للفحص الجماعي
+BATCH_MAX_TARGETS = int(os.getenv('BATCH_MAX_TARGETS', '500'))
+BATCH_MAX_BYTES = int(os.getenv('BATCH_MAX_BYTES', str(512 * 1024)))
+
+# عدد الأهداف المعروضة في ملخص الفحص الجماعي
+BATCH_SUMMARY_TARGETS = 15
+
+# عدد الثغرات الجديدة والمختفية المعروضة في تقرير الفحص التفاضلي (القوائم كاملة في مجلد النتائج)
+DELTA_SAMPLE_SIZE = 5
+
+# سبب رفض الفحص عند تجاوز ميزانية وقت المعالج اليومية (USER_DAILY_CPU_SECONDS)
+BUDGET_ERROR = 'تجاوزت ميزانية وقت المعالج اليومية'
+
+def clean_domain_name(domain: str) -> str:
+    """المضيف الموحد للنطاق (مفتاح الذاكرة المؤقتة)، أو النص كما هو بأحرف صغيرة إذا لم يكن نطاقاً صالحاً"""
+    try:
+        return normalize_domain(domain)
+    except DomainError:
+        return domain.strip().lower()
+
 class XSSAutomationBot:
     def __init__(self):
-        self.application = Application.builder().token(BOT_TOKEN).build()
+        builder = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .post_init(self._post_init)
+            .post_shutdown(self._post_shutdown)
+        )
+        if TELEGRAM_API_URL:
+            builder = builder.base_url(f'{TELEGRAM_API_URL}/bot').base_file_url(f'{TELEGRAM_API_URL}/file/bot')
+        self.application = builder.build()
+        self.fair_share = FairShare()
+        self.scan_queue = ScanQueue(self.execute_scan, on_position=self._report_queue_position,
+                                    share=self._user_share)
+        QUEUE_PENDING.set_function(self.scan_queue.pending_count)
+        QUEUE_RUNNING.set_function(self.scan_queue.running_count)
+        self.outbox = TelegramOutbox(self.application.bot)
+        self.store = ScanStore()
+        self.result_cache = ResultCache()
+        self.runner = ScanRunner()
+        self.broker_client = BrokerClient() if SCAN_EXECUTOR == 'broker' else None
+        self._scopes = {}
+        self._maintenance = None
+        self.loop_monitor = LoopMonitor()
         self.setup_handlers()
     
+    async def _post_init(self, application: Application):
+        """تشغيل عمال الفحص بعد تهيئة التطبيق"""
+        self.loop_monitor.start()
+        # استهلاك المستخدمين المحفوظ قبل أول ترتيب للطابور
+        try:
+            self.fair_share.load(await run_blocking(self.store.user_usage))
+        except Exception as e:
+            logger.error(f"تعذر تحميل استهلاك المستخدمين: {str(e)}")
+        await self.scan_queue.start()
+        asyncio.get_running_loop().create_task(self.resume_interrupted_scans())
+        self._maintenance = asyncio.get_running_loop().create_task(results_maintenance.run_forever())
+    
+    def _user_share(self, user_id: int) -> float:
+        """استهلاك المستخدم لترتيب الطابور، مع وقت المعالج الجاري لفحوصاته قيد التشغيل"""
+        running_cpu = sum(
+            job.control.usage()['cpu_seconds']
+            for job in self.scan_queue.running_jobs(user_id) if getattr(job, 'control', None) is not None
+        )
+        return self.fair_share.share(user_id, running_cpu)
+    
+    async def _post_shutdown(self, application: Application):
+        """إيقاف عمال الفحص عند إيقاف البوت"""
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+        await self.scan_queue.stop()
+        self.loop_monitor.stop()
+        shutdown_executor()
+    
     def setup_handlers(self):
         """إعداد معالجات الأوامر والرسائل"""
         # معالج أمر البداية
@@ -31,12 +158,31 @@ class XSSAutomationBot:
         # معالج أمر فحص XSS
         self.application.add_handler(CommandHandler("scan", self.scan_xss))
         
+        # معالج أمر إلغاء الفحص
+        self.application.add_handler(CommandHandler("cancel", self.cancel_scan))
+        
+        # معالج أمر النطاق المصرح به
+        self.application.add_handler(CommandHandler("scope", self.scope_command))
+        
+        # معالج أمر حالة الأدوات (للمشرفين)
+        self.application.add_handler(CommandHandler("health", self.health_command))
+        
+        # معالج أمر استهلاك المعالج
+        self.application.add_handler(CommandHandler("usage", self.usage_command))
+        
         # معالج الأزرار التفاعلية
         self.application.add_handler(CallbackQueryHandler(self.button_handler))
         
+        # معالج ملفات قوائم الأهداف (فحص جماعي)
+        self.application.add_handler(MessageHandler(filters.Document.ALL, self.handle_target_file))
+        
         # معالج الرسائل النصية (للنطاقات)
         self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_domain))
     
+    async def reply(self, update: Update, text: str, **kwargs):
+        """إرسال رسالة إلى محادثة التحديث عبر طبقة الإرسال"""
+        return await self.outbox.send(update.effective_chat.id, text, **kwargs)
+    
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """معالج أمر البداية"""
         welcome_message = """
@@ -48,6 +194,9 @@ class XSSAutomationBot:
 /start - بدء المحادثة
 /help - عرض المساعدة
 /scan - فحص موقع للبحث عن ثغرات XSS
+/cancel - إلغاء الفحص الجاري أو المنتظر
+/scope - عرض النطاقات المصرح لك بفحصها
+/usage - عرض استهلاكك لوقت المعالج
 
 ⚠️ تنبيه: استخدم هذا البوت فقط على المواقع التي تملكها أو لديك إذن صريح لاختبارها.
 
@@ -62,7 +211,7 @@ class XSSAutomationBot:
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.message.reply_text(welcome_message, reply_markup=reply_markup)
+        await self.reply(update, welcome_message, reply_markup=reply_markup)
     
     async def help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """معالج أمر المساعدة"""
@@ -76,6 +225,26 @@ class XSSAutomationBot:
 2. أو أرسل النطاق مباشرة بدون أمر
    مثال: example.com
 
+3. لتجاهل النتائج المحفوظة وإعادة الفحص
+   مثال: /scan --fresh example.com
+   أو لفحص الروابط الجديدة فقط منذ آخر فحص ومعرفة ما تغير
+   مثال: /scan --diff example.com
+
+4. لإلغاء فحوصاتك الجارية (أو فحص نطاق محدد)
+   مثال: /cancel أو /cancel example.com
+
+5. لعرض النطاقات المصرح لك بفحصها (يُرفض أي نطاق خارجها)
+   مثال: /scope
+   يضيفها المشرف: /scope add <معرف المستخدم> example.com *.test.org
+   ويحذفها: /scope remove <معرف المستخدم> example.com، /scope clear <معرف المستخدم>
+
+6. لفحص عدة أهداف دفعة واحدة أرسل ملفاً نصياً بهدف في كل سطر
+   تُجمع الروابط وتُفحص مرة واحدة وتصلك نتيجة موحدة
+
+7. لعرض استهلاكك لوقت المعالج اليوم وميزانيتك المتبقية
+   مثال: /usage
+   الأقل استهلاكاً مؤخراً يتقدم في الطابور
+
 🛠️ ما يقوم به البوت:
 • جمع عناوين URL من Wayback Machine
 • البحث عن النطاقات الفرعية
@@ -92,19 +261,65 @@ class XSSAutomationBot:
 
 📞 للدعم: تواصل مع مطور البوت
         """
-        await update.message.reply_text(help_message)
+        await self.reply(update, help_message)
     
     async def scan_xss(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """معالج أمر فحص XSS"""
-        if not context.args:
-            await update.message.reply_text(
+        # خيار --fresh لتجاهل النتائج المحفوظة، و--diff لفحص الروابط الجديدة منذ آخر فحص فقط
+        args = [arg for arg in context.args if arg not in ('--fresh', '--diff')]
+        fresh = '--fresh' in context.args
+        diff = '--diff' in context.args
+        if not args:
+            await self.reply(
+                update,
                 "❌ يرجى تحديد النطاق المراد فحصه\n"
                 "مثال: /scan example.com"
             )
             return
         
-        domain = context.args[0].strip()
-        await self.perform_scan(update, domain)
+        domain = args[0].strip()
+        await self.perform_scan(update, domain, fresh=fresh, diff=diff)
+    
+    async def cancel_scan(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """معالج أمر إلغاء الفحص: /cancel لكل فحوصات المستخدم أو /cancel <نطاق>"""
+        user_id = update.effective_user.id
+        domain = clean_domain_name(context.args[0]) if context.args else None
+        cancelled = []
+        
+        for job in self.scan_queue.user_jobs(user_id):
+            if domain is None or job.domain == domain:
+                await self.cancel_job(job)
+                cancelled.append(job.domain)
+        
+        # الانضمام لفحص مستخدم آخر يُلغى بإزالة المستخدم من قائمة الانتظار فقط
+        for job in self.scan_queue.jobs():
+            for waiter in list(job.waiters):
+                if waiter['user_id'] == user_id and (domain is None or job.domain == domain):
+                    job.waiters.remove(waiter)
+                    await run_blocking(self.store.fail_scan, waiter['scan_id'], 'تم إلغاء الفحص')
+                    await waiter['status_message'].edit_text(f"⏹️ تم إلغاء فحص النطاق: {job.domain}")
+                    cancelled.append(job.domain)
+        
+        if cancelled:
+            await self.reply(update, f"⏹️ تم إلغاء: {', '.join(sorted(set(cancelled)))}")
+        else:
+            await self.reply(update, "ℹ️ لا يوجد فحص جارٍ أو منتظر لإلغائه")
+    
+    async def cancel_job(self, job: ScanJob):
+        """إلغاء مهمة منتظرة أو إيقاف مهمة جارية مع إنهاء كل عملياتها فوراً"""
+        job.cancelled = True
+        if self.scan_queue.cancel(job):
+            # لم تبدأ بعد: تُغلق هنا مع إبلاغ المنتظرين
+            result = {'success': False, 'error': 'تم إلغاء الفحص'}
+            self.result_cache.clear_inflight(job.domain, job, job.diff)
+            await run_blocking(self.store.fail_scan, job.scan_id, result['error'])
+            await job.status_message.edit_text(f"⏹️ تم إلغاء فحص النطاق: {job.domain}")
+            await self.notify_waiters(job, result)
+            return
+        if job.task is not None:
+            job.task.cancel()
+        if job.control is not None:
+            await job.control.cancel()
     
     async def handle_domain(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """معالج الرسائل النصية (النطاقات)"""
@@ -112,7 +327,8 @@ class XSSAutomationBot:
         
         # التحقق من صحة النطاق
         if not self.is_valid_domain(domain):
-            await update.message.reply_text(
+            await self.reply(
+                update,
                 "❌ النطاق غير صحيح. يرجى إدخال نطاق صحيح\n"
                 "مثال: example.com أو https://example.com"
             )
@@ -122,43 +338,421 @@ class XSSAutomationBot:
     
     def is_valid_domain(self, domain):
         """التحقق من صحة النطاق"""
-        # إزالة البروتوكول إذا كان موجوداً
-        domain = domain.replace('https://', '').replace('http://', '')
-        domain = domain.split('/')[0]  # إزالة المسار إذا كان موجوداً
+        return valid_domain(domain)
+    
+    async def user_scope(self, user_id: int) -> Scope:
+        """النطاق المصرح به للمستخدم (يُقرأ من قاعدة البيانات مرة واحدة حتى يتغير)"""
+        scope = self._scopes.get(user_id)
+        if scope is None:
+            scope = Scope(await run_blocking(self.store.scope_patterns, user_id))
+            self._scopes[user_id] = scope
+        return scope
+    
+    async def in_user_scope(self, user_id: int, host: str) -> bool:
+        scope = await self.user_scope(user_id)
+        if not scope:
+            return not SCOPE_REQUIRED or user_id in ADMIN_IDS
+        return scope.allows(host)
+    
+    async def health_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """معالج أمر /health: حالة الأدوات من فحص بدء التشغيل والطابور ومجلد النتائج وتأخر حلقة الأحداث (للمشرفين فقط)"""
+        if update.effective_user.id not in ADMIN_IDS:
+            await self.reply(update, "⛔ هذا الأمر متاح للمشرفين فقط")
+            return
         
-        # فحص بسيط للنطاق
-        if '.' not in domain or len(domain) < 3:
-            return False
+        if SCAN_EXECUTOR == 'broker':
+            workers = await run_blocking(self.broker_client.broker.workers)
+            text = f"🧰 الأدوات مثبتة على عمال الفحص، المتصلون الآن: {len(workers)}"
+        else:
+            manifest = toolchain.cached()
+            if manifest is None:
+                manifest = await run_blocking(toolchain.preflight)
+            text = toolchain.format_health(toolchain.health(manifest))
+        text += (
+            f"\n\n📋 الطابور: {self.scan_queue.pending_count()} بانتظار التشغيل، "
+            f"{self.scan_queue.running_count()} قيد التشغيل"
+        )
+        report = results_maintenance.last_report()
+        if report is not None:
+            text += '\n' + results_maintenance.format_report(report)
+        text += '\n' + format_loop_report(self.loop_monitor.report())
+        await self.reply(update, text)
+    
+    def _over_budget(self, user_id: int) -> bool:
+        """تجاوز المستخدم ميزانية وقت المعالج اليومية (المشرفون بدون حد)"""
+        return user_id not in ADMIN_IDS and self.fair_share.over_budget(user_id)
+    
+    def _budget_message(self, domain: str) -> str:
+        return (
+            f"⛔ تعذر فحص النطاق: {domain}\n"
+            f"{BUDGET_ERROR} ({self.fair_share.daily_budget:g} ثانية)\n"
+            "تتجدد الميزانية عند منتصف الليل UTC، ويمكنك متابعة استهلاكك عبر /usage"
+        )
+    
+    async def usage_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """معالج أمر /usage: استهلاك المستخدم اليوم وحصته في الطابور، و/usage all للمشرفين"""
+        user_id = update.effective_user.id
+        if context.args and context.args[0] == 'all':
+            if user_id not in ADMIN_IDS:
+                await self.reply(update, "⛔ هذا الأمر متاح للمشرفين فقط")
+                return
+            top = self.fair_share.top()
+            if not top:
+                await self.reply(update, "📊 لا يوجد استهلاك مسجل حالياً")
+                return
+            lines = ["📊 الأعلى استهلاكاً (ثواني معالج متناقصة ÷ الوزن):"]
+            for rank, (uid, share) in enumerate(top, 1):
+                today = self.fair_share.today(uid)
+                lines.append(f"{rank}. {uid}: {share:.1f} (اليوم {today['cpu_seconds']:.1f} ث، {today['scans']} فحص)")
+            await self.reply(update, '\n'.join(lines))
+            return
         
-        # فحص الأحرف المسموحة
-        allowed_chars = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.-')
-        return all(c in allowed_chars for c in domain)
+        today = self.fair_share.today(user_id)
+        remaining = self.fair_share.remaining(user_id)
+        if remaining is None or user_id in ADMIN_IDS:
+            budget = "بدون حد"
+        else:
+            budget = f"متبقٍ {remaining:.1f} من {self.fair_share.daily_budget:g} ثانية"
+        await self.reply(
+            update,
+            "📊 استهلاكك اليوم (UTC):\n"
+            f"⚙️ وقت المعالج: {today['cpu_seconds']:.1f} ثانية ({budget})\n"
+            f"⏱️ وقت التشغيل: {today['wall_seconds']:.1f} ثانية\n"
+            f"🔍 عدد الفحوصات: {today['scans']}\n"
+            f"⚖️ حصتك في الطابور: {self._user_share(user_id):.1f} (الوزن {self.fair_share.weight(user_id):g}، الأقل يتقدم)"
+        )
     
-    async def perform_scan(self, update: Update, domain: str):
-        """تنفيذ عملية الفحص"""
-        # تنظيف النطاق
-        clean_domain = domain.replace('https://', '').replace('http://', '').split('/')[0]
+    async def scope_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """معالج أمر النطاق المصرح به: /scope لعرض نطاقاتك، والتعديل للمشرفين فقط
+        /scope add|remove <معرف المستخدم> <أنماط>، /scope clear <معرف المستخدم>، /scope list <معرف المستخدم>"""
+        user_id = update.effective_user.id
+        args = context.args or []
+        action = args[0].lower() if args else 'list'
+        
+        if action in ('add', 'remove', 'clear') or (action == 'list' and len(args) > 1):
+            # المستخدم لا يوسع قائمته بنفسه وإلا لما كانت القائمة تمنع شيئاً
+            if user_id not in ADMIN_IDS:
+                await self.reply(update, "⛔ تعديل النطاقات المصرح بها متاح للمشرفين فقط، تواصل مع المشرف لإضافة نطاقك")
+                return
+            try:
+                target_id = int(args[1])
+            except (IndexError, ValueError):
+                example = "example.com *.test.org" if action in ('add', 'remove') else ""
+                await self.reply(update, f"❌ مثال: /scope {action} <معرف المستخدم> {example}".rstrip())
+                return
+        else:
+            target_id = user_id
+        
+        if action in ('add', 'remove'):
+            patterns, invalid = [], []
+            for value in args[2:]:
+                try:
+                    patterns.append(normalize_scope_pattern(value))
+                except DomainError as e:
+                    invalid.append(f"• {value}: {str(e)}")
+            if not patterns and not invalid:
+                await self.reply(update, f"❌ مثال: /scope {action} {target_id} example.com *.test.org")
+                return
+            if action == 'add':
+                changed = await run_blocking(self.store.add_scope, target_id, patterns)
+                message = f"✅ تمت إضافة {changed} نطاق للمستخدم {target_id}"
+            else:
+                changed = await run_blocking(self.store.remove_scope, target_id, patterns)
+                message = f"🗑️ تم حذف {changed} نطاق من المستخدم {target_id}"
+            if invalid:
+                message += "\n\n❌ نطاقات غير صالحة:\n" + '\n'.join(invalid)
+            self._scopes.pop(target_id, None)
+            logger.info(f"المشرف {user_id} عدّل نطاقات المستخدم {target_id}: {action} {' '.join(patterns)}")
+            await self.reply(update, message)
+            return
+        
+        if action == 'clear':
+            changed = await run_blocking(self.store.remove_scope, target_id)
+            self._scopes.pop(target_id, None)
+            logger.info(f"المشرف {user_id} حذف نطاقات المستخدم {target_id}")
+            await self.reply(update, f"🗑️ تم حذف {changed} نطاق من قائمة المستخدم {target_id}")
+            return
+        
+        scope = await self.user_scope(target_id)
+        owner = "لك" if target_id == user_id else f"للمستخدم {target_id}"
+        if scope:
+            await self.reply(
+                update,
+                f"🎯 النطاقات المصرح {owner} بفحصها:\n" + '\n'.join(f"• {p}" for p in scope.patterns)
+            )
+        elif SCOPE_REQUIRED and target_id not in ADMIN_IDS:
+            await self.reply(update, f"⛔ لا توجد نطاقات مصرح {owner} بفحصها بعد\nيضيفها المشرف عبر /scope add")
+        else:
+            await self.reply(update, f"ℹ️ لا توجد قائمة نطاقات {owner}، الفحص مسموح لأي نطاق")
+    
+    async def perform_scan(self, update: Update, domain: str, fresh: bool = False, diff: bool = False):
+        """إضافة عملية الفحص إلى الطابور أو إعادة نتائج محفوظة"""
+        user_id = update.effective_user.id
+        chat_id = update.effective_chat.id
+        
+        # توحيد النطاق ورفض غير الصالح أو غير المصرح به قبل تشغيل أي عملية
+        try:
+            clean_domain = normalize_domain(domain)
+        except DomainError as e:
+            await self.reply(update, f"❌ النطاق غير صحيح: {str(e)}")
+            return
+        if not await self.in_user_scope(user_id, clean_domain):
+            await self.reply(
+                update,
+                f"⛔ النطاق {clean_domain} خارج النطاقات المصرح لك بفحصها\n"
+                "استخدم /scope لعرضها، ويضيف المشرف النطاقات الجديدة"
+            )
+            return
+        
+        await self.enqueue_scan(update, clean_domain, fresh=fresh, diff=diff)
+    
+    async def handle_target_file(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """معالج ملف قائمة أهداف: كل الأهداف الصالحة المصرح بها تُفحص كمهمة واحدة"""
+        document = update.message.document
+        user_id = update.effective_user.id
+        if document.file_size and document.file_size > BATCH_MAX_BYTES:
+            await self.reply(update, f"❌ حجم الملف أكبر من الحد المسموح ({BATCH_MAX_BYTES // 1024} KB)")
+            return
+        
+        try:
+            telegram_file = await document.get_file()
+            content = bytes(await telegram_file.download_as_bytearray()).decode('utf-8')
+        except UnicodeDecodeError:
+            await self.reply(update, "❌ يجب أن يكون الملف نصياً (UTF-8) بهدف واحد في كل سطر")
+            return
+        
+        targets, invalid = await run_blocking(normalize_many, split_targets(content))
+        allowed = [host for host in targets if await self.in_user_scope(user_id, host)]
+        rejected = [f"• {value}: {reason}" for value, reason in invalid]
+        rejected += [f"• {host}: خارج النطاقات المصرح بها" for host in targets if host not in allowed]
+        
+        if len(allowed) > BATCH_MAX_TARGETS:
+            await self.reply(update, f"❌ عدد الأهداف ({len(allowed)}) أكبر من الحد المسموح ({BATCH_MAX_TARGETS})")
+            return
+        
+        message = f"📄 الأهداف المقبولة: {len(allowed)}"
+        if rejected:
+            message += f"\n⚠️ المرفوضة: {len(rejected)}\n" + '\n'.join(rejected[:20])
+            if len(rejected) > 20:
+                message += f"\n... و{len(rejected) - 20} أخرى"
+        await self.reply(update, message)
+        
+        if len(allowed) == 1:
+            await self.enqueue_scan(update, allowed[0])
+        elif allowed:
+            await self.enqueue_scan(update, batch_name(allowed), targets=allowed)
+    
+    async def enqueue_scan(self, update: Update, clean_domain: str, fresh: bool = False, targets: list = None,
+                           diff: bool = False):
+        """إضافة فحص موحد ومصرح به إلى الطابور أو إعادة نتائج محفوظة
+        (targets للفحص الجماعي، وdiff للفحص التفاضلي الذي لا يستخدم النتائج المحفوظة)"""
+        user_id = update.effective_user.id
+        chat_id = update.effective_chat.id
+        
+        # نتائج حديثة لنفس النطاق
+        cached = None if fresh or diff else self.result_cache.get(clean_domain)
+        if cached is not None:
+            SCANS_CACHED.inc()
+            results, age = cached
+            scan_id = await run_blocking(self.store.create_scan, user_id, chat_id, clean_domain, targets)
+            await run_blocking(self.store.link_scan, scan_id, results['scan_id'])
+            await self.send_results(
+                chat_id, clean_domain, dict(results, scan_id=scan_id),
+                note=f"⚡ نتائج محفوظة منذ {int(age // 60)} دقيقة، استخدم /scan --fresh {clean_domain} لفحص جديد"
+            )
+            return
         
         # رسالة البداية
-        status_message = await update.message.reply_text(
+        status_message = await self.reply(
+            update,
             f"🔍 بدء فحص النطاق: {clean_domain}\n"
-            "⏳ جاري التحضير... يرجى الانتظار"
+            + (f"🎯 فحص جماعي لـ {len(targets)} هدف\n" if targets else "")
+            + ("🔁 فحص تفاضلي: الروابط الجديدة منذ آخر فحص فقط\n" if diff else "")
+            + "⏳ جاري التحضير... يرجى الانتظار"
         )
         
-        try:
-            # تحديث الحالة
+        # تسجيل الفحص في قاعدة البيانات مع نوعه حتى يُستأنف بنفس النوع بعد إعادة التشغيل
+        scan_id = await run_blocking(self.store.create_scan, user_id, chat_id, clean_domain, targets, diff, fresh)
+        
+        # الانضمام إلى فحص جارٍ لنفس النطاق ونفس النوع (كامل أو تفاضلي) بدلاً من تشغيل فحص جديد
+        inflight = self.result_cache.inflight(clean_domain, diff)
+        if inflight is not None:
+            SCANS_COALESCED.inc()
+            inflight.waiters.append({
+                'user_id': user_id,
+                'chat_id': chat_id,
+                'status_message': status_message,
+                'scan_id': scan_id
+            })
             await status_message.edit_text(
                 f"🔍 فحص النطاق: {clean_domain}\n"
-                "📡 جاري جمع المعلومات من Wayback Machine..."
+                "🔗 يوجد فحص جارٍ لنفس النطاق، سيتم إرسال النتائج عند انتهائه"
             )
+            return
+        
+        # النتائج المحفوظة والانضمام لفحص جارٍ لا يستهلكان المعالج، فالميزانية تُفحص قبل إضافة فحص جديد
+        if self._over_budget(user_id):
+            await run_blocking(self.store.fail_scan, scan_id, BUDGET_ERROR)
+            await status_message.edit_text(self._budget_message(clean_domain))
+            return
+        
+        job = ScanJob(
+            user_id=user_id,
+            chat_id=chat_id,
+            domain=clean_domain,
+            priority=PRIORITY_HIGH if user_id in ADMIN_IDS else PRIORITY_NORMAL
+        )
+        job.status_message = status_message
+        job.scan_id = scan_id
+        job.fresh = fresh
+        job.targets = targets
+        job.diff = diff
+        
+        try:
+            position = self.scan_queue.submit(job)
+        except QueueFullError as e:
+            await run_blocking(self.store.fail_scan, job.scan_id, str(e))
+            await job.status_message.edit_text(
+                f"❌ تعذر إضافة فحص النطاق: {clean_domain}\n"
+                f"{str(e)}، يرجى المحاولة لاحقاً"
+            )
+            return
+        
+        self.result_cache.set_inflight(clean_domain, job, diff)
+        
+        if position > 1 or self.scan_queue.running_count() >= self.scan_queue.workers:
+            await self._report_queue_position(job, position)
+    
+    async def resume_interrupted_scans(self):
+        """إعادة الفحوصات التي توقفت بسبب إعادة التشغيل إلى الطابور (تُستأنف من نقاطها)"""
+        try:
+            scans = await run_blocking(self.store.interrupted_scans, CHECKPOINT_MAX_AGE)
+        except Exception as e:
+            logger.error(f"تعذر قراءة الفحوصات المتوقفة: {str(e)}")
+            return
+        
+        for scan in scans:
+            domain = scan['domain']
+            diff = scan['diff']
+            try:
+                status_message = await self.outbox.send(
+                    scan['chat_id'],
+                    f"♻️ تمت إعادة تشغيل البوت\n"
+                    f"🔍 سيتم استئناف فحص النطاق: {domain}"
+                    + ("\n🔁 فحص تفاضلي: الروابط الجديدة منذ آخر فحص فقط" if diff else "")
+                )
+                
+                # المستخدمون الذين انضموا لنفس الفحص (بنفس النوع) يبقون منتظرين له
+                inflight = self.result_cache.inflight(domain, diff)
+                if inflight is not None:
+                    inflight.waiters.append({
+                        'user_id': scan['user_id'],
+                        'chat_id': scan['chat_id'],
+                        'status_message': status_message,
+                        'scan_id': scan['id']
+                    })
+                    continue
+                
+                job = ScanJob(
+                    user_id=scan['user_id'],
+                    chat_id=scan['chat_id'],
+                    domain=domain,
+                    priority=PRIORITY_HIGH if scan['user_id'] in ADMIN_IDS else PRIORITY_NORMAL
+                )
+                job.status_message = status_message
+                job.scan_id = scan['id']
+                job.targets = scan['targets']
+                job.diff = diff
+                job.fresh = scan['fresh']
+                
+                await run_blocking(self.store.set_status, job.scan_id, 'queued')
+                try:
+                    self.scan_queue.submit(job)
+                except QueueFullError as e:
+                    await run_blocking(self.store.fail_scan, job.scan_id, str(e))
+                    await status_message.edit_text(
+                        f"❌ تعذر استئناف فحص النطاق: {domain}\n"
+                        f"{str(e)}، يرجى المحاولة لاحقاً"
+                    )
+                    continue
+                
+                self.result_cache.set_inflight(domain, job, diff)
+            except Exception as e:
+                logger.error(f"تعذر استئناف فحص النطاق {domain}: {str(e)}")
+        
+        if scans:
+            logger.info(f"تمت إعادة {len(scans)} فحص متوقف إلى الطابور")
+    
+    async def _report_queue_position(self, job: ScanJob, position: int):
+        """تحديث رسالة الحالة بترتيب المهمة في الطابور"""
+        try:
+            await job.status_message.edit_text(
+                f"🔍 فحص النطاق: {job.domain}\n"
+                f"⏳ أنت رقم {position} في الطابور"
+            )
+        except Exception as e:
+            logger.warning(f"تعذر تحديث ترتيب الطابور للمهمة {job.id}: {str(e)}")
+    
+    async def execute_scan(self, job: ScanJob):
+        """تنفيذ عملية الفحص (يُستدعى من عمال الطابور)"""
+        clean_domain = job.domain
+        status_message = job.status_message
+        result = None
+        
+        try:
+            # الميزانية تُفحص مرة ثانية عند خروج المهمة من الطابور:
+            # فحوصات المستخدم الأخرى ربما استهلكتها أثناء انتظار هذه المهمة
+            if self._over_budget(job.user_id):
+                # المنتظرون على نفس الفحص لم يتجاوزوا ميزانيتهم فيُطلب منهم إعادة الطلب
+                result = {'success': False, 'error': 'تجاوز صاحب الفحص ميزانية وقت المعالج اليومية، أعد طلب الفحص'}
+                await run_blocking(self.store.fail_scan, job.scan_id, BUDGET_ERROR)
+                await status_message.edit_text(self._budget_message(clean_domain))
+                return
+            
+            SCANS_STARTED.inc()
+            QUEUE_WAIT_SECONDS.observe(job.started_at - job.enqueued_at)
+            await run_blocking(self.store.set_status, job.scan_id, 'running')
             
-            # تنفيذ سكربت XSS Automation
-            result = await self.run_xss_automation(clean_domain, status_message)
+            # تنفيذ الفحص كمهمة مستقلة حتى يمكن إيقافها بالمهلة أو بالأمر /cancel
+            job.control = JobControl()
+            job.task = asyncio.ensure_future(self.run_xss_automation(
+                clean_domain, status_message, resume=not job.fresh, control=job.control,
+                scan_id=job.scan_id, targets=job.targets, diff=job.diff
+            ))
+            if job.cancelled:
+                job.task.cancel()
+            try:
+                result = await asyncio.wait_for(job.task, SCAN_TIMEOUT)
+            except asyncio.TimeoutError:
+                result = {'success': False, 'error': f'تجاوز الفحص الحد الزمني ({SCAN_TIMEOUT} ثانية)'}
+            except asyncio.CancelledError:
+                if not job.cancelled:
+                    raise
+                result = {'success': False, 'error': 'تم إلغاء الفحص'}
+            if job.cancelled:
+                result = {'success': False, 'error': 'تم إلغاء الفحص'}
+            
+            # موارد العامل البعيد تصل مع النتيجة
+            usage = result.pop('usage', None) or job.control.usage()
+            logger.info(
+                f"موارد فحص {clean_domain}: {usage['cpu_seconds']} ثانية معالج، "
+                f"{usage['peak_rss_bytes'] // (1024 * 1024)} MB ذاكرة، {usage['processes']} عملية، "
+                f"{usage.get('wall_seconds', 0)} ثانية تشغيل"
+            )
+            # احتساب الفحص على صاحبه (يؤثر على ترتيب فحوصاته القادمة وميزانيته اليومية)
+            user_usage = self.fair_share.charge(job.user_id, usage['cpu_seconds'], usage.get('wall_seconds', 0.0))
+            await run_blocking(self.store.record_usage, job.scan_id, usage, user_usage)
             
             if result['success']:
-                # إرسال النتائج
-                await self.send_results(update, clean_domain, result['data'])
+                # حفظ النتائج ثم إرسالها
+                await run_blocking(self.store.complete_scan, job.scan_id, result['data'])
+                result['data']['scan_id'] = job.scan_id
+                # نتائج الفحص التفاضلي جزئية فلا تُعاد لطلبات الفحص العادية
+                if 'delta' not in result['data']:
+                    self.result_cache.put(clean_domain, result['data'])
+                await self.send_results(job.chat_id, clean_domain, result['data'])
             else:
+                await run_blocking(self.store.fail_scan, job.scan_id, result['error'])
                 await status_message.edit_text(
                     f"❌ فشل في فحص النطاق: {clean_domain}\n"
                     f"الخطأ: {result['error']}"
@@ -166,126 +760,53 @@ class XSSAutomationBot:
         
         except Exception as e:
             logger.error(f"خطأ في فحص النطاق {clean_domain}: {str(e)}")
+            # خطأ بعد انتهاء الفحص (مثل تعديل الرسالة) لا يغير نتيجته التي تصل للمنتظرين
+            if result is None:
+                result = {'success': False, 'error': str(e)}
+                await run_blocking(self.store.fail_scan, job.scan_id, str(e))
             await status_message.edit_text(
                 f"❌ حدث خطأ أثناء فحص النطاق: {clean_domain}\n"
                 "يرجى المحاولة مرة أخرى لاحقاً"
             )
-    
-    async def run_xss_automation(self, domain: str, status_message):
-        """تشغيل سكربت XSS Automation"""
-        try:
-            # مسار سكربت XSS Automation
-            script_path = "/home/ubuntu/XSS-Automation/xss_automation.sh"
-            
-            # التأكد من وجود السكربت
-            if not os.path.exists(script_path):
-                return {
-                    'success': False,
-                    'error': 'سكربت XSS Automation غير موجود'
-                }
-            
-            # إعداد متغيرات البيئة
-            env = os.environ.copy()
-            env['PATH'] = env.get('PATH', '') + ':/usr/local/go/bin'
-            env['GOPATH'] = '/home/ubuntu/go'
-            
-            # تشغيل السكربت
-            process = await asyncio.create_subprocess_exec(
-                'bash', script_path,
-                stdin=asyncio.subprocess.PIPE,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                env=env,
-                cwd='/home/ubuntu/XSS-Automation'
-            )
-            
-            # إرسال المدخلات للسكربت
-            input_data = f"{domain}\nn\n"  # النطاق + عدم استخدام حمولات مخصصة
-            
-            # تحديث الحالة بشكل دوري
-            await status_message.edit_text(
-                f"🔍 فحص النطاق: {domain}\n"
-                "🔧 جاري تثبيت الأدوات المطلوبة..."
-            )
-            
-            # انتظار انتهاء العملية مع تحديث الحالة
-            stdout, stderr = await process.communicate(input_data.encode())
-            
-            if process.returncode == 0:
-                # قراءة النتائج
-                results_dir = f"/home/ubuntu/XSS-Automation/results/{domain}"
-                return await self.parse_results(results_dir, domain)
-            else:
-                return {
-                    'success': False,
-                    'error': f'فشل السكربت: {stderr.decode()[:200]}'
-                }
         
-        except Exception as e:
-            return {
-                'success': False,
-                'error': f'خطأ في تشغيل السكربت: {str(e)}'
-            }
+        finally:
+            self.result_cache.clear_inflight(clean_domain, job, job.diff)
+            if result is None or not result['success']:
+                SCANS_FAILED.inc()
+            # المنتظرون يُبلغون حتى لو تعذر تعديل رسالة صاحب الفحص
+            # (بدون نتيجة عند إيقاف البوت، فتبقى فحوصاتهم في قاعدة البيانات لاستئنافها)
+            if result is not None:
+                await self.notify_waiters(job, result)
     
-    async def parse_results(self, results_dir: str, domain: str):
-        """تحليل نتائج الفحص"""
-        try:
-            if not os.path.exists(results_dir):
-                return {
-                    'success': False,
-                    'error': 'مجلد النتائج غير موجود'
-                }
-            
-            results = {
-                'domain': domain,
-                'wayback_urls': 0,
-                'subdomains': 0,
-                'live_urls': 0,
-                'xss_ready_urls': 0,
-                'vulnerable_urls': 0,
-                'files': {}
-            }
-            
-            # قراءة الملفات المختلفة
-            files_to_check = [
-                'wayback.txt',
-                'subdomains.txt', 
-                'live_uro1.txt',
-                'xss_ready.txt',
-                'Vulnerable_XSS.txt'
-            ]
-            
-            for filename in files_to_check:
-                filepath = os.path.join(results_dir, filename)
-                if os.path.exists(filepath):
-                    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                        lines = [line.strip() for line in f.readlines() if line.strip()]
-                        results['files'][filename] = lines
-                        
-                        # حساب الإحصائيات
-                        if filename == 'wayback.txt':
-                            results['wayback_urls'] = len(lines)
-                        elif filename == 'subdomains.txt':
-                            results['subdomains'] = len(lines)
-                        elif filename == 'live_uro1.txt':
-                            results['live_urls'] = len(lines)
-                        elif filename == 'xss_ready.txt':
-                            results['xss_ready_urls'] = len(lines)
-                        elif filename == 'Vulnerable_XSS.txt':
-                            results['vulnerable_urls'] = len(lines)
-            
-            return {
-                'success': True,
-                'data': results
-            }
-        
-        except Exception as e:
-            return {
-                'success': False,
-                'error': f'خطأ في تحليل النتائج: {str(e)}'
-            }
+    async def notify_waiters(self, job: ScanJob, result: dict):
+        """إرسال نتيجة الفحص لكل من انضم إلى نفس المهمة"""
+        for waiter in job.waiters:
+            try:
+                if result['success']:
+                    await run_blocking(self.store.link_scan, waiter['scan_id'], job.scan_id)
+                    await self.send_results(
+                        waiter['chat_id'], job.domain, dict(result['data'], scan_id=waiter['scan_id'])
+                    )
+                else:
+                    await run_blocking(self.store.fail_scan, waiter['scan_id'], result['error'])
+                    await waiter['status_message'].edit_text(
+                        f"❌ فشل في فحص النطاق: {job.domain}\n"
+                        f"الخطأ: {result['error']}"
+                    )
+            except Exception as e:
+                logger.error(f"تعذر إرسال النتائج لمستخدم منتظر للنطاق {job.domain}: {str(e)}")
+    
+    async def run_xss_automation(self, domain: str, status_message, resume: bool = True,
+                                 control: JobControl = None, scan_id: int = None, targets: list = None,
+                                 diff: bool = False):
+        """تشغيل الفحص داخل البوت أو إرساله لعمال الفحص عبر الوسيط حسب SCAN_EXECUTOR"""
+        if SCAN_EXECUTOR == 'broker':
+            return await self.broker_client.run(scan_id, domain, status_message, resume=resume,
+                                                targets=targets, diff=diff)
+        return await self.runner.run(domain, status_message, resume=resume, control=control,
+                                     targets=targets, diff=diff)
     
-    async def send_results(self, update: Update, domain: str, results: dict):
+    async def send_results(self, chat_id: int, domain: str, results: dict, note: str = None):
         """إرسال نتائج الفحص"""
         # رسالة الملخص
         summary = f"""
@@ -300,35 +821,70 @@ class XSSAutomationBot:
 
 {'🚨 تم اكتشاف ثغرات XSS!' if results['vulnerable_urls'] > 0 else '✅ لم يتم اكتشاف ثغرات XSS'}
         """
+        if results.get('delta'):
+            summary += self.format_delta(results['delta'])
+        if results.get('targets'):
+            summary += self.format_target_breakdown(results['targets'])
+        if note:
+            summary += f"\n{note}"
         
         keyboard = []
         
         # إضافة أزرار لعرض التفاصيل
         if results['vulnerable_urls'] > 0:
-            keyboard.append([InlineKeyboardButton("🚨 عرض الثغرات المكتشفة", callback_data=f'show_vulns_{domain}')])
+            keyboard.append([InlineKeyboardButton("🚨 عرض الثغرات المكتشفة", callback_data=f"show_vulns_{results['scan_id']}")])
         
         if results['xss_ready_urls'] > 0:
-            keyboard.append([InlineKeyboardButton("🔍 عرض الروابط المختبرة", callback_data=f'show_tested_{domain}')])
+            keyboard.append([InlineKeyboardButton("🔍 عرض الروابط المختبرة", callback_data=f"show_tested_{results['scan_id']}")])
         
-        keyboard.append([InlineKeyboardButton("📊 عرض الإحصائيات التفصيلية", callback_data=f'show_stats_{domain}')])
+        keyboard.append([InlineKeyboardButton("📊 عرض الإحصائيات التفصيلية", callback_data=f"show_stats_{results['scan_id']}")])
         keyboard.append([InlineKeyboardButton("🔍 فحص نطاق جديد", callback_data='new_scan')])
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.message.reply_text(summary, reply_markup=reply_markup)
-        
-        # حفظ النتائج في السياق للاستخدام لاحقاً
-        if 'scan_results' not in update.effective_user.id.__dict__:
-            update.effective_user.scan_results = {}
-        update.effective_user.scan_results = {domain: results}
+        await self.outbox.send(chat_id, summary, reply_markup=reply_markup)
+    
+    def format_delta(self, delta: dict) -> str:
+        """تقرير الفحص التفاضلي: ما تغير في الروابط والثغرات مقارنة بالفحص السابق"""
+        if not delta['baseline']:
+            return "\n🔁 لا يوجد فحص سابق مكتمل للمقارنة، تم فحص كل الروابط وسيُقارن الفحص التالي بهذا\n"
+        lines = [
+            "\n🔁 التغييرات منذ الفحص السابق:",
+            f"• روابط جديدة أو متغيرة تم فحصها: {delta['new_urls']}",
+            f"• روابط بدون تغيير (لم يُعد فحصها): {delta['unchanged_urls']}",
+            f"• ثغرات جديدة: {delta['new_findings']}",
+            f"• ثغرات ما زالت موجودة: {delta['persisting_findings']}",
+            f"• ثغرات اختفت: {delta['gone_findings']}",
+        ]
+        for title, kind in (("🆕 الجديدة:", 'new'), ("👻 التي اختفت:", 'gone')):
+            samples = delta['samples'][kind][:DELTA_SAMPLE_SIZE]
+            if samples:
+                lines.append(title)
+                lines.extend(f"  {url[:URL_DISPLAY_LIMIT]}" for url in samples)
+        return '\n'.join(lines) + '\n'
+    
+    def format_target_breakdown(self, targets: dict) -> str:
+        """ملخص الفحص الجماعي: الأهداف التي فيها ثغرات أولاً ثم الأكثر روابط نشطة"""
+        ranked = sorted(
+            targets.items(),
+            key=lambda item: (-item[1]['vulnerable_urls'], -item[1]['live_urls'], item[0])
+        )
+        lines = [f"\n🎯 الأهداف ({len(targets)}):"]
+        for target, counts in ranked[:BATCH_SUMMARY_TARGETS]:
+            marker = '🚨' if counts['vulnerable_urls'] else '•'
+            lines.append(f"{marker} {target}: {counts['vulnerable_urls']} ثغرة، {counts['live_urls']} رابط نشط")
+        if len(ranked) > BATCH_SUMMARY_TARGETS:
+            lines.append(f"... و{len(ranked) - BATCH_SUMMARY_TARGETS} هدف آخر")
+        return '\n'.join(lines) + '\n'
     
     async def button_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """معالج الأزرار التفاعلية"""
         query = update.callback_query
-        await query.answer()
+        await self.outbox.answer(query)
         
         if query.data == 'new_scan':
-            await query.edit_message_text(
+            await self.outbox.edit(
+                query.message.chat_id, query.message.message_id,
                 "🔍 أرسل النطاق الذي تريد فحصه\n"
                 "مثال: example.com أو https://example.com"
             )
@@ -353,18 +909,161 @@ class XSSAutomationBot:
 
 👨‍💻 تطوير: Manus AI
             """
-            await query.edit_message_text(about_message)
+            await self.outbox.edit(query.message.chat_id, query.message.message_id, about_message)
+        elif query.data.startswith(('show_', 'page_', 'export_')):
+            await self.show_scan_details(query)
+    
+    async def show_scan_details(self, query):
+        """عرض تفاصيل فحص محفوظ من قاعدة البيانات"""
+        parts = query.data.split('_')
+        action, kind = parts[0], parts[1]
+        scan = await run_blocking(self.store.get_scan, int(parts[2]))
+        
+        if scan is None or scan['user_id'] != query.from_user.id:
+            await self.outbox.send(query.message.chat_id, "❌ نتائج هذا الفحص غير متوفرة")
+            return
+        
+        if kind == 'stats':
+            text = f"""
+📊 إحصائيات فحص النطاق: {scan['domain']}
+
+🕒 تاريخ الفحص: {scan['created_at'][:16].replace('T', ' ')}
+• عناوين URL من Wayback: {scan['wayback_urls']}
+• النطاقات الفرعية: {scan['subdomains']}
+• الروابط النشطة: {scan['live_urls']}
+• روابط قابلة لاختبار XSS: {scan['xss_ready_urls']}
+• ثغرات XSS مكتشفة: {scan['vulnerable_urls']}
+            """
+            if scan['cpu_seconds'] is not None:
+                text += (
+                    f"\n⚙️ الموارد: {scan['cpu_seconds']:.1f} ثانية معالج • "
+                    f"{scan['peak_rss_bytes'] // (1024 * 1024)} MB ذاكرة"
+                )
+            await self.outbox.send(query.message.chat_id, text)
+        elif action == 'export':
+            await self.export_findings(query, scan, kind)
+        else:
+            offset = int(parts[3]) if action == 'page' else 0
+            await self.show_findings_page(query, scan, kind, offset, edit=(action == 'page'))
+    
+    async def show_findings_page(self, query, scan: dict, kind: str, offset: int, edit: bool):
+        """عرض صفحة واحدة من الروابط مع أزرار التنقل"""
+        finding_kind, title, total = FINDING_VIEWS[kind]
+        total = scan[total]
+        source_id = scan['source_scan_id'] or scan['id']
+        offset = max(0, min(offset, max(total - 1, 0)))
+        urls = await run_blocking(self.store.get_findings, source_id, finding_kind, offset, DETAILS_PAGE_SIZE)
+        
+        lines = '\n'.join(
+            f"{i}. {url[:URL_DISPLAY_LIMIT]}" for i, url in enumerate(urls, start=offset + 1)
+        )
+        pages = max(1, -(-total // DETAILS_PAGE_SIZE))
+        page = offset // DETAILS_PAGE_SIZE + 1
+        text = f"{title} - {scan['domain']}\n📄 الصفحة {page}/{pages} ({total} رابط)\n\n{lines or 'لا توجد روابط'}"
+        
+        navigation = []
+        if offset > 0:
+            navigation.append(InlineKeyboardButton(
+                "◀️ السابق", callback_data=f"page_{kind}_{scan['id']}_{max(0, offset - DETAILS_PAGE_SIZE)}"
+            ))
+        if offset + DETAILS_PAGE_SIZE < total:
+            navigation.append(InlineKeyboardButton(
+                "التالي ▶️", callback_data=f"page_{kind}_{scan['id']}_{offset + DETAILS_PAGE_SIZE}"
+            ))
+        keyboard = [navigation] if navigation else []
+        if total > 0:
+            keyboard.append([InlineKeyboardButton("📥 تصدير القائمة كاملة", callback_data=f"export_{kind}_{scan['id']}")])
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        if edit:
+            await self.outbox.edit(
+                query.message.chat_id, query.message.message_id, text,
+                reply_markup=reply_markup, disable_web_page_preview=True
+            )
+        else:
+            await self.outbox.send(
+                query.message.chat_id, text,
+                reply_markup=reply_markup, disable_web_page_preview=True
+            )
+    
+    async def export_findings(self, query, scan: dict, kind: str):
+        """إرسال القائمة كاملة كملف (مضغوط للقوائم الكبيرة) دون تحميلها في الذاكرة"""
+        finding_kind, title, total = FINDING_VIEWS[kind]
+        total = scan[total]
+        source_id = scan['source_scan_id'] or scan['id']
+        compress = total > EXPORT_PLAIN_LIMIT
+        filename = f"{scan['domain']}_{finding_kind}.txt" + ('.gz' if compress else '')
+        
+        # إنشاء الملف المؤقت وكتابته خارج حلقة الأحداث
+        with await run_blocking(tempfile.TemporaryFile) as fileobj:
+            await run_blocking(self.store.export_findings, source_id, finding_kind, fileobj, compress)
+            fileobj.seek(0)
+            await self.outbox.send_document(
+                query.message.chat_id,
+                document=fileobj,
+                filename=filename,
+                caption=f"{title} - {scan['domain']} ({total} رابط)"
+            )
     
     def run(self):
         """تشغيل البوت"""
         logger.info("بدء تشغيل بوت XSS Automation...")
-        self.application.run_polling()
+        if BOT_MODE == 'webhook':
+            asyncio.run(self.run_webhook())
+        else:
+            # خادم Flask لنقطة /metrics وواجهة المستخدمين
+            if HTTP_ENABLED:
+                start_http_server(port=HTTP_PORT)
+            self.application.run_polling()
+    
+    async def run_webhook(self):
+        """استقبال التحديثات عبر Webhook من خادم Flask بدلاً من الاستطلاع"""
+        if not WEBHOOK_URL:
+            raise RuntimeError('WEBHOOK_URL غير محدد')
+        if not WEBHOOK_SECRET:
+            # بدون سر يمكن لأي أحد إرسال تحديثات مزورة باسم أي مستخدم بما فيهم المشرفون
+            raise RuntimeError('WEBHOOK_SECRET غير محدد، وهو مطلوب في وضع Webhook')
+        
+        application = self.application
+        await application.initialize()
+        await self._post_init(application)
+        await application.start()
+        
+        attach_application(application, asyncio.get_running_loop(), WEBHOOK_SECRET)
+        server = start_http_server(port=HTTP_PORT)
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES
+        )
+        logger.info(f"تم تفعيل وضع Webhook على {WEBHOOK_URL} (المنفذ {HTTP_PORT})")
+        
+        # الانتظار حتى إشارة الإيقاف
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+        
+        try:
+            await stop_event.wait()
+        finally:
+            detach_application()
+            server.shutdown()
+            await application.stop()
+            await self._post_shutdown(application)
+            await application.shutdown()
 
 if __name__ == '__main__':
     if BOT_TOKEN == 'YOUR_BOT_TOKEN_HERE':
         print("❌ يرجى تعيين BOT_TOKEN في متغيرات البيئة")
         exit(1)
     
+    setup_logging()
+    if SCAN_EXECUTOR != 'broker':
+        # فحص الأدوات مرة واحدة قبل حلقة الأحداث كما في bot_main.py
+        for line in toolchain.format_health(toolchain.health(toolchain.preflight())).split('\n'):
+            logger.info(line)
     bot = XSSAutomationBot()
     bot.run()
 
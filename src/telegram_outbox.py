@@ -0,0 +1,246 @@
+"""
+طبقة الإرسال الموحدة إلى تيليجرام
+تحدد معدل الطلبات (عام ولكل محادثة) وتدمج تعديلات نفس الرسالة وتعيد المحاولة عند RetryAfter.
+أخطاء الشبكة والمهلة لا تعني أن الطلب لم يصل، فلا يُعاد عندها إلا الاستدعاءات التي لا يضر تكرارها
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import timedelta
+
+from telegram.error import RetryAfter, TimedOut, NetworkError, BadRequest
+
+from src.metrics import TELEGRAM_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# حدود تيليجرام التقريبية: ~30 رسالة/ثانية عامة ورسالة/ثانية لكل محادثة
+GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '25'))
+CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', '1'))
+CHAT_BURST = float(os.getenv('TELEGRAM_CHAT_BURST', '3'))
+MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', '5'))
+
+# استدعاءات يمكن إعادتها بعد انقطاع الشبكة دون تكرار ما يراه المستخدم
+# (إرسال رسالة أو ملف مرة ثانية يظهر رسالة مكررة إذا كانت الأولى قد وصلت)
+IDEMPOTENT_METHODS = {'editMessageText', 'answerCallbackQuery'}
+
+
+def _seconds(value) -> float:
+    """تحويل retry_after إلى ثوانٍ (قد يكون رقماً أو timedelta حسب الإصدار)"""
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value)
+
+
+class TokenBucket:
+    """دلو رموز بسيط لتحديد المعدل مع إمكانية الإيقاف المؤقت عند RetryAfter"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def block(self, seconds: float):
+        """إيقاف الدلو لمدة محددة (مثلاً بعد RetryAfter)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def idle(self) -> bool:
+        now = time.monotonic()
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+class OutboundMessage:
+    """مرجع لرسالة مرسلة، تمر تعديلاته عبر طبقة الإرسال"""
+
+    def __init__(self, outbox, chat_id: int, message_id: int):
+        self.outbox = outbox
+        self.chat_id = chat_id
+        self.message_id = message_id
+
+    async def edit_text(self, text: str, **kwargs):
+        return await self.outbox.edit(self.chat_id, self.message_id, text, **kwargs)
+
+    async def reply_text(self, text: str, **kwargs):
+        return await self.outbox.send(self.chat_id, text, **kwargs)
+
+
+class TelegramOutbox:
+    """كل استدعاءات الإرسال والتعديل والرد في البوت تمر من هنا"""
+
+    def __init__(self, bot, global_rate: float = None, chat_rate: float = None, chat_burst: float = None):
+        self.bot = bot
+        self.chat_rate = chat_rate or CHAT_RATE
+        self.chat_burst = chat_burst or CHAT_BURST
+        self.global_bucket = TokenBucket(global_rate or GLOBAL_RATE, global_rate or GLOBAL_RATE)
+        self._chat_buckets = {}
+        self._edits = {}
+        self._flushing = set()
+        self.calls = {}
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 1000:
+                # حذف دلاء المحادثات الخاملة حتى لا يكبر القاموس بلا حد
+                for key in [k for k, b in self._chat_buckets.items() if b.idle()]:
+                    del self._chat_buckets[key]
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _acquire(self, chat_id):
+        if chat_id is not None:
+            await self._chat_bucket(chat_id).acquire()
+        await self.global_bucket.acquire()
+
+    def _on_retry_after(self, chat_id, error: RetryAfter) -> float:
+        delay = _seconds(error.retry_after)
+        logger.warning(f"تجاوز حد تيليجرام للمحادثة {chat_id}، الانتظار {delay} ثانية")
+        if chat_id is not None:
+            self._chat_bucket(chat_id).block(delay)
+        else:
+            self.global_bucket.block(delay)
+        return delay
+
+    async def call(self, method: str, rate_chat_id, func, /, *args, **kwargs):
+        """تنفيذ استدعاء API مع تحديد المعدل وإعادة المحاولة"""
+        for attempt in range(MAX_RETRIES + 1):
+            await self._acquire(rate_chat_id)
+            self.calls[method] = self.calls.get(method, 0) + 1
+            try:
+                with TELEGRAM_SECONDS.labels(method).time():
+                    return await func(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                self._on_retry_after(rate_chat_id, e)
+            except (TimedOut, NetworkError) as e:
+                if isinstance(e, BadRequest) or method not in IDEMPOTENT_METHODS or attempt == MAX_RETRIES:
+                    raise
+                await asyncio.sleep(min(2 ** attempt, 30))
+
+            # إعادة الملفات المرفوعة إلى بدايتها قبل إعادة المحاولة
+            document = kwargs.get('document')
+            if hasattr(document, 'seek'):
+                document.seek(0)
+
+    async def send(self, chat_id: int, text: str, **kwargs) -> OutboundMessage:
+        message = await self.call(
+            'sendMessage', chat_id, self.bot.send_message, chat_id=chat_id, text=text, **kwargs
+        )
+        return OutboundMessage(self, chat_id, message.message_id)
+
+    async def send_document(self, chat_id: int, document, **kwargs):
+        return await self.call(
+            'sendDocument', chat_id, self.bot.send_document, chat_id=chat_id, document=document, **kwargs
+        )
+
+    async def answer(self, query, *args, **kwargs):
+        return await self.call('answerCallbackQuery', None, query.answer, *args, **kwargs)
+
+    def message(self, chat_id: int, message_id: int) -> OutboundMessage:
+        return OutboundMessage(self, chat_id, message_id)
+
+    async def edit(self, chat_id: int, message_id: int, text: str, **kwargs):
+        """تعديل رسالة مع دمج التعديلات المتتالية بحيث يُرسل آخر نص فقط"""
+        key = (chat_id, message_id)
+        future = asyncio.get_running_loop().create_future()
+        entry = self._edits.get(key)
+        if entry is None:
+            self._edits[key] = {'text': text, 'kwargs': kwargs, 'futures': [future]}
+        else:
+            # النص السابق لم يُرسل بعد، يُستبدل بالأحدث
+            entry['text'] = text
+            entry['kwargs'] = kwargs
+            entry['futures'].append(future)
+
+        # مهمة إرسال واحدة لكل رسالة تحافظ على ترتيب التعديلات
+        if key not in self._flushing:
+            self._flushing.add(key)
+            asyncio.get_running_loop().create_task(self._flush_edit(key))
+        return await future
+
+    async def _flush_edit(self, key):
+        try:
+            await self._flush_edit_loop(key)
+        finally:
+            self._flushing.discard(key)
+
+    async def _flush_edit_loop(self, key):
+        chat_id, message_id = key
+        attempts = 0
+        while key in self._edits:
+            await self._acquire(chat_id)
+            entry = self._edits.pop(key)
+            self.calls['editMessageText'] = self.calls.get('editMessageText', 0) + 1
+            try:
+                with TELEGRAM_SECONDS.labels('editMessageText').time():
+                    await self.bot.edit_message_text(
+                        chat_id=chat_id, message_id=message_id, text=entry['text'], **entry['kwargs']
+                    )
+            except RetryAfter as e:
+                attempts += 1
+                self._on_retry_after(chat_id, e)
+                if attempts <= MAX_RETRIES:
+                    # إعادة المحاولة بأحدث نص متاح
+                    self._requeue(key, entry)
+                    continue
+                self._resolve(entry, e)
+                continue
+            except BadRequest as e:
+                if 'not modified' in str(e).lower():
+                    self._resolve(entry)
+                else:
+                    self._resolve(entry, e)
+                continue
+            except (TimedOut, NetworkError) as e:
+                attempts += 1
+                if attempts <= MAX_RETRIES:
+                    # التعديل لا يتكرر للمستخدم، فيُعاد بأحدث نص بعد مهلة متزايدة
+                    self._requeue(key, entry)
+                    await asyncio.sleep(min(2 ** (attempts - 1), 30))
+                    continue
+                self._resolve(entry, e)
+                continue
+            except Exception as e:
+                self._resolve(entry, e)
+                continue
+            self._resolve(entry)
+
+    def _requeue(self, key, entry):
+        """إعادة تعديل لم يُرسل إلى الانتظار، أو دمجه في تعديل أحدث وصل أثناء المحاولة"""
+        newer = self._edits.get(key)
+        if newer is None:
+            self._edits[key] = entry
+        else:
+            newer['futures'].extend(entry['futures'])
+
+    @staticmethod
+    def _resolve(entry, error: Exception = None):
+        for future in entry['futures']:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
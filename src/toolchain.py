@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+فحص أدوات الفحص مرة واحدة عند بدء البوت أو العامل بدلاً من كل عملية فحص
+يُسجل مسار وإصدار كل أداة في ملف TOOLCHAIN_MANIFEST، ولا يُعاد تشغيل أمر الإصدار إلا إذا تغير ملف الأداة
+(الحجم أو وقت التعديل)، ويستخدم خط الفحص المسارات المحفوظة مباشرة
+
+الاستخدام:
+    python src/toolchain.py            # ملخص الحالة
+    python src/toolchain.py --refresh  # إعادة قراءة الإصدارات
+    python src/toolchain.py --json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+
+# إضافة جذر المشروع للاستيراد بنفس أسلوب src/main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# أدوات جمع الروابط (تكفي واحدة منها) والأدوات الإلزامية
+COLLECTORS = ('waybackurls', 'gau')
+REQUIRED_TOOLS = ('httpx', 'dalfox')
+TOOLS = ('subfinder',) + COLLECTORS + REQUIRED_TOOLS
+
+# أمر الإصدار لكل أداة (waybackurls لا تملك واحداً)
+VERSION_ARGS = {
+    'subfinder': ['-version'],
+    'waybackurls': None,
+    'gau': ['--version'],
+    'httpx': ['-version'],
+    'dalfox': ['version'],
+}
+VERSION_PATTERN = re.compile(r'v?(\d+\.\d+(?:\.\d+)?)')
+VERSION_TIMEOUT = 10
+
+TOOLCHAIN_MANIFEST = os.path.expanduser(
+    os.getenv('TOOLCHAIN_MANIFEST', os.path.join('~', '.cache', 'xss-automation', 'toolchain.json'))
+)
+
+# نتيجة آخر فحص في هذه العملية
+_current = None
+
+
+def tool_env() -> dict:
+    """متغيرات البيئة للأدوات مع مسارات Go"""
+    env = os.environ.copy()
+    gopath = env.get('GOPATH') or os.path.expanduser('~/go')
+    env['PATH'] = os.pathsep.join([os.path.join(gopath, 'bin'), '/usr/local/go/bin', env.get('PATH', '')])
+    return env
+
+
+def find_tools(env: dict = None) -> dict:
+    """مسار كل أداة أو None إذا لم تكن مثبتة (مسارات Go أولاً حتى لا تطغى httpx الخاصة ببايثون)"""
+    path = (env or tool_env())['PATH']
+    return {name: shutil.which(name, path=path) for name in TOOLS}
+
+
+def tool_version(name: str, path: str):
+    """أول رقم إصدار في مخرجات أمر الإصدار، أو None"""
+    args = VERSION_ARGS.get(name)
+    if args is None:
+        return None
+    try:
+        proc = subprocess.run([path, *args], capture_output=True, text=True, timeout=VERSION_TIMEOUT,
+                              stdin=subprocess.DEVNULL, env=tool_env())
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    match = VERSION_PATTERN.search(proc.stdout + '\n' + proc.stderr)
+    return match.group(1) if match else None
+
+
+def load_manifest(path: str = None):
+    try:
+        with open(path or TOOLCHAIN_MANIFEST, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_manifest(manifest: dict, path: str):
+    """كتابة ذرية: ملف مؤقت ثم استبدال"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def preflight(refresh: bool = False, path: str = None) -> dict:
+    """العثور على الأدوات وتسجيل مساراتها وإصداراتها (الإصدارات المحفوظة تُستخدم إن لم تتغير الأداة)"""
+    global _current
+    path = path or TOOLCHAIN_MANIFEST
+    previous = {} if refresh else (load_manifest(path) or {}).get('tools', {})
+    tools = {}
+    for name, tool_path in find_tools().items():
+        if tool_path is None:
+            tools[name] = {'path': None, 'version': None}
+            continue
+        stat = os.stat(tool_path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        known = previous.get(name)
+        if known and known.get('path') == tool_path and known.get('stamp') == stamp:
+            tools[name] = known
+        else:
+            tools[name] = {'path': tool_path, 'version': tool_version(name, tool_path), 'stamp': stamp}
+    manifest = {'checked_at': time.time(), 'tools': tools}
+    try:
+        _save_manifest(manifest, path)
+    except OSError:
+        # مجلد غير قابل للكتابة: تبقى النتيجة في الذاكرة فقط
+        pass
+    _current = manifest
+    return manifest
+
+
+def current() -> dict:
+    """نتيجة الفحص في هذه العملية (يُجرى مرة واحدة عند أول حاجة إن لم يتم عند البدء)"""
+    return _current if _current is not None else preflight()
+
+
+def cached():
+    """نتيجة هذه العملية أو آخر ملف محفوظ دون تشغيل أي أداة (None إذا لم يُجرَ الفحص بعد)"""
+    return _current if _current is not None else load_manifest()
+
+
+def tool_paths() -> dict:
+    """مسار كل أداة من الفحص المحفوظ دون البحث في PATH مرة أخرى"""
+    return {name: entry['path'] for name, entry in current()['tools'].items()}
+
+
+def health(manifest: dict = None) -> dict:
+    """ملخص الحالة: ok إذا وُجدت الأدوات الإلزامية وأداة جمع واحدة على الأقل"""
+    manifest = manifest or current()
+    tools = manifest['tools']
+    missing = [name for name in REQUIRED_TOOLS if not tools.get(name, {}).get('path')]
+    if not any(tools.get(name, {}).get('path') for name in COLLECTORS):
+        missing.append(' أو '.join(COLLECTORS))
+    return {
+        'ok': not missing,
+        'missing': missing,
+        'checked_at': manifest['checked_at'],
+        'tools': {name: {'path': entry['path'], 'version': entry['version']} for name, entry in tools.items()},
+    }
+
+
+def format_health(summary: dict) -> str:
+    """نص الحالة للسجل أو رسالة تيليجرام"""
+    lines = ["🧰 حالة أدوات الفحص: " + ('✅ جاهزة' if summary['ok'] else '❌ ناقصة')]
+    for name, entry in summary['tools'].items():
+        if entry['path']:
+            lines.append(f"✅ {name} {entry['version'] or ''}".rstrip())
+        else:
+            lines.append(f"⚠️ {name} غير مثبتة")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='فحص أدوات الفحص وتسجيل إصداراتها')
+    parser.add_argument('--refresh', action='store_true', help='إعادة قراءة الإصدارات حتى لو لم تتغير الأدوات')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    summary = health(preflight(refresh=args.refresh))
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print(format_health(summary))
+    return 0 if summary['ok'] else 1
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,156 @@
+"""
+توحيد الروابط وإزالة التكرار داخل البوت (بديل uro)
+الروابط التي لا تختلف إلا في قيم المعاملات تُعتبر رابطاً واحداً،
+ويُستخدم مرشح Bloom بحجم ثابت حتى تبقى الذاكرة محدودة مع عشرات الملايين من الروابط
+"""
+
+import os
+import re
+import math
+import hashlib
+
+# السعة المتوقعة ونسبة الإيجابيات الكاذبة المقبولة للمرشح
+DEDUP_CAPACITY = int(os.getenv('DEDUP_CAPACITY', '10000000'))
+DEDUP_ERROR_RATE = float(os.getenv('DEDUP_ERROR_RATE', '0.001'))
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+# المخطط والمضيف والمسار والاستعلام (يُتجاهل الجزء بعد #)
+URL_PATTERN = re.compile(r'([A-Za-z][A-Za-z0-9+.-]*)://([^/?#]*)([^?#]*)(?:\?([^#]*))?')
+
+
+def split_url(url: str):
+    """تقسيم الرابط إلى (الأساس الموحد، المعاملات مرتبة) أو None للروابط غير الصالحة
+    يعمل على النص مباشرة دون فك الترميز حتى يبقى سريعاً مع ملايين الروابط"""
+    match = URL_PATTERN.match(url.strip())
+    if match is None:
+        return None
+    scheme, netloc, path, query = match.groups()
+    scheme = scheme.lower()
+    default_port = DEFAULT_PORTS.get(scheme)
+    if default_port is None:
+        return None
+
+    netloc = netloc.rpartition('@')[2].lower()
+    if netloc.startswith('['):
+        host, _, port = netloc.partition(']')
+        host += ']'
+        port = port[1:] if port.startswith(':') else ''
+    else:
+        host, _, port = netloc.partition(':')
+    host = host.rstrip('.')
+    if not host:
+        return None
+    if port:
+        if not port.isdigit() or int(port) > 65535:
+            return None
+        if int(port) != default_port:
+            host = f'{host}:{int(port)}'
+
+    pairs = sorted(pair for pair in query.split('&') if pair) if query else []
+    return f'{scheme}://{host}{path or "/"}', pairs
+
+
+def normalize_url(url: str):
+    """توحيد المخطط وحالة النطاق والمنفذ الافتراضي وترتيب المعاملات (None للروابط غير الصالحة)"""
+    parts = split_url(url)
+    if parts is None:
+        return None
+    base, pairs = parts
+    return base + '?' + '&'.join(pairs) if pairs else base
+
+
+def pattern_key(normalized: str) -> str:
+    """مفتاح الرابط بدون قيم المعاملات: روابط النمط نفسه لها المفتاح نفسه"""
+    base, _, query = normalized.partition('?')
+    if not query:
+        return base
+    return base + '?' + _param_names(query.split('&'))
+
+
+def url_key(url: str):
+    """مفتاح النمط مباشرة من الرابط الخام (None للروابط غير الصالحة)"""
+    parts = split_url(url)
+    if parts is None:
+        return None
+    base, pairs = parts
+    return base + '?' + _param_names(pairs) if pairs else base
+
+
+def _param_names(pairs) -> str:
+    return '&'.join(sorted({pair.partition('=')[0] for pair in pairs}))
+
+
+class BloomFilter:
+    """مرشح Bloom بمصفوفة بتات ثابتة الحجم (تجزئة مزدوجة من blake2b واحدة لكل عنصر)"""
+
+    def __init__(self, capacity: int = None, error_rate: float = None):
+        self.capacity = capacity or DEDUP_CAPACITY
+        self.error_rate = error_rate or DEDUP_ERROR_RATE
+        bits = math.ceil(-self.capacity * math.log(self.error_rate) / (math.log(2) ** 2))
+        self.size = max(8, bits)
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _hash(self, item: str):
+        """موضع البداية والخطوة للتجزئة المزدوجة (أعداد صغيرة أسرع من الأعداد الكبيرة في الحلقة)"""
+        digest = hashlib.blake2b(item.encode('utf-8', errors='ignore'), digest_size=16).digest()
+        size = self.size
+        return int.from_bytes(digest[:8], 'little') % size, int.from_bytes(digest[8:], 'little') % size | 1
+
+    def add(self, item: str) -> bool:
+        """إضافة عنصر، وإرجاع False إذا كان موجوداً مسبقاً (على الأرجح)"""
+        position, step = self._hash(item)
+        bits = self.bits
+        size = self.size
+        new = False
+        for _ in range(self.hashes):
+            byte = position >> 3
+            mask = 1 << (position & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                new = True
+            position += step
+            if position >= size:
+                position -= size
+        if new:
+            self.count += 1
+        return new
+
+    def __contains__(self, item: str) -> bool:
+        position, step = self._hash(item)
+        bits = self.bits
+        size = self.size
+        for _ in range(self.hashes):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+            position += step
+            if position >= size:
+                position -= size
+        return True
+
+    def memory_bytes(self) -> int:
+        return len(self.bits)
+
+
+class UrlDeduplicator:
+    """إرجاع الرابط الموحد لأول ظهور لكل نمط وNone للمكرر"""
+
+    def __init__(self, capacity: int = None, error_rate: float = None):
+        self.seen = BloomFilter(capacity, error_rate)
+        self.total = 0
+        self.unique = 0
+
+    def add(self, url: str):
+        self.total += 1
+        parts = split_url(url)
+        if parts is None:
+            return None
+        base, pairs = parts
+        key = base + '?' + _param_names(pairs) if pairs else base
+        if not self.seen.add(key):
+            return None
+        self.unique += 1
+        return base + '?' + '&'.join(pairs) if pairs else base